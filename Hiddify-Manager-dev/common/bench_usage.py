@@ -0,0 +1,84 @@
+#!/opt/hiddify-manager/.venv313/bin/python
+'''Benchmark of usage.py on synthetic wg and xray dumps.
+
+    python common/bench_usage.py [--peers 50000] [--repeat 5]
+
+Every pass parses a dump, accounts it against the previous snapshot, writes the
+report and the snapshot to a temporary directory. Prints the median time per stage.
+'''
+import argparse
+import json
+import statistics
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+import usage
+
+
+def make_users(count, rng):
+    return [
+        {
+            'uuid': str(uuid.UUID(int=int(rng.integers(1 << 62)) << 64 | i)),
+            'wg_pub': f'{i:043x}=',
+            'usage_limit_GB': float(rng.integers(1, 100)),
+            'current_usage_GB': float(rng.uniform(0, 100)),
+        }
+        for i in range(count)
+    ]
+
+
+def wg_dump(users, counters):
+    return ''.join(f"{u['wg_pub']}\t{up}\t{down}\n" for u, (up, down) in zip(users, counters.tolist()))
+
+
+def xray_dump(users, counters):
+    stats = []
+    for u, (up, down) in zip(users, counters.tolist()):
+        stats.append({'name': f"user>>>{u['uuid']}@hiddify.com>>>traffic>>>uplink", 'value': str(up)})
+        stats.append({'name': f"user>>>{u['uuid']}@hiddify.com>>>traffic>>>downlink", 'value': str(down)})
+    return json.dumps({'stat': stats})
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def bench(source, parse, dump, users, counters, rng, repeat, usage_dir):
+    timings = {'parse': [], 'collect': []}
+    for _ in range(repeat):
+        counters += rng.integers(0, 1 << 24, size=counters.shape)
+        text = dump(users.raw, counters)
+        current, parse_ms = timed(parse, text)
+        report, collect_ms = timed(usage.collect, source, current, users, usage_dir)
+        timings['parse'].append(parse_ms)
+        timings['collect'].append(collect_ms)
+    print(
+        f"  {source:<5} {len(current):>7} peers  parse {statistics.median(timings['parse']):8.1f} ms"
+        f"  collect {statistics.median(timings['collect']):8.1f} ms"
+        f"  active users {len(report['users'])}, breached {len(report['breached'])}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Usage analytics benchmark')
+    parser.add_argument('--peers', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    raw_users = make_users(args.peers, rng)
+    users = usage.Users(raw_users)
+    users.raw = raw_users
+    print(f'{args.peers} peers, {args.repeat} passes')
+    with tempfile.TemporaryDirectory() as usage_dir:
+        bench('wg', usage.parse_wg_transfer, wg_dump, users, np.zeros((args.peers, 2), dtype=np.int64), rng, args.repeat, usage_dir)
+        bench('xray', usage.parse_xray_stats, xray_dump, users, np.zeros((args.peers, 2), dtype=np.int64), rng, args.repeat, usage_dir)
+
+
+if __name__ == '__main__':
+    main()
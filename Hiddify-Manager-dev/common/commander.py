@@ -2,6 +2,8 @@
 from urllib.parse import urlparse
 import click
 import os
+import sys
+import json
 from strenum import StrEnum
 import subprocess
 import re
@@ -158,7 +160,26 @@ def apply_users():
 @cli.command('update-wg-usage')
 def update_wg_usage():
     wg_raw_output = subprocess.check_output(['wg', 'show', 'hiddifywg', 'transfer'])
+    # The panel parses this output, so the analytics report goes to log/usage/ instead
     print(wg_raw_output.decode())
+    try:
+        import usage
+        usage.collect('wg', usage.parse_wg_transfer(wg_raw_output.decode()), usage.Users.load(), consumer='panel')
+    except Exception as e:
+        print(f"usage analytics skipped: {e}", file=sys.stderr)
+
+
+@cli.command('usage-report')
+@click.option('--source', '-s', type=click.Choice(['xray', 'wg']), multiple=True, help='Counter sources (default: both)')
+def usage_report(source: tuple[str, ...]):
+    import usage
+    users = usage.Users.load()
+    readers = {
+        'xray': lambda: usage.parse_xray_stats(usage.read_xray_stats()),
+        'wg': lambda: usage.parse_wg_transfer(usage.read_wg_transfer()),
+    }
+    reports = {name: usage.collect(name, readers[name](), users, consumer='report') for name in source or readers}
+    print(json.dumps(reports))
 
 
 if __name__ == "__main__":
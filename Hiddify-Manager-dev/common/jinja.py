@@ -1,9 +1,14 @@
 #!/opt/hiddify-manager/.venv313/bin/python
 import base64
+import fcntl
+import hashlib
 import os
+import re
+import shutil
 import sys
+import tempfile
 import threading
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, meta
 import json5
 import json
 import subprocess
@@ -11,23 +16,89 @@ from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import traceback
 from urllib.parse import quote
 
-with open("/opt/hiddify-manager/current.json") as f:
+# Overridable so the renderer can be driven from a fixture (tests/bench)
+current_json = os.environ.get("HIDDIFY_CURRENT_JSON", "/opt/hiddify-manager/current.json")
+with open(current_json) as f:
     configs = json.load(f)
     configs["chconfigs"] = {int(k): v for k, v in configs["chconfigs"].items()}
     configs["hconfigs"] = configs["chconfigs"][0]
 
 
-def exec(command):
+# Commands whose output does not change during one apply. Their results are cached in a
+# per-apply directory shared by all rendering workers, so each one is forked only once
+cacheable_commands = [
+    re.compile(r"^\[ -f /opt/hiddify-manager/ssl/[\w.\-]+\.crt \]\s*&& echo -n 'true' \|\| echo -n 'false'$"),
+    re.compile(r"^ls /opt/hiddify-manager/ssl/\*\.crt \| tail -1$"),
+    re.compile(r"^ip -o -4 addr show \| awk .*$"),
+    re.compile(r"^(/opt/hiddify-manager/xray/bin/)?xray x25519 -i [\w\-]+$"),
+    re.compile(r"^echo -?n? ?[\w+/=]+ \| wg pubkey$"),
+]
+exec_timeout = 60
+
+
+def is_cacheable(command):
+    return any(pattern.match(command.strip()) for pattern in cacheable_commands)
+
+
+def record_exec_stat(cache_dir, name):
+    # One byte per event; O_APPEND writes are atomic across worker processes
+    fd = os.open(os.path.join(cache_dir, name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, b"1")
+    finally:
+        os.close(fd)
+
+
+def run_command(command):
     try:
         output = subprocess.check_output(
-            command, shell=True, stderr=subprocess.STDOUT, text=True
+            command, shell=True, stderr=subprocess.STDOUT, text=True,
+            stdin=subprocess.DEVNULL, timeout=exec_timeout
         )
-        return output
+        return output, True
     except subprocess.CalledProcessError as e:
         print(command)
         print(f"Command failed with exit code {e.returncode}:")
         print(e.output, e)
-    return ""
+    except subprocess.TimeoutExpired as e:
+        print(command)
+        print(f"Command timed out after {exec_timeout}s", e)
+    return "", False
+
+
+def exec(command):
+    cache_dir = os.environ.get("HIDDIFY_EXEC_CACHE_DIR")
+    if not cache_dir or not is_cacheable(command):
+        if cache_dir:
+            record_exec_stat(cache_dir, "uncached")
+        return run_command(command)[0]
+
+    key = hashlib.sha256(command.encode("utf-8")).hexdigest()
+    result_path = os.path.join(cache_dir, key + ".out")
+    with open(os.path.join(cache_dir, key + ".lock"), "w") as lock:
+        # Workers asking for the same command wait for the first one instead of forking again
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cached = read_text(result_path)
+        if cached is not None:
+            record_exec_stat(cache_dir, "hits")
+            return cached
+        output, ok = run_command(command)
+        record_exec_stat(cache_dir, "misses")
+        if ok:
+            with open(result_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(output)
+            os.replace(result_path + ".tmp", result_path)
+        return output
+
+
+def exec_stats(cache_dir):
+    stats = {}
+    for name in ("hits", "misses", "uncached"):
+        try:
+            stats[name] = os.path.getsize(os.path.join(cache_dir, name))
+        except OSError:
+            stats[name] = 0
+    return stats
 
 
 def b64encode(s):
@@ -37,14 +108,17 @@ def b64encode(s):
 
 env_paths = ["/", "/opt/hiddify-manager/singbox/configs/"]
 env = Environment(loader=FileSystemLoader(env_paths))
+# Environment and filters are set up once per process; forked workers inherit them
+env.globals['enumerate'] = enumerate
+env.filters["b64encode"] = b64encode
+env.filters['quote'] = lambda s: quote(s,safe='')
+env.filters["hexencode"] = lambda s: "".join(
+    hex(ord(c))[2:].zfill(2) for c in s
+)
+
+
 def render(template_path):
     try:
-        env.globals['enumerate'] = enumerate 
-        env.filters["b64encode"] = b64encode
-        env.filters['quote'] = lambda s: quote(s,safe='')
-        env.filters["hexencode"] = lambda s: "".join(
-            hex(ord(c))[2:].zfill(2) for c in s
-        )
         print("Rendering: " + template_path)
 
         # Create a template object by reading the file
@@ -53,7 +127,7 @@ def render(template_path):
 
         # Render the template
         rendered_content = template.render(**configs, exec=exec, os=os)
-        
+
         #     print(f"Warning jinja2: {template_path} - Empty")
 
         # Write the rendered content to a new file without the .j2 extension
@@ -71,19 +145,131 @@ def render(template_path):
             except Exception as e:
                 print(f"Error parsing json {template_path}: {e}", file=sys.stderr)
 
-        with open(output_file_path, "w", encoding="utf-8") as output_file:
-            output_file.write(str(rendered_content))
-
+        rendered_content = str(rendered_content)
         input_stat = os.stat(template_path)
-        os.chmod(output_file_path, input_stat.st_mode)
+        if read_text(output_file_path) != rendered_content:
+            with open(output_file_path, "w", encoding="utf-8") as output_file:
+                output_file.write(rendered_content)
+        else:
+            # Unchanged output is not rewritten so services watching mtime are not disturbed
+            print("Unchanged: " + output_file_path)
+
+        output_stat = os.stat(output_file_path)
+        if output_stat.st_mode != input_stat.st_mode:
+            os.chmod(output_file_path, input_stat.st_mode)
         # os.chmod(output_file_path, 0o600)
-        os.chown(output_file_path, input_stat.st_uid, input_stat.st_gid)
+        if (output_stat.st_uid, output_stat.st_gid) != (input_stat.st_uid, input_stat.st_gid):
+            os.chown(output_file_path, input_stat.st_uid, input_stat.st_gid)
+        return True
     except Exception as e:
         print(f"Error rendering {template_path}: {e}", file=sys.stderr)
         traceback.print_exc(file = sys.stderr)
+        return False
 
 
-def render_j2_templates(*start_paths):
+def read_text(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return None
+
+
+# Incremental rendering: a template is skipped when the fingerprint of its source,
+# everything it includes and the slice of current.json it references is unchanged.
+# Overridable so that rendering another tree does not touch the installed state
+state_file = os.environ.get("HIDDIFY_RENDER_STATE_FILE", "/opt/hiddify-manager/.jinja_render_state.json")
+# Templates calling these globals depend on the machine state, so they are always rendered
+volatile_globals = {"exec", "os"}
+
+
+def load_state():
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+        if state.get("version") == 1:
+            return state
+    except (FileNotFoundError, ValueError):
+        pass
+    return {"version": 1, "outputs": {}, "analysis": {}}
+
+
+def save_state(state):
+    tmp_path = state_file + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_file)
+
+
+class Fingerprinter:
+    def __init__(self, analysis_cache):
+        self.analysis_cache = analysis_cache
+        self.file_digests = {}
+        self.config_digests = {}
+        with open(__file__, "rb") as f:
+            self.script_digest = hashlib.sha256(f.read()).hexdigest()
+
+    def file_digest(self, path):
+        if path not in self.file_digests:
+            with open(path, "rb") as f:
+                self.file_digests[path] = hashlib.sha256(f.read()).hexdigest()
+        return self.file_digests[path]
+
+    def config_digest(self, name):
+        if name not in self.config_digests:
+            payload = json.dumps(configs[name], sort_keys=True, default=str)
+            self.config_digests[name] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return self.config_digests[name]
+
+    def analyze_file(self, name):
+        """Returns the resolved filename, included template names and variables of a single template."""
+        source, filename, _ = env.loader.get_source(env, name)
+        digest = self.file_digest(filename)
+        cached = self.analysis_cache.get(filename)
+        if cached and cached["digest"] == digest:
+            return filename, cached
+        ast = env.parse(source)
+        refs = list(meta.find_referenced_templates(ast))
+        analysis = {
+            "digest": digest,
+            "includes": [r for r in refs if r is not None],
+            "dynamic": None in refs,
+            "variables": sorted(meta.find_undeclared_variables(ast)),
+        }
+        self.analysis_cache[filename] = analysis
+        return filename, analysis
+
+    def collect(self, name, files, variables):
+        filename, analysis = self.analyze_file(name)
+        if filename in files:
+            return
+        files.add(filename)
+        variables.update(analysis["variables"])
+        for include in analysis["includes"]:
+            self.collect(include, files, variables)
+        if analysis["dynamic"]:
+            # Include path is computed at render time: depend on every partial next to the template
+            for root, dirs, partials in os.walk(os.path.dirname(filename)):
+                for partial in partials:
+                    if partial.endswith(".pj2"):
+                        self.collect(os.path.join(root, partial), files, variables)
+
+    def fingerprint(self, template_path):
+        """Returns the template fingerprint or None if the template must always be rendered."""
+        files, variables = set(), set()
+        self.collect(template_path, files, variables)
+        if variables & volatile_globals:
+            return None
+        h = hashlib.sha256(self.script_digest.encode())
+        for path in sorted(files):
+            h.update(f"{path}:{self.file_digest(path)}\n".encode())
+        for name in sorted(variables):
+            if name in configs:
+                h.update(f"{name}:{self.config_digest(name)}\n".encode())
+        return h.hexdigest()
+
+
+def render_j2_templates(*start_paths, incremental=False):
     # Set up the Jinja2 environment
 
     # Dirs to ignore from Jinja2 rendering
@@ -103,17 +289,66 @@ def render_j2_templates(*start_paths):
                     continue
                 templates_to_render.append(os.path.join(root, file))
 
-    # Render templates in parallel using ThreadPoolExecutor
-    with ProcessPoolExecutor(4) as executor:
-        executor.map(render, templates_to_render)
-    # for t in templates_to_render:
-    #     render(t)
+    state = load_state()
+    fingerprinter = Fingerprinter(state["analysis"])
+    fingerprints = {}
+    for template_path in templates_to_render:
+        try:
+            fingerprints[template_path] = fingerprinter.fingerprint(template_path)
+        except Exception as e:
+            print(f"Error fingerprinting {template_path}: {e}", file=sys.stderr)
+            fingerprints[template_path] = None
+
+    if incremental:
+        templates_to_render = [
+            t for t in templates_to_render
+            if fingerprints[t] is None
+            or state["outputs"].get(t) != fingerprints[t]
+            or not os.path.exists(os.path.splitext(t)[0])
+        ]
+    skipped = len(fingerprints) - len(templates_to_render)
+
+    # Render templates in parallel, one process per CPU
+    workers = min(os.cpu_count() or 1, len(templates_to_render))
+    exec_cache_dir = tempfile.mkdtemp(prefix="hiddify-exec-")
+    os.environ["HIDDIFY_EXEC_CACHE_DIR"] = exec_cache_dir
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(render, templates_to_render))
+        else:
+            results = [render(t) for t in templates_to_render]
+        stats = exec_stats(exec_cache_dir)
+    finally:
+        os.environ.pop("HIDDIFY_EXEC_CACHE_DIR", None)
+        shutil.rmtree(exec_cache_dir, ignore_errors=True)
+
+    for template_path, ok in zip(templates_to_render, results):
+        if ok and fingerprints[template_path] is not None:
+            state["outputs"][template_path] = fingerprints[template_path]
+        else:
+            state["outputs"].pop(template_path, None)
+    try:
+        save_state(state)
+    except OSError as e:
+        print(f"Error saving render state: {e}", file=sys.stderr)
+
+    print(f"Rendered {len(templates_to_render)} templates, skipped {skipped} unchanged")
+    print(
+        f"exec: {stats['misses'] + stats['uncached']} commands run, "
+        f"{stats['hits']} forks saved by cache"
+    )
 
 start_path = "/opt/hiddify-manager/"
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "apply_users":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    apply_users = len(args) > 0 and args[0] == "apply_users"
+    # apply_users runs after every user change, so it is incremental unless --full is given
+    incremental = "--incremental" in sys.argv or (apply_users and "--full" not in sys.argv)
+    if apply_users:
         render_j2_templates(
-            start_path + "singbox/", start_path + "xray/", start_path + "other/wireguard/"
+            start_path + "singbox/", start_path + "xray/", start_path + "other/wireguard/",
+            incremental=incremental
         )
     else:
-        render_j2_templates(start_path)
+        render_j2_templates(start_path, incremental=incremental)
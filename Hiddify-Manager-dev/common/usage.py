@@ -0,0 +1,210 @@
+#!/opt/hiddify-manager/.venv313/bin/python
+'''Usage accounting from raw xray and wireguard counters.
+
+Both sources expose cumulative byte counters per peer. A collection run parses
+the dump into NumPy arrays, subtracts the caller's previous snapshot of the source,
+folds the deltas into per-user and per-node totals, checks user quotas and then
+writes the report and the new snapshot in one go each. All per-peer work is
+array operations, so thousands of peers cost a few milliseconds.
+'''
+import json
+import os
+import subprocess
+import time
+
+import numpy as np
+
+HIDDIFY_DIR = '/opt/hiddify-manager/'
+USAGE_DIR = os.path.join(HIDDIFY_DIR, 'log', 'usage')
+CURRENT_JSON = os.path.join(HIDDIFY_DIR, 'current.json')
+XRAY_BIN = os.path.join(HIDDIFY_DIR, 'xray/bin/xray')
+XRAY_API = '127.0.0.1:10085'
+WG_INTERFACE = 'hiddifywg'
+
+GB = 1 << 30
+USER_EMAIL_SUFFIX = '@hiddify.com'
+
+
+class Counters:
+    '''Cumulative counters of one source: peer keys sorted, with node, upload and download columns.'''
+
+    def __init__(self, keys, nodes, up, down):
+        order = np.lexsort((keys, nodes))
+        self.keys = np.asarray(keys, dtype=str)[order]
+        self.nodes = np.asarray(nodes, dtype=np.int32)[order]
+        self.up = np.asarray(up, dtype=np.int64)[order]
+        self.down = np.asarray(down, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.array([], dtype=str), [], [], [])
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, keys=self.keys, nodes=self.nodes, up=self.up, down=self.down)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with np.load(path) as data:
+                return cls(data['keys'], data['nodes'], data['up'], data['down'])
+        except (OSError, KeyError, ValueError):
+            return cls.empty()
+
+
+def parse_wg_transfer(text, node=0):
+    '''`wg show <iface> transfer`: "<public key>\\t<received>\\t<sent>" per peer.
+
+    Received by the server is the peer's upload, sent is its download.
+    '''
+    fields = np.array(text.split(), dtype=str)
+    if len(fields) % 3:
+        raise ValueError(f'Unexpected wg transfer output ({len(fields)} fields)')
+    fields = fields.reshape(-1, 3)
+    return Counters(fields[:, 0], np.full(len(fields), node), fields[:, 1].astype(np.int64), fields[:, 2].astype(np.int64))
+
+
+def parse_xray_stats(text, node=0):
+    '''`xray api statsquery` JSON: user>>>{email}>>>traffic>>>{uplink,downlink} entries.
+
+    Zero values are omitted by xray and some versions print values as strings.
+    '''
+    emails, uplink, values = [], [], []
+    for stat in json.loads(text or '{}').get('stat') or []:
+        parts = stat.get('name', '').split('>>>')
+        if len(parts) == 4 and parts[0] == 'user' and parts[2] == 'traffic':
+            emails.append(parts[1].removesuffix(USER_EMAIL_SUFFIX))
+            uplink.append(parts[3] == 'uplink')
+            values.append(int(stat.get('value') or 0))
+    if not emails:
+        return Counters.empty()
+    uplink = np.array(uplink)
+    values = np.array(values, dtype=np.int64)
+
+    keys, inverse = np.unique(emails, return_inverse=True)
+    up = np.bincount(inverse, weights=np.where(uplink, values, 0), minlength=len(keys))
+    down = np.bincount(inverse, weights=np.where(uplink, 0, values), minlength=len(keys))
+    return Counters(keys, np.full(len(keys), node), up.astype(np.int64), down.astype(np.int64))
+
+
+def align(current, previous):
+    '''Position of every current peer in previous, -1 for new peers.'''
+    if np.array_equal(current.nodes, previous.nodes) and np.array_equal(current.keys, previous.keys):
+        # The usual case: the peer set did not change between runs
+        return np.arange(len(current))
+    index = np.full(len(current), -1)
+    # Both sides are sorted by (node, key): match keys within each node's slice
+    for node in np.unique(current.nodes):
+        c0, c1 = np.searchsorted(current.nodes, [node, node + 1])
+        p0, p1 = np.searchsorted(previous.nodes, [node, node + 1])
+        if p0 == p1:
+            continue
+        keys, prev_keys = current.keys[c0:c1], previous.keys[p0:p1]
+        pos = np.minimum(np.searchsorted(prev_keys, keys), len(prev_keys) - 1)
+        index[c0:c1] = np.where(prev_keys[pos] == keys, p0 + pos, -1)
+    return index
+
+
+def deltas(current, previous):
+    '''Bytes transferred since the previous snapshot, aligned with current.
+
+    A counter lower than before means the service restarted; then the whole
+    current value is new traffic. Peers absent from the previous snapshot count from zero.
+    '''
+    index = align(current, previous)
+    known = index >= 0
+    prev_up = np.where(known, previous.up[index], 0) if len(previous) else 0
+    prev_down = np.where(known, previous.down[index], 0) if len(previous) else 0
+    up = np.where(current.up >= prev_up, current.up - prev_up, current.up)
+    down = np.where(current.down >= prev_down, current.down - prev_down, current.down)
+    return up, down
+
+
+class Users:
+    '''User table from current.json as arrays, with lookups by uuid and by wireguard public key.'''
+
+    def __init__(self, users):
+        self.uuids = np.array([u['uuid'] for u in users], dtype=str)
+        self.wg_pubs = np.array([u.get('wg_pub') or '' for u in users], dtype=str)
+        limit = [u.get('usage_limit_GB', u.get('monthly_usage_limit_GB')) or 0 for u in users]
+        self.limit = (np.array(limit, dtype=np.float64) * GB).astype(np.int64)
+        self.used = (np.array([u.get('current_usage_GB') or 0 for u in users], dtype=np.float64) * GB).astype(np.int64)
+        self._by_uuid = np.argsort(self.uuids)
+        self._by_wg_pub = np.argsort(self.wg_pubs)
+
+    def __len__(self):
+        return len(self.uuids)
+
+    @classmethod
+    def load(cls, path=CURRENT_JSON):
+        with open(path) as f:
+            return cls(json.load(f).get('users') or [])
+
+    def lookup(self, keys, by='uuid'):
+        '''User index for every key, -1 for unknown peers.'''
+        column, order = (self.uuids, self._by_uuid) if by == 'uuid' else (self.wg_pubs, self._by_wg_pub)
+        if not len(order):
+            return np.full(len(keys), -1)
+        pos = np.minimum(np.searchsorted(column, keys, sorter=order), len(order) - 1)
+        index = order[pos]
+        return np.where((column[index] == keys) & (keys != ''), index, -1)
+
+
+def account(current, previous, users, by='uuid'):
+    '''Per-user and per-node totals of the traffic since previous, plus quota breaches.'''
+    up, down = deltas(current, previous)
+    user = users.lookup(current.keys, by=by)
+    known = user >= 0
+
+    user_up = np.bincount(user[known], weights=up[known], minlength=len(users)).astype(np.int64)
+    user_down = np.bincount(user[known], weights=down[known], minlength=len(users)).astype(np.int64)
+
+    node_ids, node_index = np.unique(current.nodes, return_inverse=True)
+    node_up = np.bincount(node_index, weights=up, minlength=len(node_ids)).astype(np.int64)
+    node_down = np.bincount(node_index, weights=down, minlength=len(node_ids)).astype(np.int64)
+
+    used = users.used + user_up + user_down
+    breached = (users.limit > 0) & (used >= users.limit)
+    newly = breached & (users.used < users.limit)
+
+    active = np.flatnonzero(user_up + user_down)
+    return {
+        'users': {uuid: [u, d] for uuid, u, d in zip(users.uuids[active].tolist(), user_up[active].tolist(), user_down[active].tolist())},
+        'nodes': {str(n): [u, d] for n, u, d in zip(node_ids.tolist(), node_up.tolist(), node_down.tolist())},
+        'breached': users.uuids[breached].tolist(),
+        'newly_breached': users.uuids[newly].tolist(),
+        'unknown_peers': int(len(user) - known.sum()),
+    }
+
+
+def collect(source, current, users, consumer, usage_dir=USAGE_DIR):
+    '''Accounts one source against its stored snapshot and writes the report and the new snapshot.
+
+    Every consumer keeps its own snapshot and report: a run only advances the
+    baseline of its caller, so one command cannot swallow the deltas another reports.
+    '''
+    os.makedirs(usage_dir, exist_ok=True)
+    snapshot_path = os.path.join(usage_dir, f'{source}.{consumer}.npz')
+    report = account(current, Counters.load(snapshot_path), users, by='wg_pub' if source == 'wg' else 'uuid')
+    report['source'] = source
+    report['time'] = int(time.time())
+
+    report_path = os.path.join(usage_dir, f'{source}.{consumer}.json')
+    with open(report_path + '.tmp', 'w') as f:
+        f.write(json.dumps(report))
+    os.replace(report_path + '.tmp', report_path)
+    current.save(snapshot_path)
+    return report
+
+
+def read_wg_transfer(interface=WG_INTERFACE):
+    return subprocess.check_output(['wg', 'show', interface, 'transfer']).decode()
+
+
+def read_xray_stats():
+    # Counters are not reset: the panel reads the same stats for its own accounting
+    return subprocess.check_output([XRAY_BIN, 'api', 'statsquery', f'--server={XRAY_API}', '-pattern', 'user>>>']).decode()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк label selector по nodes.labels на 10k и 100k узлов.
+
+Данные генерируются во временной таблице с той же колонкой labels и тем же
+GIN-индексом, что и nodes, поэтому боевые таблицы не затрагиваются.
+Каждый селектор выполняется с индексом и с отключенным индексным доступом
+(seq scan), печатается медиана времени и узел плана.
+
+Использование:
+    python scripts/bench_label_selector.py [--sizes 10000,100000] [--repeat 20]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import os
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, func, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from src.core.config import settings
+from src.core.selectors import LabelSelector
+
+SELECTORS = [
+    "region=EU",
+    "region=EU,tier=production",
+    "region=EU,tier!=canary",
+    "provider in (hetzner,ovh)",
+    "region=US,provider in (hetzner,ovh),!spot",
+    "gpu",
+]
+
+metadata = MetaData()
+bench_nodes = Table(
+    "bench_nodes",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("labels", JSONB, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+# Распределение меток похоже на боевое: 5 регионов, 6 провайдеров, 3 тира,
+# редкие метки gpu/spot
+FILL_SQL = """
+INSERT INTO bench_nodes (id, labels)
+SELECT i, jsonb_strip_nulls(jsonb_build_object(
+    'region', (ARRAY['EU','US','ASIA','RU','LATAM'])[1 + i % 5],
+    'provider', (ARRAY['hetzner','ovh','digitalocean','vultr','aws','linode'])[1 + (i / 5) % 6],
+    'tier', (ARRAY['production','production','production','canary','staging'])[1 + (i / 30) % 5],
+    'gpu', CASE WHEN i % 97 = 0 THEN 'true' END,
+    'spot', CASE WHEN i % 7 = 0 THEN 'true' END
+))
+FROM generate_series(1, :size) AS i
+"""
+
+def run_selector(conn, selector: LabelSelector, repeat: int):
+    query = select(func.count()).select_from(bench_nodes).where(selector.where(bench_nodes.c.labels))
+    compiled = query.compile(conn)
+    params = {k: json.dumps(v) if isinstance(v, dict) else v for k, v in compiled.params.items()}
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params).scalar()[0]["Plan"]
+    while plan.get("Plans") and plan["Node Type"] in ("Aggregate", "Gather", "Finalize Aggregate", "Partial Aggregate"):
+        plan = plan["Plans"][0]
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = conn.execute(query).scalar()
+        timings.append((time.perf_counter() - started) * 1000)
+    return count, statistics.median(timings), plan["Node Type"]
+
+def bench(engine, size: int, repeat: int):
+    with engine.connect() as conn:
+        metadata.create_all(conn)
+        conn.execute(text(FILL_SQL), {"size": size})
+        conn.execute(text("CREATE INDEX ix_bench_nodes_labels_gin ON bench_nodes USING gin (labels)"))
+        conn.execute(text("ANALYZE bench_nodes"))
+
+        print(f"\n📊 {size} nodes")
+        print(f"  {'selector':<45} {'rows':>7} {'gin, ms':>9} {'plan':<18} {'seq, ms':>9}")
+        for raw in SELECTORS:
+            selector = LabelSelector.parse(raw)
+            count, indexed_ms, plan = run_selector(conn, selector, repeat)
+            conn.execute(text("SET enable_bitmapscan = off"))
+            conn.execute(text("SET enable_indexscan = off"))
+            _, seq_ms, _ = run_selector(conn, selector, repeat)
+            conn.execute(text("RESET enable_bitmapscan"))
+            conn.execute(text("RESET enable_indexscan"))
+            print(f"  {raw:<45} {count:>7} {indexed_ms:>9.2f} {plan:<18} {seq_ms:>9.2f}")
+        conn.rollback()
+
+def main():
+    parser = argparse.ArgumentParser(description="Label selector benchmark")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            bench(engine, size, args.repeat)
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк накладных расходов трассировки (core.tracing).
+
+Меряет цену span() вне трассы (так работает весь код при TRACE_SAMPLE_RATE=0
+и в запросах, не попавших в выборку) и внутри трассы, а также полный цикл
+выборочного запроса: корневой span, N дочерних, экспорт в OTLP JSON.
+
+Использование:
+    python scripts/bench_tracing.py [--iterations 1000000] [--spans 10]
+"""
+
+import argparse
+import sys
+import os
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.tracing import Tracer, span
+
+def per_call_ns(fn, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - started) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    parser.add_argument("--spans", type=int, default=10)
+    args = parser.parse_args()
+
+    def baseline():
+        pass
+
+    def untraced():
+        with span("bench"):
+            pass
+
+    tracer = Tracer("bench", sample_rate=1.0, buffer_size=1000)
+
+    def traced_request():
+        root = tracer.start("bench.request")
+        with root:
+            for _ in range(args.spans):
+                with span("bench", n=1):
+                    pass
+        tracer.finish(root)
+        tracer.to_otlp([root.trace])
+
+    base = per_call_ns(baseline, args.iterations)
+    print(f"\n📊 span() overhead, {args.iterations} iterations")
+    print(f"  outside a trace     {per_call_ns(untraced, args.iterations) - base:8.0f} ns/span")
+    root = tracer.start("bench.request")
+    with root:
+        print(f"  inside a trace      {per_call_ns(untraced, args.iterations // 10) - base:8.0f} ns/span")
+    print(f"  sampled request     {per_call_ns(traced_request, args.iterations // 100) / 1000:8.1f} us "
+          f"(root + {args.spans} spans + OTLP export)")
+
+if __name__ == "__main__":
+    main()
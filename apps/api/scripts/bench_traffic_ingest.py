@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетной загрузки трафика (TrafficService.ingest_stream).
+
+Генерирует поминутные семплы для --nodes узлов за последние минуты,
+кодирует их в бинарные кадры и NDJSON и прогоняет через тот же разбор
+потока и COPY, что и POST /v1/metrics/traffic. Каждая пачка загружается
+дважды: второй прогон проверяет идемпотентный upsert. Цель — 100k строк/с.
+
+Узлы берутся из диапазона --node-base, после прогона их строки удаляются.
+
+Использование:
+    python scripts/bench_traffic_ingest.py [--samples 200000] [--nodes 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import os
+import time
+
+# Добавляем путь к модулям
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import delete
+
+from src.deps import SessionLocal, engine
+from src.models import TrafficSample1m
+from src.services.traffic import (
+    TrafficService, encode_frame, iter_frame_records, iter_ndjson_records, traffic_rollup
+)
+
+TARGET_ROWS_PER_SEC = 100_000
+CHUNK_SIZE = 64 * 1024
+
+def generate(samples: int, nodes: int, node_base: int):
+    now = int(time.time()) // 60 * 60
+    minutes = max(samples // nodes, 1)
+    records = []
+    for minute in range(minutes):
+        bucket = now - (minutes - minute) * 60
+        for node in range(nodes):
+            records.append((node_base + node, bucket, 1_000_000 + node, 2_000_000 + minute, node % 500))
+    return records[:samples]
+
+async def body(payload: bytes):
+    # Имитация request.stream(): тело приходит кусками
+    for i in range(0, len(payload), CHUNK_SIZE):
+        yield payload[i:i + CHUNK_SIZE]
+
+def encode_frames(records, frame_records: int = 4096) -> bytes:
+    return b"".join(encode_frame(records[i:i + frame_records]) for i in range(0, len(records), frame_records))
+
+def encode_ndjson(records) -> bytes:
+    return b"".join(json.dumps(list(r)).encode() + b"\n" for r in records)
+
+async def run(name: str, payload: bytes, parser):
+    for attempt in ("insert", "upsert"):
+        async with SessionLocal() as db:
+            result = await TrafficService(db).ingest_stream(parser(body(payload)))
+        verdict = "✅" if result.rows_per_sec >= TARGET_ROWS_PER_SEC else "⚠️"
+        print(
+            f"  {name:<8} {attempt:<7} {result.received:>8} rows  {result.accepted:>8} accepted  {result.written:>8} written  "
+            f"{result.seconds:>7.3f}s  {result.rows_per_sec:>10.0f} rows/s {verdict}"
+        )
+
+async def main():
+    parser = argparse.ArgumentParser(description="Traffic bulk ingest benchmark")
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--node-base", type=int, default=900_000)
+    args = parser.parse_args()
+
+    await traffic_rollup.ensure_partitions()
+    records = generate(args.samples, args.nodes, args.node_base)
+    frames, ndjson = encode_frames(records), encode_ndjson(records)
+    print(f"\n📊 {len(records)} samples, {args.nodes} nodes "
+          f"(frames {len(frames) / 2**20:.1f} MiB, ndjson {len(ndjson) / 2**20:.1f} MiB)")
+    try:
+        await run("frames", frames, iter_frame_records)
+        await run("ndjson", ndjson, iter_ndjson_records)
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(TrafficSample1m).where(
+                TrafficSample1m.node_id.between(args.node_base, args.node_base + args.nodes)
+            ))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+
+from prometheus_client import Counter, Gauge
+
+CACHE_REQUESTS = Counter('mindvpn_cache_requests_total', 'Cache lookups', ['cache', 'result'])
+CACHE_HIT_RATIO = Gauge('mindvpn_cache_hit_ratio', 'Share of cache lookups served without recomputation', ['cache'])
+
+class TTLCache:
+    """
+    Асинхронный TTL-кэш с защитой от stampede.
+
+    Пока значение для ключа вычисляется, все конкурентные запросы ждут
+    одно и то же вычисление вместо запуска собственного.
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self._values: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._hits = 0
+        self._misses = 0
+        CACHE_HIT_RATIO.labels(cache=name).set_function(self.hit_ratio)
+
+    def hit_ratio(self) -> float:
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.0
+
+    def invalidate(self, key: Hashable = None) -> None:
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Any]],
+        fresh: bool = False
+    ) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его.
+
+        Args:
+            key: Ключ кэша
+            compute: Корутина-фабрика, вычисляющая значение
+            fresh: Игнорировать закэшированное значение и пересчитать
+
+        Returns:
+            Закэшированное или только что вычисленное значение
+        """
+        if not fresh:
+            entry = self._values.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._record(hit=True)
+                return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            # Присоединяемся к уже идущему вычислению
+            self._record(hit=True)
+        else:
+            self._record(hit=False)
+            task = asyncio.create_task(self._compute(key, compute))
+            self._inflight[key] = task
+
+        # shield: отмена одного запроса не должна отменять общее вычисление
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self._values[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="hit" if hit else "miss").inc()
+
+class VersionedCache:
+    """
+    Асинхронный LRU-кэш с точечной инвалидацией вместо TTL.
+
+    Каждая инвалидация продвигает логические часы и помечает ключ или тег
+    (например, организацию) текущим временем. Значение действительно, пока
+    ни его ключ, ни один из его тегов не помечены позже момента начала
+    вычисления, поэтому результат, вычисленный параллельно с изменением,
+    не попадает в кэш. Запросы после инвалидации не присоединяются к уже
+    идущим вычислениям: теги вычисления до его окончания неизвестны, поэтому
+    сбрасываются все.
+
+    max_age — страховка для изменений, о которых кэш не узнает (сырой SQL,
+    другие процессы без общей шины): значение старше max_age секунд
+    вычисляется заново; 0 — без ограничения.
+    """
+
+    def __init__(self, name: str, maxsize: int, max_age: float = 0):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._clock = 0
+        self._marks: Dict[Hashable, int] = {}
+        self._values: "OrderedDict[Hashable, Tuple[int, Tuple[Hashable, ...], Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._hits = 0
+        self._misses = 0
+        CACHE_HIT_RATIO.labels(cache=name).set_function(self.hit_ratio)
+
+    def hit_ratio(self) -> float:
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.0
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Инвалидирует значения по ключам и тегам; без аргументов — весь кэш."""
+        self._clock += 1
+        # Новые запросы должны начать свое вычисление; ждущие получат начатое
+        self._inflight.clear()
+        if not keys:
+            self._values.clear()
+            self._marks.clear()
+            self._marks[None] = self._clock
+            return
+        for key in keys:
+            self._marks[key] = self._clock
+            self._values.pop(key, None)
+
+    def _valid(self, stamp: int, key: Hashable, tags: Iterable[Hashable]) -> bool:
+        marks = self._marks
+        return (
+            marks.get(None, 0) < stamp
+            and marks.get(key, 0) < stamp
+            and all(marks.get(tag, 0) < stamp for tag in tags)
+        )
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Tuple[Any, Iterable[Hashable]]]]
+    ) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его.
+
+        Args:
+            key: Ключ кэша
+            compute: Корутина-фабрика, возвращающая (значение, теги значения)
+
+        Returns:
+            Закэшированное или только что вычисленное значение
+        """
+        entry = self._values.get(key)
+        if entry is not None and self._valid(entry[0], key, entry[1]) and entry[3] > time.monotonic():
+            self._values.move_to_end(key)
+            self._record(hit=True)
+            return entry[2]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._record(hit=True)
+        else:
+            self._record(hit=False)
+            # Время фиксируется до запуска задачи и чтения данных: изменения
+            # после этого момента инвалидируют результат
+            self._clock += 1
+            task = asyncio.create_task(self._compute(key, compute, self._clock))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Tuple[Any, Iterable[Hashable]]]],
+        stamp: int
+    ) -> Any:
+        try:
+            value, tags = await compute()
+            tags = tuple(tags)
+            if self.maxsize > 0 and self._valid(stamp, key, tags):
+                expires_at = time.monotonic() + self.max_age if self.max_age > 0 else float("inf")
+                self._values[key] = (stamp, tags, value, expires_at)
+                self._values.move_to_end(key)
+                while len(self._values) > self.maxsize:
+                    self._values.popitem(last=False)
+            return value
+        finally:
+            # После инвалидации под ключом может уже идти новое вычисление
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def _record(self, hit: bool) -> None:
+        if hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="hit" if hit else "miss").inc()
@@ -0,0 +1,77 @@
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+
+from ..deps import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Кодирует позицию (created_at, id) последней строки страницы в непрозрачный курсор."""
+    raw = f"{created_at.isoformat()}|{id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_paginate(query: Select, model, cursor: Optional[str], limit: Optional[int]) -> Select:
+    """
+    Применяет keyset-пагинацию по (created_at, id), от новых к старым.
+
+    Args:
+        query: Запрос с уже примененными фильтрами
+        model: Модель с колонками created_at и id
+        cursor: Курсор из заголовка X-Next-Cursor предыдущей страницы
+        limit: Размер страницы; None — без ограничения (для стриминга)
+
+    Returns:
+        Запрос, отсортированный по индексу (created_at, id)
+    """
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, id))
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница
+        query = query.limit(limit + 1)
+    return query
+
+def page_cursor(items: Sequence, limit: int) -> Tuple[Sequence, Optional[str]]:
+    """Отрезает лишнюю строку и возвращает (страница, курсор следующей страницы)."""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor(last.created_at, last.id)
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def stream_ndjson(query: Select, schema: Type[BaseModel], batch_size: int = 1000) -> StreamingResponse:
+    """
+    Отдает результат запроса как NDJSON через серверный курсор.
+
+    Строки читаются пачками по batch_size, поэтому память API не зависит
+    от размера выборки.
+    """
+    async def rows() -> AsyncIterator[bytes]:
+        # Своя сессия: стрим продолжается после выхода из обработчика запроса
+        async with SessionLocal() as db:
+            result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                yield "".join(
+                    schema.model_validate(row).model_dump_json() + "\n" for row in partition
+                ).encode("utf-8")
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
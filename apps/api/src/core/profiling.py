@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+class SamplingProfiler:
+    """
+    Статистический профайлер процесса по sys._current_frames().
+
+    Фоновый поток раз в interval снимает стеки всех остальных потоков и
+    считает одинаковые стеки. Результат — collapsed stacks
+    ("поток;функция;...;функция N" на строку), которые напрямую принимают
+    flamegraph.pl, speedscope и inferno. Пока профайлер не запущен, он ничего
+    не стоит; одновременно работает один запуск.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    def run(self, seconds: float, interval: float) -> str:
+        """Блокирует вызывающий поток на seconds; вызывать через asyncio.to_thread."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("Profiler is already running")
+        try:
+            return self._sample(seconds, interval)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        counts: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+profiler = SamplingProfiler()
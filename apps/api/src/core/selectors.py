@@ -0,0 +1,147 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, false, not_, or_, true
+from sqlalchemy.sql.elements import ColumnElement
+
+# Ключ в стиле Kubernetes: необязательный префикс через "/" и имя
+_KEY = r"[A-Za-z0-9](?:[A-Za-z0-9_./-]*[A-Za-z0-9])?"
+_VALUE = r"(?:[A-Za-z0-9](?:[A-Za-z0-9_.-]*[A-Za-z0-9])?)?"
+
+_SET_RE = re.compile(rf"^({_KEY})\s+(in|notin)\s+\(([^()]*)\)$")
+_EQUALITY_RE = re.compile(rf"^({_KEY})\s*(==|=|!=)\s*({_VALUE})$")
+_EXISTS_RE = re.compile(rf"^(!?)\s*({_KEY})$")
+_VALUE_RE = re.compile(rf"^{_VALUE}$")
+
+class SelectorError(ValueError):
+    """Ошибка разбора label selector."""
+
+@dataclass(frozen=True)
+class Requirement:
+    key: str
+    operator: str  # =, !=, in, notin, exists, !exists
+    values: Tuple[str, ...] = ()
+
+    def matches(self, labels: Dict[str, object]) -> bool:
+        """Проверяет требование на словаре меток (та же семантика, что и в SQL)."""
+        present = self.key in labels
+        value = labels.get(self.key)
+        if self.operator == "exists":
+            return present
+        if self.operator == "!exists":
+            return not present
+        if self.operator in ("=", "in"):
+            return present and value in self.values
+        return not present or value not in self.values
+
+def _split_terms(selector: str) -> List[str]:
+    """Разбивает селектор по запятым верхнего уровня (запятые внутри скобок in/notin не считаются)."""
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(selector):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth < 0:
+                raise SelectorError("Unbalanced parentheses in label selector")
+        elif char == "," and depth == 0:
+            terms.append(selector[start:i].strip())
+            start = i + 1
+    if depth != 0:
+        raise SelectorError("Unbalanced parentheses in label selector")
+    terms.append(selector[start:].strip())
+    return terms
+
+def _parse_term(term: str) -> Requirement:
+    match = _SET_RE.match(term)
+    if match:
+        key, operator, raw_values = match.groups()
+        values = tuple(v.strip() for v in raw_values.split(","))
+        if not raw_values.strip() or any(not _VALUE_RE.match(v) for v in values):
+            raise SelectorError(f"Invalid value list in label selector term: {term!r}")
+        return Requirement(key, operator, tuple(dict.fromkeys(values)))
+
+    match = _EQUALITY_RE.match(term)
+    if match:
+        key, operator, value = match.groups()
+        return Requirement(key, "!=" if operator == "!=" else "=", (value,))
+
+    match = _EXISTS_RE.match(term)
+    if match:
+        negated, key = match.groups()
+        return Requirement(key, "!exists" if negated else "exists")
+
+    raise SelectorError(f"Invalid label selector term: {term!r}")
+
+class LabelSelector:
+    """
+    Label selector в синтаксисе Kubernetes, компилируемый в предикаты JSONB.
+
+    Поддерживаются термы через запятую (все должны выполняться):
+        region=EU, region==EU       — метка равна значению
+        tier!=canary                — метки нет или она не равна значению
+        provider in (hetzner,ovh)   — метка равна одному из значений
+        provider notin (hetzner)    — метки нет или она не из списка
+        gpu, !gpu                   — метка есть / метки нет
+
+    Все предикаты — это @> (containment) и ? (has_key) по колонке JSONB,
+    которые обслуживаются GIN-индексом; фильтрация выполняется в БД.
+    """
+
+    def __init__(self, requirements: List[Requirement]):
+        self.requirements = requirements
+
+    @classmethod
+    def parse(cls, selector: Optional[str]) -> "LabelSelector":
+        if selector is None or not selector.strip():
+            return cls([])
+        return cls([_parse_term(term) for term in _split_terms(selector)])
+
+    def __bool__(self) -> bool:
+        return bool(self.requirements)
+
+    def __str__(self) -> str:
+        parts = []
+        for r in self.requirements:
+            if r.operator == "exists":
+                parts.append(r.key)
+            elif r.operator == "!exists":
+                parts.append(f"!{r.key}")
+            elif r.operator in ("=", "!="):
+                parts.append(f"{r.key}{r.operator}{r.values[0]}")
+            else:
+                parts.append(f"{r.key} {r.operator} ({','.join(r.values)})")
+        return ",".join(parts)
+
+    def matches(self, labels: Dict[str, object]) -> bool:
+        return all(r.matches(labels) for r in self.requirements)
+
+    def where(self, column) -> ColumnElement:
+        """
+        Компилирует селектор в SQL-условие для JSONB-колонки.
+
+        Все равенства объединяются в один @>, чтобы планировщик мог взять
+        их одним сканом GIN-индекса; in раскрывается в OR из @>.
+        """
+        equals: Dict[str, str] = {}
+        clauses = []
+        for r in self.requirements:
+            if r.operator == "=":
+                if equals.get(r.key, r.values[0]) != r.values[0]:
+                    # key=a,key=b — заведомо пустая выборка
+                    return false()
+                equals[r.key] = r.values[0]
+            elif r.operator == "in":
+                clauses.append(or_(*(column.contains({r.key: v}) for v in r.values)))
+            elif r.operator == "!=":
+                clauses.append(not_(column.contains({r.key: r.values[0]})))
+            elif r.operator == "notin":
+                clauses.append(not_(or_(*(column.contains({r.key: v}) for v in r.values))))
+            elif r.operator == "exists":
+                clauses.append(column.has_key(r.key))
+            else:
+                clauses.append(not_(column.has_key(r.key)))
+        if equals:
+            clauses.insert(0, column.contains(equals))
+        return and_(true(), *clauses)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Текущий span запроса; None — запрос не попал в выборку
+_current_span: ContextVar[Optional["Span"]] = ContextVar("mindvpn_current_span", default=None)
+
+# Контекст-менеджер без действий, общий для всех вызовов вне трассы
+_NOOP = nullcontext()
+
+class Span:
+    """Отрезок трассы. Атрибуты и время — в терминах OTLP (наносекунды unix-времени)."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "_token")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self._token = None
+        trace.spans.append(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        _current_span.reset(self._token)
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+
+def span(name: str, **attributes: Any):
+    """
+    Дочерний span текущей трассы.
+
+    Вне трассы возвращает общий nullcontext: цена вызова — чтение ContextVar,
+    поэтому span() можно оставлять в горячем коде.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+class Tracer:
+    """
+    Выборочная трассировка запросов с экспортом в OTLP JSON.
+
+    В трассу попадает доля settings.trace_sample_rate запросов. Завершенные
+    трассы хранятся в кольцевом буфере (для /debug/traces) и, если задан
+    export_path, дописываются туда строками OTLP JSON (по трассе на строку,
+    как у file exporter'а OpenTelemetry Collector).
+
+    Запись в файл не выполняется в цикле событий: finish() только ставит
+    трассу в очередь, а фоновая задача (start_exporter) сериализует и пишет
+    накопленное в отдельном потоке. Если запись не успевает, в очереди
+    остаются последние buffer_size трасс.
+    """
+
+    def __init__(self, service_name: str, sample_rate: float, buffer_size: int, export_path: str = ""):
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self.export_path = export_path
+        self.recent: deque = deque(maxlen=buffer_size)
+        self._pending: deque = deque(maxlen=buffer_size)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self, name: str, **attributes: Any) -> Optional[Span]:
+        """Корневой span запроса или None, если запрос не попал в выборку."""
+        if random.random() >= self.sample_rate:
+            return None
+        return Span(Trace(), name, None, attributes)
+
+    def finish(self, root: Span) -> None:
+        self.recent.append(root.trace)
+        if self.export_path:
+            self._pending.append(root.trace)
+            self._wakeup.set()
+
+    async def start_exporter(self) -> None:
+        if self.export_path and self._task is None:
+            self._task = asyncio.create_task(self._export_loop())
+
+    async def stop_exporter(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Дописываем то, что осталось в очереди
+        await self._export_pending()
+
+    async def _export_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._export_pending()
+
+    async def _export_pending(self) -> None:
+        if not self._pending:
+            return
+        traces = list(self._pending)
+        self._pending.clear()
+        try:
+            await asyncio.to_thread(self._write, traces)
+        except Exception:
+            logger.exception("Trace export failed")
+
+    def _write(self, traces: List[Trace]) -> None:
+        lines = [json.dumps(self.to_otlp([trace]), separators=(",", ":")) + "\n" for trace in traces]
+        with open(self.export_path, "a") as f:
+            f.writelines(lines)
+
+    def to_otlp(self, traces: List[Trace]) -> Dict[str, Any]:
+        spans = [
+            {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": 2 if s.parent_id is None else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [_otlp_attribute(k, v) for k, v in s.attributes.items()],
+            }
+            for trace in traces for s in trace.spans
+        ]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "mindvpn"}, "spans": spans}],
+            }]
+        }
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def instrument_engine(engine) -> None:
+    """Span на каждый SQL-запрос внутри трассы; слушатели вешаются только при включенной трассировке."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is not None:
+            context._mindvpn_span_start = time.time_ns()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_mindvpn_span_start", None)
+        parent = _current_span.get()
+        if started is None or parent is None:
+            return
+        s = Span(parent.trace, "db.query", parent.span_id, {
+            "db.system": "postgresql",
+            "db.statement": statement[:500],
+            "db.executemany": executemany,
+        })
+        s.start_ns = started
+        s.end_ns = time.time_ns()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+tracer = Tracer(
+    service_name="mindvpn-api",
+    sample_rate=settings.trace_sample_rate,
+    buffer_size=settings.trace_buffer_size,
+    export_path=settings.trace_export_path
+)
@@ -1,19 +1,52 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+import time
+from typing import AsyncGenerator
+
+from prometheus_client import Histogram
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .core.config import settings
 
-# Создаем engine для подключения к БД
-engine = create_engine(settings.database_url)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'mindvpn_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the DB pool',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий время ожидания свободного соединения."""
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start_time)
+
+def async_database_url(url: str) -> str:
+    """Переводит DSN на асинхронный драйвер asyncpg."""
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgresql+psycopg2", "postgres"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+# Создаем асинхронный engine с настраиваемым пулом
+engine = create_async_engine(
+    async_database_url(settings.database_url),
+    poolclass=TimedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    echo=settings.db_echo,
+)
 
 # Создаем SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
-def get_db() -> Generator[Session, None, None]:
-    """Dependency для получения сессии БД."""
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency для получения асинхронной сессии БД."""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -5,25 +5,98 @@ from contextlib import asynccontextmanager
 import prometheus_client
 from prometheus_client import Counter, Histogram, Gauge
 import time
+from typing import Tuple
 
-from .deps import get_db
-from .routers import nodes, tasks, users, bundles, metrics
+from .deps import get_db, engine
+from .routers import nodes, tasks, users, bundles, metrics, events, debug
 from .services.metrics import setup_metrics
+from .services.heartbeats import heartbeat_buffer
+from .services.node_health import node_health
+from .services.node_scores import node_scores
+from .services.dispatch import task_dispatcher
+from .services.events import event_bus
+from .services.reaper import task_reaper
+from .services.task_logs import task_log_compactor
+from .services.traffic import traffic_rollup
 from .core.config import settings
+from .core.tracing import instrument_engine, tracer
 
-# Prometheus metrics
+# Prometheus metrics; endpoint — шаблон маршрута (/v1/nodes/{node_id}/heartbeat), а не путь запроса
 REQUEST_COUNT = Counter('mindvpn_http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_LATENCY = Histogram('mindvpn_http_request_duration_seconds', 'HTTP request latency')
-ACTIVE_CONNECTIONS = Gauge('mindvpn_active_connections', 'Number of active connections')
+REQUEST_LATENCY = Histogram(
+    'mindvpn_http_request_duration_seconds',
+    'HTTP request latency',
+    ['method', 'endpoint'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+ACTIVE_CONNECTIONS = Gauge('mindvpn_active_connections', 'HTTP requests in flight')
+
+UNMATCHED_ENDPOINT = "<unmatched>"
+OVERFLOW_ENDPOINT = "<overflow>"
+# Метод — любой токен, который пропустил HTTP-парсер; нестандартные сводятся в одну метку
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+OTHER_METHOD = "OTHER"
+# Пары (method, шаблон) объявленных маршрутов; в лимит не входят
+_route_series = set()
+_endpoint_series = set()
+
+def register_routes(routes) -> None:
+    """Заранее регистрирует метки всех объявленных маршрутов, чтобы их не вытеснили случайные пары."""
+    for route in routes:
+        path = getattr(route, "path", None)
+        for method in getattr(route, "methods", None) or ():
+            if path and method in HTTP_METHODS:
+                _route_series.add((method, path))
+
+def request_labels(request) -> Tuple[str, str]:
+    """
+    Метки (method, endpoint): метод из HTTP_METHODS или OTHER_METHOD и шаблон
+    совпавшего маршрута.
+
+    Объявленные маршруты регистрируются при старте (register_routes), запросы
+    мимо маршрутов получают UNMATCHED_ENDPOINT. Прочие пары (например, HEAD к
+    GET-маршруту) — не больше settings.http_metrics_max_endpoints, сверх лимита
+    попадают в OVERFLOW_ENDPOINT. Так число серий ограничено при любых запросах.
+    """
+    method = request.method if request.method in HTTP_METHODS else OTHER_METHOD
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", None)
+    if endpoint is None:
+        return method, UNMATCHED_ENDPOINT
+    key = (method, endpoint)
+    if key not in _route_series and key not in _endpoint_series:
+        if len(_endpoint_series) >= settings.http_metrics_max_endpoints:
+            return method, OVERFLOW_ENDPOINT
+        _endpoint_series.add(key)
+    return key
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting MindVPN API...")
     setup_metrics()
+    register_routes(app.routes)
+    await event_bus.start()
+    await heartbeat_buffer.start()
+    await task_reaper.start()
+    await task_log_compactor.start()
+    await traffic_rollup.start()
+    await node_scores.start()
+    await node_health.start()
+    await tracer.start_exporter()
     yield
     # Shutdown
     print("🛑 Shutting down MindVPN API...")
+    await heartbeat_buffer.stop()
+    await task_reaper.stop()
+    await task_log_compactor.stop()
+    await traffic_rollup.stop()
+    await node_health.stop()
+    await node_scores.stop()
+    await event_bus.stop()
+    await tracer.stop_exporter()
+    await task_dispatcher.close()
+    await engine.dispose()
 
 # Create FastAPI app
 app = FastAPI(
@@ -50,21 +123,42 @@ app.add_middleware(
 # Add request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    # Record metrics
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
-    ).inc()
-    REQUEST_LATENCY.observe(process_time)
-    
+    start_time = time.perf_counter()
+    status = 500
+    ACTIVE_CONNECTIONS.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        ACTIVE_CONNECTIONS.dec()
+        process_time = time.perf_counter() - start_time
+        # scope["route"] выставляет роутер при совпадении маршрута
+        method, endpoint = request_labels(request)
+        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status).inc()
+        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(process_time)
+
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
+# Выборочная трассировка; при TRACE_SAMPLE_RATE=0 ни middleware, ни слушатели БД не подключаются
+if tracer.enabled:
+    instrument_engine(engine)
+
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        root = tracer.start("http.request", **{"http.method": request.method})
+        if root is None:
+            return await call_next(request)
+        try:
+            with root:
+                response = await call_next(request)
+                root.attributes["http.status_code"] = response.status_code
+        finally:
+            route = getattr(request.scope.get("route"), "path", None) or UNMATCHED_ENDPOINT
+            root.name = f"{request.method} {route}"
+            tracer.finish(root)
+        return response
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -80,6 +174,9 @@ app.include_router(tasks.router, prefix="/v1/tasks", tags=["tasks"])
 app.include_router(users.router, prefix="/v1/users", tags=["users"])
 app.include_router(bundles.router, prefix="/v1/bundles", tags=["bundles"])
 app.include_router(metrics.router, prefix="/v1/metrics", tags=["metrics"])
+app.include_router(events.router, prefix="/v1/events", tags=["events"])
+if settings.debug_endpoints_enabled:
+    app.include_router(debug.router, prefix="/debug", tags=["debug"])
 
 # Root endpoint
 @app.get("/")
@@ -6,7 +6,8 @@ from .client import Client
 from .inbound import Inbound
 from .routing_policy import RoutingPolicy
 from .task import Task
-from .traffic_sample import TrafficSample
+from .task_log import TaskLogChunk
+from .traffic_sample import TrafficSample, TrafficSample1m, TrafficSample1h, TrafficRollupState
 
 __all__ = [
     "Base",
@@ -18,5 +19,9 @@ __all__ = [
     "Inbound",
     "RoutingPolicy",
     "Task",
-    "TrafficSample"
+    "TaskLogChunk",
+    "TrafficSample",
+    "TrafficSample1m",
+    "TrafficSample1h",
+    "TrafficRollupState"
 ]
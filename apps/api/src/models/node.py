@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Enum, JSON, DateTime, Text
+from sqlalchemy import Column, String, Integer, ForeignKey, Enum, JSON, DateTime, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 import enum
@@ -13,6 +13,12 @@ class NodeStatus(str, enum.Enum):
 
 class Node(Base, TimestampMixin):
     __tablename__ = "nodes"
+    __table_args__ = (
+        # Keyset-пагинация списков
+        Index("ix_nodes_created_at_id", "created_at", "id"),
+        # Label selector: @> и ? по labels
+        Index("ix_nodes_labels_gin", "labels", postgresql_using="gin"),
+    )
     
     # Basic info
     name = Column(String(255), nullable=False, index=True)
@@ -33,6 +39,7 @@ class Node(Base, TimestampMixin):
     # Status and health
     status = Column(Enum(NodeStatus), nullable=False, default=NodeStatus.NEW, index=True)
     last_heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    draining = Column(Boolean, nullable=False, default=False, server_default="false")
     
     # Agent info
     agent_version = Column(String(50), nullable=True)
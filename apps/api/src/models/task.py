@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Enum, JSON, DateTime, Text
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, Enum, JSON, DateTime, Text, Index, text
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 import enum
 
 from .base import Base, TimestampMixin
@@ -26,6 +26,16 @@ class TargetType(str, enum.Enum):
 
 class Task(Base, TimestampMixin):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Keyset-пагинация списков
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        # Сводка по батчу: счетчики по статусам без чтения строк
+        Index("ix_tasks_batch_id_status", "batch_id", "status"),
+        # Reaper: истекшие RUNNING-задачи и лаг без чтения таблицы
+        Index("ix_tasks_status_started_at", "status", "started_at"),
+        # Reaper: QUEUED-задачи для переопубликации
+        Index("ix_tasks_queued_updated_at", "updated_at", postgresql_where=text("status = 'QUEUED'")),
+    )
     
     # Task identification
     action = Column(Enum(TaskAction), nullable=False, index=True)
@@ -38,10 +48,18 @@ class Task(Base, TimestampMixin):
     # Node (for node-specific tasks)
     node_id = Column(Integer, ForeignKey("nodes.id"), nullable=True, index=True)
     
+    # Batch (tasks created by one bulk request)
+    batch_id = Column(UUID(as_uuid=True), nullable=True)
+    
     # Status and execution
     status = Column(Enum(TaskStatus), nullable=False, default=TaskStatus.QUEUED, index=True)
     payload = Column(JSONB, nullable=False, default=dict)
-    logs = Column(Text, nullable=True)
+    # Устаревшее поле: логи пишутся в task_log_chunks, сюда не пишется и по умолчанию не читается
+    logs = deferred(Column(Text, nullable=True))
+    
+    # Logs (task_log_chunks): счетчики делают дозапись O(1)
+    log_size = Column(BigInteger, nullable=False, default=0, server_default="0")
+    log_chunk_count = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Timing
     started_at = Column(DateTime(timezone=True), nullable=True)
@@ -54,3 +72,4 @@ class Task(Base, TimestampMixin):
     # Relationships
     org = relationship("Org", back_populates="tasks")
     node = relationship("Node", back_populates="tasks")
+    log_chunks = relationship("TaskLogChunk", back_populates="task", cascade="all, delete-orphan", passive_deletes=True)
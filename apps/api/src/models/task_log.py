@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, LargeBinary, Boolean, DateTime, Index, func, text
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+class TaskLogChunk(Base):
+    """Кусок лога задачи; куски одной задачи идут подряд по байтовым смещениям."""
+    __tablename__ = "task_log_chunks"
+    __table_args__ = (
+        # Чтение по диапазону смещений
+        Index("ix_task_log_chunks_task_id_start_offset", "task_id", "start_offset"),
+        # Поиск холодных несжатых кусков
+        Index("ix_task_log_chunks_uncompressed", "created_at", postgresql_where=text("NOT compressed")),
+    )
+    
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    start_offset = Column(BigInteger, nullable=False)
+    size = Column(Integer, nullable=False)  # длина в байтах до сжатия
+    data = Column(LargeBinary, nullable=False)
+    compressed = Column(Boolean, nullable=False, default=False, server_default="false")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    # Relationships
+    task = relationship("Task", back_populates="log_chunks")
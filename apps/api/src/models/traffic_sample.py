@@ -1,16 +1,57 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Date, Float
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, Date, DateTime, Float, Index
 from sqlalchemy.orm import relationship
 
 from .base import Base
 
 class TrafficSample(Base):
+    """Дневной трафик узла; заполняется rollup'ом из traffic_samples_1h."""
     __tablename__ = "traffic_samples"
-    
-    day = Column(Date, nullable=False, index=True)
-    node_id = Column(Integer, ForeignKey("nodes.id"), nullable=False, index=True)
+
+    node_id = Column(Integer, ForeignKey("nodes.id"), primary_key=True, index=True)
+    day = Column(Date, primary_key=True, index=True)
     users_online = Column(Integer, nullable=False, default=0)
     gb_in = Column(Float, nullable=False, default=0.0)
     gb_out = Column(Float, nullable=False, default=0.0)
-    
+
     # Relationships
     node = relationship("Node", back_populates="traffic_samples")
+
+class TrafficSample1m(Base):
+    """
+    Поминутный трафик узла от агентов.
+
+    Таблица секционирована по bucket (секция на сутки); секции создаются
+    заранее и удаляются целиком по retention, см. services/traffic.py.
+    """
+    __tablename__ = "traffic_samples_1m"
+    __table_args__ = (
+        Index("ix_traffic_samples_1m_bucket_brin", "bucket", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (bucket)"},
+    )
+
+    node_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    bytes_in = Column(BigInteger, nullable=False, default=0)
+    bytes_out = Column(BigInteger, nullable=False, default=0)
+    users_online = Column(Integer, nullable=False, default=0)
+
+class TrafficSample1h(Base):
+    """Почасовой rollup traffic_samples_1m; секция на месяц."""
+    __tablename__ = "traffic_samples_1h"
+    __table_args__ = (
+        Index("ix_traffic_samples_1h_bucket_brin", "bucket", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (bucket)"},
+    )
+
+    node_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    bytes_in = Column(BigInteger, nullable=False, default=0)
+    bytes_out = Column(BigInteger, nullable=False, default=0)
+    users_online = Column(Integer, nullable=False, default=0)  # максимум за час
+
+class TrafficRollupState(Base):
+    """Watermark инкрементального rollup'а: до какого момента данные уже свернуты."""
+    __tablename__ = "traffic_rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime(timezone=True), nullable=False)
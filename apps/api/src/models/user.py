@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Enum
+from sqlalchemy import Column, String, Integer, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -17,6 +17,10 @@ class UserStatus(str, enum.Enum):
 
 class User(Base, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset-пагинация списков
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     org_id = Column(Integer, ForeignKey("orgs.id"), nullable=False, index=True)
     email = Column(String(255), nullable=False, unique=True, index=True)
@@ -1,22 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from ..deps import get_db
 from ..models import User
 from ..schemas.bundle import BundleResponse
-from ..services.bundles import BundleService
+from ..services.bundles import BUNDLE_MEDIA_TYPES, BundleService
 
 router = APIRouter()
 
 @router.get("/{user_id}/bundle", response_model=BundleResponse)
 async def get_user_bundle(
     user_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    format: str = Query("json", pattern="^(json|base64|singbox|clash)$", description="Формат подписки"),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Генерирует bundle для пользователя."""
+    """Bundle пользователя из кэша; ETag по содержимому, If-None-Match отвечает 304."""
     service = BundleService(db)
-    bundle = await service.generate_bundle(user_id)
+    bundle = await service.get_materialized(user_id)
     if not bundle:
         raise HTTPException(status_code=404, detail="User not found or no inbounds available")
-    return bundle
+
+    etag = bundle.etags[format]
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=bundle.bodies[format], media_type=BUNDLE_MEDIA_TYPES[format], headers=headers)
@@ -0,0 +1,41 @@
+import asyncio
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..core.config import settings
+from ..core.profiling import ProfilerBusy, profiler
+from ..core.tracing import tracer
+
+def require_debug_token(authorization: Optional[str] = Header(None)) -> None:
+    """Bearer-токен settings.debug_token; без заданного токена /debug закрыт."""
+    token = (authorization or "").removeprefix("Bearer ").strip()
+    # compare_digest на str принимает только ASCII, а заголовок декодирован как latin-1
+    if not settings.debug_token or not hmac.compare_digest(token.encode(), settings.debug_token.encode()):
+        raise HTTPException(status_code=403, detail="Debug token required")
+
+router = APIRouter(dependencies=[Depends(require_debug_token)])
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000)
+):
+    """Профилирует процесс seconds секунд и возвращает collapsed stacks для flamegraph."""
+    if seconds > settings.debug_profile_max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.debug_profile_max_seconds}")
+    try:
+        stacks = await asyncio.to_thread(profiler.run, seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+@router.get("/traces")
+async def traces(limit: int = Query(100, ge=1, le=10000)):
+    """Последние выборочные трассы запросов в OTLP JSON."""
+    return tracer.to_otlp(list(tracer.recent)[-limit:])
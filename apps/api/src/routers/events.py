@@ -0,0 +1,46 @@
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from ..core.config import settings
+from ..services.events import event_bus, parse_event_types
+
+router = APIRouter()
+
+@router.get("")
+async def stream_events(
+    types: Optional[str] = Query(None, description="Типы или группы событий через запятую: node, task.status, dashboard"),
+    node_id: Optional[List[int]] = Query(None),
+    task_id: Optional[List[int]] = Query(None),
+    batch_id: Optional[UUID] = Query(None)
+):
+    """SSE-поток событий флота: статусы узлов, переходы задач и дельты дашборда."""
+    try:
+        event_types = parse_event_types(types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = dict(
+        node_id=set(node_id or ()),
+        task_id=set(task_id or ()),
+        batch_id={str(batch_id)} if batch_id else set()
+    )
+
+    async def events():
+        # Подписка создается внутри генератора: если клиент отключится до
+        # начала ответа, генератор не запустится и подписка не повиснет
+        subscription = event_bus.subscribe(event_types, **filters)
+        try:
+            yield "retry: 3000\n\n"
+            async for frame in subscription.stream(settings.events_keepalive):
+                yield frame
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_db
-from ..services.metrics import MetricsService
+from ..schemas.traffic import TrafficBulkIngestResult, TrafficSeries
+from ..services.metrics import get_cached_dashboard_metrics
+from ..services.traffic import FRAME_MEDIA_TYPE, TrafficService, iter_frame_records, iter_ndjson_records
 
 router = APIRouter()
 
@@ -16,7 +21,38 @@ async def prometheus_metrics():
     )
 
 @router.get("/dashboard")
-async def dashboard_metrics(db: Session = Depends(get_db)):
+async def dashboard_metrics(
+    fresh: bool = Query(False, description="Пересчитать метрики в обход кэша")
+):
     """Возвращает метрики для дашборда."""
-    service = MetricsService(db)
-    return await service.get_dashboard_metrics()
+    return await get_cached_dashboard_metrics(fresh=fresh)
+
+@router.get("/traffic", response_model=TrafficSeries)
+async def traffic_series(
+    start: datetime = Query(...),
+    end: datetime = Query(...),
+    step: Optional[int] = Query(None, ge=60, description="Шаг точек в секундах"),
+    node_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Ряд трафика; разрешение (1m/1h/1d) выбирается по диапазону и шагу."""
+    service = TrafficService(db)
+    return await service.query(start, end, step, node_id)
+
+@router.post("/traffic", response_model=TrafficBulkIngestResult)
+async def ingest_traffic(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Пакетная загрузка поминутного трафика многих узлов.
+
+    Тело читается потоком: application/x-ndjson (строка на семпл) или
+    application/vnd.mindvpn.traffic-frames (кадры фиксированных записей).
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type == FRAME_MEDIA_TYPE:
+        records = iter_frame_records(request.stream())
+    elif media_type in ("application/x-ndjson", "application/jsonl"):
+        records = iter_ndjson_records(request.stream())
+    else:
+        raise HTTPException(status_code=415, detail=f"Expected application/x-ndjson or {FRAME_MEDIA_TYPE}")
+    service = TrafficService(db)
+    return await service.ingest_stream(records)
@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timezone
 
+from ..core.pagination import NEXT_CURSOR_HEADER, stream_ndjson, wants_ndjson
 from ..deps import get_db
 from ..models import Node, NodeCapability
 from ..models.node import NodeStatus
+from ..core.config import settings
 from ..schemas.node import NodeCreate, NodeResponse, NodeHeartbeat, NodeRegister
+from ..schemas.traffic import TrafficIngestResult, TrafficSampleIn
+from ..schemas.task import TaskAck, TaskDelivery, TaskLogAppended, TaskResponse, TaskResult
+from ..services.dispatch import task_dispatcher
 from ..services.node_registry import NodeRegistryService
+from ..services.task_logs import TaskLogService
+from ..services.tasks import TaskService
+from ..services.traffic import TrafficService
+from ..services.heartbeats import heartbeat_buffer
+from ..services.node_health import node_health
+from ..services.node_scores import node_scores
 
 router = APIRouter()
 
 @router.post("/register", response_model=NodeRegister)
 async def register_node(
     node_data: NodeCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Регистрирует новый узел."""
     service = NodeRegistryService(db)
@@ -23,29 +34,50 @@ async def register_node(
 @router.post("/{node_id}/heartbeat")
 async def node_heartbeat(
     node_id: int,
-    heartbeat: NodeHeartbeat,
-    db: Session = Depends(get_db)
+    heartbeat: NodeHeartbeat
 ):
-    """Обновляет heartbeat от узла."""
-    service = NodeRegistryService(db)
-    return await service.update_heartbeat(node_id, heartbeat)
+    """Принимает heartbeat от узла; запись в БД выполняется пачками в фоне."""
+    heartbeat_buffer.add(node_id, heartbeat)
+    node_health.observe(node_id)
+    node_scores.observe_heartbeat(node_id, heartbeat.users_online)
+    return {"status": "accepted", "node_id": node_id}
+
+@router.post("/{node_id}/traffic", response_model=TrafficIngestResult)
+async def ingest_node_traffic(
+    node_id: int,
+    samples: List[TrafficSampleIn],
+    db: AsyncSession = Depends(get_db)
+):
+    """Принимает поминутные счетчики трафика узла."""
+    service = TrafficService(db)
+    accepted, rejected = await service.ingest(node_id, samples)
+    return TrafficIngestResult(accepted=accepted, rejected=rejected)
 
 @router.get("/", response_model=List[NodeResponse])
 async def list_nodes(
+    request: Request,
+    response: Response,
     region: Optional[str] = Query(None),
     provider: Optional[str] = Query(None),
     status: Optional[NodeStatus] = Query(None),
-    labels: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    labels: Optional[str] = Query(None, description="Label selector: region=EU,tier!=canary,provider in (hetzner,ovh),gpu,!spot"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Список узлов с фильтрацией."""
+    """Список узлов с фильтрацией и keyset-пагинацией; Accept: application/x-ndjson стримит всю выборку."""
     service = NodeRegistryService(db)
-    return await service.list_nodes(region, provider, status, labels)
+    if wants_ndjson(request):
+        return stream_ndjson(service.list_query(region, provider, status, labels, cursor), NodeResponse)
+    nodes, next_cursor = await service.list_nodes(region, provider, status, labels, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return nodes
 
 @router.get("/{node_id}", response_model=NodeResponse)
 async def get_node(
     node_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получает информацию об узле."""
     service = NodeRegistryService(db)
@@ -58,8 +90,58 @@ async def get_node(
 async def drain_node(
     node_id: int,
     enabled: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Включает/выключает режим drain для узла."""
     service = NodeRegistryService(db)
     return await service.drain_node(node_id, enabled)
+
+@router.get("/{node_id}/tasks/next", response_model=TaskDelivery, responses={204: {"description": "No task within wait"}})
+async def next_node_task(
+    node_id: int,
+    wait: float = Query(25, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Long-poll: отдает агенту следующую задачу узла или 204, если за wait секунд задач не появилось."""
+    delivery = await task_dispatcher.next_task(db, node_id, min(wait, settings.task_poll_max_wait))
+    if delivery is None:
+        return Response(status_code=204)
+    return TaskDelivery(
+        task=TaskResponse.model_validate(delivery.task),
+        delivery_id=delivery.delivery_id,
+        attempt=delivery.attempt
+    )
+
+@router.post("/{node_id}/tasks/{task_id}/ack")
+async def ack_node_task(
+    node_id: int,
+    task_id: int,
+    ack: TaskAck
+):
+    """Подтверждает получение задачи; без ack задача будет выдана повторно после task_timeout."""
+    acked = await task_dispatcher.ack(node_id, ack.delivery_id)
+    return {"task_id": task_id, "acked": acked}
+
+@router.post("/{node_id}/tasks/{task_id}/result", response_model=TaskResponse)
+async def report_node_task_result(
+    node_id: int,
+    task_id: int,
+    result: TaskResult,
+    db: AsyncSession = Depends(get_db)
+):
+    """Принимает результат выполнения задачи от агента."""
+    service = TaskService(db)
+    return await service.complete_task(node_id, task_id, result)
+
+@router.post("/{node_id}/tasks/{task_id}/logs", response_model=TaskLogAppended)
+async def append_node_task_logs(
+    node_id: int,
+    task_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Дописывает в лог задачи тело запроса (text/plain) от агента узла."""
+    service = TaskLogService(db)
+    offset, size = await service.append(task_id, await request.body(), node_id=node_id)
+    await db.commit()
+    return TaskLogAppended(task_id=task_id, offset=offset, log_size=size)
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
+from uuid import UUID
 
-from ..deps import get_db
+from ..core.config import settings
+from ..core.pagination import NEXT_CURSOR_HEADER, stream_ndjson, wants_ndjson
+from ..deps import SessionLocal, get_db
 from ..models import Task
 from ..models.task import TaskStatus, TaskAction
-from ..schemas.task import TaskCreate, TaskResponse
+from ..schemas.task import TaskBatchCreated, TaskBatchStatus, TaskBulkCreate, TaskCreate, TaskResponse
+from ..services.task_logs import TaskLogService
 from ..services.tasks import TaskService
 
 router = APIRouter()
@@ -13,7 +18,7 @@ router = APIRouter()
 @router.post("/", response_model=TaskResponse)
 async def create_task(
     task_data: TaskCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создает новую задачу."""
     service = TaskService(db)
@@ -22,7 +27,7 @@ async def create_task(
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получает информацию о задаче."""
     service = TaskService(db)
@@ -31,24 +36,94 @@ async def get_task(
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
+@router.get("/{task_id}/logs")
+async def read_task_logs(
+    task_id: int,
+    offset: int = Query(0, description="Смещение в байтах; отрицательное — от конца лога"),
+    length: int = Query(64 * 1024, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    """Читает диапазон лога задачи; X-Next-Offset — смещение для следующего запроса."""
+    service = TaskLogService(db)
+    data, start, size = await service.read(task_id, offset, min(length, settings.task_log_max_read))
+    return Response(
+        content=data,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "X-Log-Offset": str(start),
+            "X-Next-Offset": str(start + len(data)),
+            "X-Log-Size": str(size)
+        }
+    )
+
+@router.get("/{task_id}/logs/stream")
+async def tail_task_logs(
+    task_id: int,
+    offset: int = Query(0),
+    last_event_id: Optional[int] = Header(None)
+):
+    """SSE-хвост лога задачи; при переподключении продолжает с Last-Event-ID."""
+    async def events():
+        # Своя сессия: стрим живет дольше обработчика запроса
+        async with SessionLocal() as db:
+            service = TaskLogService(db)
+            async for event in service.tail(
+                task_id,
+                last_event_id if last_event_id is not None else offset,
+                settings.task_log_tail_interval
+            ):
+                yield event
+
+    async with SessionLocal() as db:
+        if await db.get(Task, task_id) is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/", response_model=List[TaskResponse])
 async def list_tasks(
+    request: Request,
+    response: Response,
     status: Optional[TaskStatus] = Query(None),
     action: Optional[TaskAction] = Query(None),
     node_id: Optional[int] = Query(None),
-    limit: int = Query(100, le=1000),
-    offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Список задач с фильтрацией."""
+    """Список задач с фильтрацией и keyset-пагинацией; Accept: application/x-ndjson стримит всю выборку."""
     service = TaskService(db)
-    return await service.list_tasks(status, action, node_id, limit, offset)
+    if wants_ndjson(request):
+        return stream_ndjson(service.list_query(status, action, node_id, cursor), TaskResponse)
+    tasks, next_cursor = await service.list_tasks(status, action, node_id, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return tasks
 
-@router.post("/bulk")
+@router.post("/bulk", response_model=TaskBatchCreated)
 async def create_bulk_tasks(
-    tasks_data: List[TaskCreate],
-    db: Session = Depends(get_db)
+    tasks_data: Union[TaskBulkCreate, List[TaskCreate]],
+    db: AsyncSession = Depends(get_db)
 ):
-    """Создает несколько задач одновременно."""
+    """
+    Создает пачку задач с общим batch_id.
+
+    Принимает одно действие с селектором узлов (размножается на сервере)
+    или, как раньше, явный список задач.
+    """
     service = TaskService(db)
+    if isinstance(tasks_data, TaskBulkCreate):
+        return await service.create_batch(tasks_data)
     return await service.create_bulk_tasks(tasks_data)
+
+@router.get("/batches/{batch_id}", response_model=TaskBatchStatus)
+async def get_batch_status(
+    batch_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """Прогресс батча: количество задач по статусам."""
+    service = TaskService(db)
+    return await service.get_batch_status(batch_id)
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
+from ..core.pagination import NEXT_CURSOR_HEADER, stream_ndjson, wants_ndjson
 from ..deps import get_db
 from ..models import User
 from ..schemas.user import UserCreate, UserResponse
@@ -12,7 +13,7 @@ router = APIRouter()
 @router.post("/", response_model=UserResponse)
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Создает нового пользователя."""
     service = UserService(db)
@@ -21,7 +22,7 @@ async def create_user(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Получает информацию о пользователе."""
     service = UserService(db)
@@ -32,12 +33,19 @@ async def get_user(
 
 @router.get("/", response_model=List[UserResponse])
 async def list_users(
+    request: Request,
+    response: Response,
     role: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
-    limit: int = Query(100, le=1000),
-    offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Список пользователей с фильтрацией."""
+    """Список пользователей с фильтрацией и keyset-пагинацией; Accept: application/x-ndjson стримит всю выборку."""
     service = UserService(db)
-    return await service.list_users(role, status, limit, offset)
+    if wants_ndjson(request):
+        return stream_ndjson(service.list_query(role, status, cursor), UserResponse)
+    users, next_cursor = await service.list_users(role, status, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return users
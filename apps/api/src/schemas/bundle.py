@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class BundleResponse(BaseModel):
+    user_id: int
+    uris: List[str]
+    qr_codes: List[str] = Field(default_factory=list)
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, Any, Optional
+from datetime import datetime
+
+from ..models.node import NodeStatus
+
+class NodeCreate(BaseModel):
+    hostname: str
+    name: Optional[str] = None
+    ipv4: Optional[str] = None
+    ipv6: Optional[str] = None
+    region: Optional[str] = None
+    provider: Optional[str] = None
+    labels: Dict[str, str] = Field(default_factory=dict)
+    csr_pem: str
+
+class NodeRegister(BaseModel):
+    node_id: int
+    agent_config: Dict[str, Any]
+    cert_pem: str
+    ca_pem: str
+
+class NodeHeartbeat(BaseModel):
+    loads: Dict[str, float] = Field(default_factory=dict)
+    versions: Dict[str, str] = Field(default_factory=dict)
+    users_online: int = 0
+
+class NodeResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    hostname: str
+    status: NodeStatus
+    region: Optional[str] = None
+    provider: Optional[str] = None
+    labels: Dict[str, Any] = Field(default_factory=dict)
+    agent_version: Optional[str] = None
+    draining: bool = False
+    last_heartbeat_at: Optional[datetime] = None
+    created_at: datetime
@@ -0,0 +1,83 @@
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+from uuid import UUID
+
+from ..models.task import TaskStatus, TaskAction, TargetType
+
+class TaskCreate(BaseModel):
+    action: TaskAction
+    target_type: TargetType
+    target_id: int
+    node_id: Optional[int] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    max_retries: Optional[int] = None
+
+class TaskBulkCreate(BaseModel):
+    """Одно действие, размноженное сервером на все узлы из селектора и/или списка."""
+    action: TaskAction
+    selector: Optional[str] = None  # label selector, например region=EU,tier!=canary
+    node_ids: Optional[List[int]] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    max_retries: Optional[int] = None
+    include_draining: bool = False
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if not self.selector and not self.node_ids:
+            raise ValueError("selector or node_ids is required")
+        return self
+
+class TaskBatchCreated(BaseModel):
+    batch_id: UUID
+    created: int
+    task_ids: List[int]
+
+class TaskBatchStatus(BaseModel):
+    batch_id: UUID
+    total: int
+    counts: Dict[TaskStatus, int]
+    finished: bool
+
+class TaskResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    action: TaskAction
+    target_type: TargetType
+    target_id: int
+    node_id: Optional[int] = None
+    status: TaskStatus
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    log_size: int = 0
+    retry_count: int
+    max_retries: int
+    batch_id: Optional[UUID] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+class TaskDelivery(BaseModel):
+    """Задача, выданная агенту; delivery_id нужен для ack."""
+    task: TaskResponse
+    delivery_id: str
+    attempt: int
+
+class TaskAck(BaseModel):
+    delivery_id: str
+
+class TaskResult(BaseModel):
+    status: TaskStatus
+    logs: Optional[str] = None
+    delivery_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_status(self):
+        if self.status not in (TaskStatus.SUCCESS, TaskStatus.FAILED):
+            raise ValueError("status must be SUCCESS or FAILED")
+        return self
+
+class TaskLogAppended(BaseModel):
+    task_id: int
+    offset: int
+    log_size: int
@@ -0,0 +1,36 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class TrafficSampleIn(BaseModel):
+    """Поминутный счетчик трафика узла; bucket округляется вниз до минуты."""
+    bucket: datetime
+    bytes_in: int = Field(0, ge=0)
+    bytes_out: int = Field(0, ge=0)
+    users_online: int = Field(0, ge=0)
+
+class TrafficIngestResult(BaseModel):
+    accepted: int
+    rejected: int
+
+class TrafficBulkIngestResult(BaseModel):
+    received: int
+    accepted: int  # уникальные минуты в окне хранения
+    written: int  # из них новые или изменившиеся строки
+    rejected: int
+    seconds: float
+    rows_per_sec: float
+
+class TrafficPoint(BaseModel):
+    ts: datetime
+    bytes_in: int
+    bytes_out: int
+    users_online: int
+
+class TrafficSeries(BaseModel):
+    node_id: Optional[int] = None
+    resolution: str
+    step_seconds: int
+    start: datetime
+    end: datetime
+    points: List[TrafficPoint]
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+from datetime import datetime
+
+from ..models.user import UserRole, UserStatus
+
+class UserCreate(BaseModel):
+    email: str
+    role: UserRole = UserRole.READONLY
+    org_id: Optional[int] = None
+
+class UserResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    org_id: int
+    email: str
+    role: UserRole
+    status: UserStatus
+    created_at: datetime
@@ -0,0 +1,322 @@
+import base64
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote, urlencode
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..core.cache import VersionedCache
+from ..core.config import settings
+from ..core.tracing import span
+from ..deps import SessionLocal
+from ..models import Client, Inbound, Node, User
+from ..models.inbound import InboundStatus
+from ..schemas.bundle import BundleResponse
+from .events import event_bus
+from .node_scores import node_scores
+
+try:
+    import segno
+except ImportError:  # QR-коды опциональны
+    segno = None
+
+# Пространство имен детерминированных учетных данных клиентов в inbound'ах
+CREDENTIAL_NAMESPACE = uuid.UUID("6f1c3a52-8d0e-4c6b-9a57-2f4e1d9b7c31")
+
+# Формат bundle -> media type ответа
+BUNDLE_MEDIA_TYPES = {
+    "json": "application/json",
+    "base64": "text/plain",
+    "singbox": "application/json",
+    "clash": "application/yaml",
+}
+
+@dataclass
+class MaterializedBundle:
+    """Bundle пользователя, заранее сериализованный во все форматы."""
+    user_id: int
+    bodies: Dict[str, bytes]
+    etags: Dict[str, str]
+
+def client_credential(client_id: int) -> str:
+    return str(uuid.uuid5(CREDENTIAL_NAMESPACE, f"client:{client_id}"))
+
+def user_credential(user_id: int) -> str:
+    return str(uuid.uuid5(CREDENTIAL_NAMESPACE, f"user:{user_id}"))
+
+def _endpoint(inbound: Inbound, node: Node, credential: str, label: str) -> Optional[Dict[str, Any]]:
+    """Описание подключения к inbound, из которого строятся URI и конфиги клиентов."""
+    inbound_settings = inbound.settings or {}
+    overrides = inbound_settings.get("overrides", {})
+    preset = inbound_settings.get("preset", "reality_tcp")
+    short_ids = [sid for sid in overrides.get("short_ids", []) if sid]
+    endpoint = {
+        "name": label,
+        "server": node.hostname or node.ipv4,
+        "port": inbound.port,
+        "uuid": credential,
+        "sni": overrides.get("server_name", "example.com"),
+    }
+    if preset.startswith("reality_"):
+        endpoint.update(
+            type="vless",
+            transport=preset.split("_", 1)[1],
+            public_key=overrides.get("public_key", ""),
+            short_id=short_ids[0] if short_ids else "",
+        )
+    elif preset in ("vmess", "trojan"):
+        endpoint.update(type=preset, transport="tcp")
+    else:
+        return None
+    return endpoint
+
+def _uri(e: Dict[str, Any]) -> str:
+    name = quote(e["name"])
+    if e["type"] == "vless":
+        params = {"security": "reality", "sni": e["sni"], "fp": "chrome", "pbk": e["public_key"], "sid": e["short_id"], "type": e["transport"]}
+        if e["transport"] == "tcp":
+            params["flow"] = "xtls-rprx-vision"
+        elif e["transport"] == "grpc":
+            params["serviceName"] = "grpc"
+        elif e["transport"] == "xhttp":
+            params["path"] = "/xhttp"
+        return f"vless://{e['uuid']}@{e['server']}:{e['port']}?{urlencode(params)}#{name}"
+    if e["type"] == "trojan":
+        return f"trojan://{e['uuid']}@{e['server']}:{e['port']}?{urlencode({'security': 'tls', 'sni': e['sni']})}#{name}"
+    vmess = {"v": "2", "ps": e["name"], "add": e["server"], "port": str(e["port"]), "id": e["uuid"],
+             "aid": "0", "net": "tcp", "type": "none", "tls": "tls", "sni": e["sni"]}
+    return "vmess://" + base64.b64encode(json.dumps(vmess, separators=(",", ":")).encode()).decode()
+
+def _singbox_outbound(e: Dict[str, Any]) -> Dict[str, Any]:
+    outbound = {"type": e["type"], "tag": e["name"], "server": e["server"], "server_port": e["port"]}
+    tls = {"enabled": True, "server_name": e["sni"], "utls": {"enabled": True, "fingerprint": "chrome"}}
+    if e["type"] == "vless":
+        outbound["uuid"] = e["uuid"]
+        tls["reality"] = {"enabled": True, "public_key": e["public_key"], "short_id": e["short_id"]}
+        if e["transport"] == "tcp":
+            outbound["flow"] = "xtls-rprx-vision"
+        elif e["transport"] == "grpc":
+            outbound["transport"] = {"type": "grpc", "service_name": "grpc"}
+        elif e["transport"] == "xhttp":
+            outbound["transport"] = {"type": "http", "path": "/xhttp"}
+    elif e["type"] == "trojan":
+        outbound["password"] = e["uuid"]
+    else:
+        outbound.update(uuid=e["uuid"], security="auto", alter_id=0)
+    outbound["tls"] = tls
+    return outbound
+
+def _clash_proxy(e: Dict[str, Any]) -> Dict[str, Any]:
+    proxy = {"name": e["name"], "type": e["type"], "server": e["server"], "port": e["port"],
+             "udp": True, "tls": True, "servername": e["sni"], "client-fingerprint": "chrome"}
+    if e["type"] == "vless":
+        proxy.update(uuid=e["uuid"], network=e["transport"])
+        proxy["reality-opts"] = {"public-key": e["public_key"], "short-id": e["short_id"]}
+        if e["transport"] == "tcp":
+            proxy["flow"] = "xtls-rprx-vision"
+        elif e["transport"] == "grpc":
+            proxy["grpc-opts"] = {"grpc-service-name": "grpc"}
+    elif e["type"] == "trojan":
+        proxy.update(password=e["uuid"], sni=e["sni"])
+    else:
+        proxy.update(uuid=e["uuid"], alterId=0, cipher="auto")
+    return proxy
+
+def _clash_yaml(proxies: List[Dict[str, Any]]) -> str:
+    # JSON — подмножество YAML: каждый прокси пишется flow-отображением
+    lines = ["proxies:"]
+    lines += [f"  - {json.dumps(p, ensure_ascii=False)}" for p in proxies]
+    group = {"name": "MindVPN", "type": "select", "proxies": [p["name"] for p in proxies]}
+    lines += ["proxy-groups:", f"  - {json.dumps(group, ensure_ascii=False)}", "rules:", "  - MATCH,MindVPN"]
+    return "\n".join(lines) + "\n"
+
+def _qr_code(uri: str) -> Optional[str]:
+    if segno is None:
+        return None
+    return segno.make(uri, error="m").svg_data_uri()
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+class BundleService:
+    """
+    Подписки пользователей: URI для каждого устройства на каждом примененном inbound.
+
+    Bundle материализуется один раз и хранится в bundle_cache вместе со всеми
+    форматами и их ETag; кэш инвалидируется событиями ORM при изменении
+    User, Client, Inbound или адреса Node (см. ниже, другим репликам они
+    рассылаются через event_bus), а также когда в регионе меняется набор
+    наименее загруженных узлов (node_scores). Изменения в обход ORM
+    покрывает settings.bundle_cache_max_age.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def generate_bundle(self, user_id: int) -> Optional[BundleResponse]:
+        """Собирает bundle из БД в обход кэша."""
+        user, endpoints, regions = await self._load(user_id)
+        return build_bundle(user_id, endpoints) if endpoints else None
+
+    async def get_materialized(self, user_id: int) -> Optional[MaterializedBundle]:
+        """Bundle из кэша; при промахе собирается и сериализуется во все форматы."""
+
+        async def compute():
+            # Отдельная сессия: вычисление переживает запрос, который его запустил
+            async with SessionLocal() as db:
+                user, endpoints, regions = await BundleService(db)._load(user_id)
+            tags = [("org", user.org_id)] if user is not None else []
+            tags += [("ranking", region) for region in regions]
+            return (materialize(user_id, endpoints) if endpoints else None), tags
+
+        return await bundle_cache.get_or_compute(("user", user_id), compute)
+
+    async def _load(self, user_id: int) -> Tuple[Optional[User], List[Dict[str, Any]], Set[str]]:
+        """
+        Пользователь и точки подключения: активные устройства × примененные inbound'ы организации.
+
+        Третье значение — регионы, где узлы отобраны по загрузке: bundle
+        зависит от их рейтинга.
+        """
+        user = await self.db.get(User, user_id)
+        if user is None:
+            return None, [], set()
+
+        clients = (await self.db.execute(
+            select(Client.id, Client.device_name)
+            .where(Client.user_id == user_id, Client.revoked_at.is_(None))
+            .order_by(Client.id)
+        )).all()
+        inbounds = (await self.db.execute(
+            select(Inbound, Node)
+            .join(Node, Node.id == Inbound.node_id)
+            .where(Inbound.org_id == user.org_id, Inbound.status == InboundStatus.APPLIED)
+            .order_by(Node.region, Node.name, Inbound.port)
+        )).all()
+        inbounds, regions = self._select_nodes(user.id, inbounds)
+
+        identities = [(client_credential(c.id), c.device_name) for c in clients] or [(user_credential(user.id), None)]
+        endpoints = []
+        for inbound, node in inbounds:
+            # Учетная запись, явно заданная в inbound для email пользователя, важнее производной
+            provisioned = {u.get("email"): u.get("uuid") for u in (inbound.settings or {}).get("overrides", {}).get("users", [])}
+            for credential, device in identities:
+                label = f"{node.name}-{device}" if device else node.name
+                endpoint = _endpoint(inbound, node, provisioned.get(user.email) or credential, label)
+                if endpoint is not None:
+                    endpoints.append(endpoint)
+        return user, endpoints, regions
+
+    @staticmethod
+    def _select_nodes(user_id: int, inbounds: List[Tuple[Inbound, Node]]) -> Tuple[List[Tuple[Inbound, Node]], Set[str]]:
+        """Оставляет inbound'ы settings.bundle_nodes_per_region наименее загруженных узлов каждого региона."""
+        k = settings.bundle_nodes_per_region
+        if k <= 0 or not node_scores.loaded:
+            return inbounds, set()
+        candidates: Dict[str, Set[int]] = {}
+        for inbound, node in inbounds:
+            candidates.setdefault(node.region or "", set()).add(node.id)
+        chosen = node_scores.choose(candidates, k, settings.bundle_node_spread, key=user_id)
+        return [(inbound, node) for inbound, node in inbounds if node.id in chosen], set(candidates)
+
+def build_bundle(user_id: int, endpoints: List[Dict[str, Any]]) -> BundleResponse:
+    uris = [_uri(e) for e in endpoints]
+    qr_codes = [qr for qr in map(_qr_code, uris) if qr]
+    return BundleResponse(user_id=user_id, uris=uris, qr_codes=qr_codes)
+
+def materialize(user_id: int, endpoints: List[Dict[str, Any]]) -> MaterializedBundle:
+    with span("bundle.serialize", endpoints=len(endpoints)):
+        return _materialize(user_id, endpoints)
+
+def _materialize(user_id: int, endpoints: List[Dict[str, Any]]) -> MaterializedBundle:
+    # Span на каждый формат: ссылки с QR-кодами, sing-box и clash рендерятся по-разному
+    bodies = {}
+    with span("bundle.render", format="json"):
+        bundle = build_bundle(user_id, endpoints)
+        bodies["json"] = bundle.model_dump_json().encode()
+        bodies["base64"] = base64.b64encode("\n".join(bundle.uris).encode())
+    with span("bundle.render", format="singbox"):
+        singbox = {
+            "outbounds": [_singbox_outbound(e) for e in endpoints] + [
+                {"type": "selector", "tag": "select", "outbounds": [e["name"] for e in endpoints]},
+                {"type": "direct", "tag": "direct"},
+            ]
+        }
+        bodies["singbox"] = json.dumps(singbox, ensure_ascii=False, separators=(",", ":")).encode()
+    with span("bundle.render", format="clash"):
+        bodies["clash"] = _clash_yaml([_clash_proxy(e) for e in endpoints]).encode()
+    return MaterializedBundle(
+        user_id=user_id,
+        bodies=bodies,
+        etags={name: _etag(body) for name, body in bodies.items()}
+    )
+
+bundle_cache = VersionedCache("bundles", maxsize=settings.bundle_cache_size, max_age=settings.bundle_cache_max_age)
+
+# Инвалидация по событиям ORM. Изменения собираются при flush и применяются
+# только после commit; при rollback отбрасываются. Примененные инвалидации
+# уходят другим репликам сообщением bundle.invalidate.
+NODE_ADDRESS_FIELDS = ("name", "hostname", "ipv4")
+
+def _collect_invalidations(session: Session, flush_context) -> None:
+    keys = session.info.setdefault("bundle_invalidations", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            keys.add(("user", obj.id))
+        elif isinstance(obj, Client):
+            # Устройство могли перенести к другому пользователю: инвалидируем обоих
+            history = inspect(obj).attrs.user_id.history
+            for user_id in (*history.added, *history.deleted, *history.unchanged):
+                keys.add(("user", user_id))
+        elif isinstance(obj, Inbound):
+            history = inspect(obj).attrs.org_id.history
+            for org_id in (*history.added, *history.deleted, *history.unchanged):
+                keys.add(("org", org_id))
+        elif isinstance(obj, Node):
+            state = inspect(obj)
+            if obj in session.dirty and not any(state.attrs[f].history.has_changes() for f in NODE_ADDRESS_FIELDS):
+                continue
+            keys.add(("org", obj.org_id))
+
+def _collect_bulk_invalidations(orm_execute_state) -> None:
+    # UPDATE/DELETE по ORM-сущности без загрузки объектов: точные строки неизвестны
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (User, Client, Inbound):
+        orm_execute_state.session.info.setdefault("bundle_invalidations", set()).add(None)
+
+def _apply_invalidations(session: Session) -> None:
+    keys = session.info.pop("bundle_invalidations", None)
+    if not keys:
+        return
+    if None in keys:
+        bundle_cache.invalidate()
+        event_bus.broadcast("bundle.invalidate", keys=None)
+    else:
+        bundle_cache.invalidate(*keys)
+        event_bus.broadcast("bundle.invalidate", keys=[list(key) for key in keys])
+
+def _apply_remote_invalidations(data: Dict[str, Any]) -> None:
+    keys = data.get("keys")
+    if keys is None:
+        bundle_cache.invalidate()
+    else:
+        bundle_cache.invalidate(*(tuple(key) for key in keys))
+
+def _discard_invalidations(session: Session, *args) -> None:
+    session.info.pop("bundle_invalidations", None)
+
+event.listen(Session, "after_flush", _collect_invalidations)
+event.listen(Session, "do_orm_execute", _collect_bulk_invalidations)
+event.listen(Session, "after_commit", _apply_invalidations)
+event.listen(Session, "after_soft_rollback", _discard_invalidations)
+event_bus.on("bundle.invalidate", _apply_remote_invalidations)
+
+# Рейтинг узлов региона изменился — bundle'ы с узлами этого региона устарели
+node_scores.subscribe(lambda region: bundle_cache.invalidate(("ranking", region)))
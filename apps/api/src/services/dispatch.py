@@ -0,0 +1,251 @@
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from prometheus_client import Counter, Histogram
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models import Task
+from ..models.task import TaskStatus
+from .events import event_bus, task_event
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_LATENCY = Histogram(
+    'mindvpn_task_dispatch_latency_seconds',
+    'Time from task enqueue to pickup by the node agent',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+DISPATCH_EVENTS = Counter(
+    'mindvpn_task_dispatch_events_total',
+    'Task dispatch events',
+    ['event']  # published, delivered, redelivered, stale, timeout, acked, publish_error
+)
+
+STREAM_PREFIX = "mindvpn:tasks:node:"
+CONSUMER_GROUP = "agents"
+
+def stream_key(node_id: int) -> str:
+    return f"{STREAM_PREFIX}{node_id}"
+
+@dataclass
+class Delivery:
+    task: Task
+    delivery_id: str
+    attempt: int
+
+class TaskDispatcher:
+    """
+    Доставка задач агентам через Redis Streams, по стриму на узел.
+
+    Запись стрима содержит task_id и attempt (= Task.retry_count на момент
+    публикации). При выдаче задача переводится в RUNNING условным UPDATE
+    по (status=QUEUED, retry_count=attempt), поэтому устаревшие и повторные
+    записи просто отбрасываются, а одна задача не выполняется дважды.
+
+    Стрим обрезается при XADD (MAXLEN ~ settings.task_stream_maxlen): пока
+    узел офлайн, reaper переопубликует его QUEUED-задачи, и без обрезки
+    стрим рос бы на каждом проходе. Потерянные при обрезке записи не теряют
+    задач — они остаются в QUEUED и снова публикуются reaper'ом.
+
+    Запись остается в PEL consumer group до ack агента. Если агент не
+    подтвердил ее за settings.task_timeout, при следующем опросе она
+    забирается XAUTOCLAIM: задача уходит на повтор (retry_count+1) или,
+    если исчерпан max_retries, в TIMEOUT.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client: Optional[redis.Redis] = None
+        self._groups = set()
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _ensure_group(self, key: str):
+        if key in self._groups:
+            return
+        try:
+            await self.client.xgroup_create(key, CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups.add(key)
+
+    async def publish(self, tasks: Iterable[Tuple[int, int, int]]):
+        """
+        Публикует задачи в стримы узлов одним pipeline.
+
+        Args:
+            tasks: Тройки (task_id, node_id, retry_count) уже закоммиченных задач
+
+        Ошибка Redis не прерывает запрос: задачи остаются в QUEUED,
+        и их повторно опубликует reaper.
+        """
+        tasks = [t for t in tasks if t[1] is not None]
+        if not tasks:
+            return
+        now = f"{time.time():.6f}"
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for task_id, node_id, attempt in tasks:
+                    pipe.xadd(
+                        stream_key(node_id), {"task_id": task_id, "attempt": attempt, "enqueued_at": now},
+                        maxlen=settings.task_stream_maxlen, approximate=True
+                    )
+                await pipe.execute()
+            DISPATCH_EVENTS.labels(event="published").inc(len(tasks))
+        except redis.RedisError as e:
+            DISPATCH_EVENTS.labels(event="publish_error").inc(len(tasks))
+            logger.warning("Failed to publish %d tasks to Redis: %s", len(tasks), e)
+
+    async def next_task(self, db: AsyncSession, node_id: int, wait: float) -> Optional[Delivery]:
+        """
+        Long-poll: ждет до wait секунд следующую задачу узла.
+
+        Сначала забираются записи, чей visibility timeout истек, затем
+        читаются новые записи с блокировкой.
+        """
+        key = stream_key(node_id)
+        consumer = f"node-{node_id}"
+        await self._ensure_group(key)
+
+        deadline = time.monotonic() + wait
+        while True:
+            _, claimed, _ = await self.client.xautoclaim(
+                key, CONSUMER_GROUP, consumer,
+                min_idle_time=settings.task_timeout * 1000, start_id="0-0", count=10
+            )
+            for entry_id, fields in claimed:
+                if not fields:
+                    # Запись из PEL удалена обрезкой стрима; задачу доведет reaper
+                    await self._drop(key, entry_id)
+                    continue
+                await self._expire(db, key, entry_id, fields)
+
+            block_ms = max(int((deadline - time.monotonic()) * 1000), 1)
+            response = await self.client.xreadgroup(
+                CONSUMER_GROUP, consumer, {key: ">"}, count=1, block=block_ms
+            )
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    delivery = await self._pickup(db, key, entry_id, fields)
+                    if delivery is not None:
+                        return delivery
+            if time.monotonic() >= deadline:
+                return None
+
+    async def _pickup(self, db: AsyncSession, key: str, entry_id: str, fields: dict) -> Optional[Delivery]:
+        task_id, attempt = int(fields["task_id"]), int(fields["attempt"])
+        # from_statement сопоставляет RETURNING с колонками по имени: при прямом
+        # returning(Task) отложенная колонка logs сдвигала поля объекта
+        result = await db.execute(
+            select(Task).from_statement(
+                update(Task)
+                .where(Task.id == task_id, Task.status == TaskStatus.QUEUED, Task.retry_count == attempt)
+                .values(status=TaskStatus.RUNNING, started_at=datetime.now(timezone.utc))
+                .returning(Task)
+            )
+        )
+        task = result.scalar_one_or_none()
+        await db.commit()
+        if task is None:
+            # Задачу уже выдали, отменили или переопубликовали с другим attempt
+            DISPATCH_EVENTS.labels(event="stale").inc()
+            await self._drop(key, entry_id)
+            return None
+
+        DISPATCH_LATENCY.observe(max(time.time() - float(fields["enqueued_at"]), 0.0))
+        DISPATCH_EVENTS.labels(event="delivered").inc()
+        task_event(task)
+        return Delivery(task=task, delivery_id=entry_id, attempt=attempt)
+
+    async def _expire(self, db: AsyncSession, key: str, entry_id: str, fields: dict):
+        """Запись не подтверждена за task_timeout: повтор или TIMEOUT."""
+        task_id, attempt = int(fields["task_id"]), int(fields["attempt"])
+        requeued, timed_out = await requeue_or_timeout(db, [(task_id, attempt)])
+        await db.commit()
+        await self._drop(key, entry_id)
+        node_id = int(key[len(STREAM_PREFIX):])
+        if requeued:
+            DISPATCH_EVENTS.labels(event="redelivered").inc()
+            event_bus.emit("task.status", task_id=task_id, node_id=node_id, status=TaskStatus.QUEUED.value)
+            await self.publish(requeued)
+        elif timed_out:
+            DISPATCH_EVENTS.labels(event="timeout").inc()
+            event_bus.emit("task.status", task_id=task_id, node_id=node_id, status=TaskStatus.TIMEOUT.value)
+        else:
+            # Попытку уже завершил агент или обработал reaper
+            DISPATCH_EVENTS.labels(event="stale").inc()
+
+    async def _drop(self, key: str, entry_id: str):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xack(key, CONSUMER_GROUP, entry_id)
+            pipe.xdel(key, entry_id)
+            await pipe.execute()
+
+    async def ack(self, node_id: int, delivery_id: str) -> bool:
+        """Подтверждает получение записи агентом; запись больше не будет выдана повторно."""
+        key = stream_key(node_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xack(key, CONSUMER_GROUP, delivery_id)
+            pipe.xdel(key, delivery_id)
+            acked, _ = await pipe.execute()
+        if acked:
+            DISPATCH_EVENTS.labels(event="acked").inc()
+        return bool(acked)
+
+async def requeue_or_timeout(
+    db: AsyncSession,
+    tasks: List[Tuple[int, int]]
+) -> Tuple[List[Tuple[int, int, int]], int]:
+    """
+    Возвращает истекшие RUNNING-задачи в очередь или переводит их в TIMEOUT.
+
+    Обновление условное по (status=RUNNING, retry_count=attempt), так что
+    повторный вызов для той же попытки ничего не делает. Коммит — на вызывающем.
+
+    Args:
+        tasks: Пары (task_id, attempt)
+
+    Returns:
+        (тройки (task_id, node_id, retry_count) задач, ушедших на повтор, для publish();
+         число задач, переведенных в TIMEOUT)
+    """
+    requeued, timed_out = [], 0
+    now = datetime.now(timezone.utc)
+    for task_id, attempt in tasks:
+        guard = (Task.id == task_id, Task.status == TaskStatus.RUNNING, Task.retry_count == attempt)
+        result = await db.execute(
+            update(Task)
+            .where(*guard, Task.retry_count < Task.max_retries)
+            .values(status=TaskStatus.QUEUED, retry_count=Task.retry_count + 1, started_at=None)
+            .returning(Task.id, Task.node_id, Task.retry_count)
+        )
+        row = result.first()
+        if row is not None:
+            requeued.append(tuple(row))
+            continue
+        result = await db.execute(
+            update(Task)
+            .where(*guard)
+            .values(status=TaskStatus.TIMEOUT, completed_at=now)
+            .returning(Task.id)
+        )
+        timed_out += len(result.all())
+    return requeued, timed_out
+
+task_dispatcher = TaskDispatcher(settings.redis_url)
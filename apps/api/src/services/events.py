@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, List, Optional, Set
+
+import redis.asyncio as redis
+from prometheus_client import Counter, Gauge
+
+from ..core.config import settings
+from .metrics import get_cached_dashboard_metrics
+
+logger = logging.getLogger(__name__)
+
+EVENT_SUBSCRIBERS = Gauge('mindvpn_event_subscribers', 'Open /v1/events streams in this process')
+EVENTS_PUBLISHED = Counter('mindvpn_events_published_total', 'Events emitted by this process', ['type'])
+EVENTS_DROPPED = Counter(
+    'mindvpn_events_dropped_total',
+    'Events not delivered',
+    ['reason']  # lagged (subscriber queue full), outbox (Redis unavailable)
+)
+
+# Типы событий; фильтр types принимает и префикс до точки ("node", "task")
+EVENT_TYPES = frozenset({"node.status", "node.drain", "task.status", "task.batch", "dashboard"})
+
+@dataclass
+class Event:
+    type: str
+    data: Dict[str, Any]
+    frame: str = ""
+
+    def __post_init__(self):
+        if not self.frame:
+            self.frame = f"event: {self.type}\ndata: {json.dumps(self.data, default=str, separators=(',', ':'))}\n\n"
+
+# Маркер разрыва в очереди подписчика
+LAGGED = Event("lagged", {})
+
+@dataclass(eq=False)
+class Subscription:
+    """
+    Подписчик /v1/events: фильтры и ограниченная очередь.
+
+    Фильтр по node_id/task_id/batch_id пропускает только события с этим полем.
+    Если в очереди settings.events_queue_size событий, новые отбрасываются и
+    учитываются в dropped — медленный клиент не задерживает остальных. На месте
+    пропуска в очереди стоит маркер: клиент получает lagged ровно между
+    событиями до и после разрыва и может перечитать состояние через REST.
+    """
+    types: Optional[FrozenSet[str]] = None
+    filters: Dict[str, Set[Any]] = field(default_factory=dict)
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    dropped: int = 0
+
+    def matches(self, event: Event) -> bool:
+        if self.types is not None and event.type not in self.types and event.type.split(".")[0] not in self.types:
+            return False
+        return all(event.data.get(key) in values for key, values in self.filters.items())
+
+    def offer(self, event: Event) -> None:
+        if self.queue.qsize() < settings.events_queue_size:
+            self.queue.put_nowait(event)
+            return
+        if not self.dropped:
+            self.queue.put_nowait(LAGGED)
+        self.dropped += 1
+        EVENTS_DROPPED.labels(reason="lagged").inc()
+
+    async def stream(self, keepalive: float) -> AsyncIterator[str]:
+        """Кадры SSE; комментарий-keepalive, если событий нет keepalive секунд."""
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is LAGGED:
+                yield f"event: lagged\ndata: {json.dumps({'dropped': self.dropped})}\n\n"
+                self.dropped = 0
+                continue
+            yield event.frame
+
+class EventBus:
+    """
+    Поток событий флота через Redis pub/sub.
+
+    emit() синхронный и не блокирует: событие сразу раздается подписчикам
+    этого процесса и складывается в outbox, который фоновая задача публикует
+    в settings.events_channel пачкой через pipeline. Слушатель канала раздает
+    события других реплик; свои (по origin) пропускаются.
+
+    Дельты дашборда считаются локально каждой репликой из общего TTL-кэша и
+    только пока есть подписчики на них, поэтому через Redis не идут.
+
+    Тот же канал несет служебные сообщения между репликами (broadcast/on),
+    например инвалидации кэшей; подписчикам /v1/events они не раздаются.
+    """
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._client: Optional[redis.Redis] = None
+        self._subscribers: Set[Subscription] = set()
+        self._outbox: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._dashboard: Optional[Dict[str, Any]] = None
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._publish_loop()),
+                asyncio.create_task(self._listen_loop()),
+                asyncio.create_task(self._dashboard_loop()),
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        try:
+            await self._publish_outbox()
+        except Exception:
+            logger.exception("Final event publish failed")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def emit(self, type: str, **data: Any) -> None:
+        event = Event(type, data)
+        EVENTS_PUBLISHED.labels(type=type).inc()
+        self._dispatch(event)
+        self._enqueue(event)
+
+    def broadcast(self, type: str, **data: Any) -> None:
+        """Служебное сообщение другим репликам; в этом процессе не раздается."""
+        self._enqueue(Event(type, data))
+
+    def on(self, type: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        """Обработчик служебных сообщений type от других реплик."""
+        self._handlers[type] = handler
+
+    def _enqueue(self, event: Event) -> None:
+        if self._tasks:
+            if len(self._outbox) >= settings.events_outbox_size:
+                self._outbox.popleft()
+                EVENTS_DROPPED.labels(reason="outbox").inc()
+            self._outbox.append(event)
+            self._wakeup.set()
+
+    def subscribe(self, types: Optional[FrozenSet[str]] = None, **filters: Set[Any]) -> Subscription:
+        subscription = Subscription(types=types, filters={k: v for k, v in filters.items() if v})
+        self._subscribers.add(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        if self._dashboard is not None:
+            # Новый подписчик получает дашборд целиком как дельту от пустого
+            event = Event("dashboard", self._dashboard)
+            if subscription.matches(event):
+                subscription.offer(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def _dispatch(self, event: Event) -> None:
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    async def _publish_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self._publish_outbox()
+            except Exception:
+                logger.exception("Event publish failed")
+                await asyncio.sleep(1.0)
+                self._wakeup.set()
+
+    async def _publish_outbox(self) -> None:
+        if not self._outbox:
+            return
+        events, self._outbox = self._outbox, deque()
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.publish(self.channel, json.dumps(
+                        {"origin": self.origin, "type": event.type, "data": event.data},
+                        default=str, separators=(",", ":")
+                    ))
+                await pipe.execute()
+        except Exception:
+            # Неотправленное возвращается в начало outbox; сверх лимита отбрасываются самые старые
+            self._outbox.extendleft(reversed(events))
+            while len(self._outbox) > settings.events_outbox_size:
+                self._outbox.popleft()
+                EVENTS_DROPPED.labels(reason="outbox").inc()
+            raise
+
+    async def _listen_loop(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self.origin:
+                        continue
+                    handler = self._handlers.get(payload["type"])
+                    if handler is None:
+                        self._dispatch(Event(payload["type"], payload["data"]))
+                        continue
+                    try:
+                        handler(payload["data"])
+                    except Exception:
+                        logger.exception("Handler for %s failed", payload["type"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event subscription failed, reconnecting")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    async def _dashboard_loop(self) -> None:
+        dashboard = Event("dashboard", {})
+        while True:
+            await asyncio.sleep(settings.events_dashboard_interval)
+            if not any(s.matches(dashboard) for s in self._subscribers):
+                self._dashboard = None
+                continue
+            try:
+                current = await get_cached_dashboard_metrics()
+            except Exception:
+                logger.exception("Dashboard delta failed")
+                continue
+            delta = dashboard_delta(self._dashboard or {}, current)
+            self._dashboard = current
+            if delta:
+                self._dispatch(Event("dashboard", delta))
+
+def dashboard_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Изменившиеся поля current относительно previous с сохранением вложенности."""
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = dashboard_delta(old, value)
+            if nested:
+                delta[key] = nested
+        elif value != old:
+            delta[key] = value
+    return delta
+
+def task_event(task) -> None:
+    """task.status по объекту Task."""
+    event_bus.emit(
+        "task.status",
+        task_id=task.id,
+        node_id=task.node_id,
+        status=task.status.value,
+        batch_id=str(task.batch_id) if task.batch_id else None
+    )
+
+def parse_event_types(types: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Разбирает фильтр types=node,task.status; None — все события."""
+    if not types:
+        return None
+    parsed = frozenset(t.strip() for t in types.split(",") if t.strip())
+    known = EVENT_TYPES | {t.split(".")[0] for t in EVENT_TYPES}
+    unknown = parsed - known
+    if unknown:
+        raise ValueError(f"Unknown event types: {sorted(unknown)}")
+    return parsed
+
+event_bus = EventBus(settings.redis_url, settings.events_channel)
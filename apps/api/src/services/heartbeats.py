@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import DateTime, Integer, String, column, func, update, values
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import Node
+from ..schemas.node import NodeHeartbeat
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_BUFFER_DEPTH = Gauge('mindvpn_heartbeat_buffer_depth', 'Nodes with a heartbeat waiting to be flushed')
+HEARTBEAT_FLUSH_LATENCY = Histogram(
+    'mindvpn_heartbeat_flush_duration_seconds',
+    'Time spent flushing buffered heartbeats to the database',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+HEARTBEATS_RECEIVED = Counter('mindvpn_heartbeats_received_total', 'Heartbeats accepted into the buffer')
+HEARTBEATS_FLUSHED = Counter('mindvpn_heartbeats_flushed_total', 'Coalesced heartbeats written to the database')
+
+@dataclass
+class PendingHeartbeat:
+    received_at: datetime
+    heartbeat: NodeHeartbeat
+
+class HeartbeatBuffer:
+    """Буфер heartbeat'ов: хранит последний heartbeat каждого узла и пишет их в БД пачками."""
+
+    def __init__(self, flush_interval_ms: int, batch_size: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self._pending: Dict[int, PendingHeartbeat] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, node_id: int, heartbeat: NodeHeartbeat) -> None:
+        """Принимает heartbeat; повторный heartbeat узла заменяет предыдущий."""
+        self._pending[node_id] = PendingHeartbeat(datetime.now(timezone.utc), heartbeat)
+        HEARTBEATS_RECEIVED.inc()
+        HEARTBEAT_BUFFER_DEPTH.set(len(self._pending))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Дописываем то, что осталось в буфере
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final heartbeat flush failed")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Heartbeat flush failed")
+
+    async def flush(self) -> int:
+        """Записывает накопленные heartbeat'ы одним UPDATE ... FROM (VALUES ...) на пачку."""
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        HEARTBEAT_BUFFER_DEPTH.set(0)
+        items = list(pending.items())
+        flushed = 0
+
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            started = time.perf_counter()
+            try:
+                await self._write_batch(batch)
+            except BaseException:
+                # В том числе отмена из stop(): пачка вернется в буфер и
+                # попадет в финальный flush (повторный UPDATE безвреден)
+                self._requeue(items[start:])
+                raise
+            finally:
+                HEARTBEAT_FLUSH_LATENCY.observe(time.perf_counter() - started)
+            flushed += len(batch)
+            HEARTBEATS_FLUSHED.inc(len(batch))
+
+        return flushed
+
+    def _requeue(self, items: List[tuple]) -> None:
+        # Более свежий heartbeat, пришедший во время записи, имеет приоритет
+        for node_id, item in items:
+            self._pending.setdefault(node_id, item)
+        HEARTBEAT_BUFFER_DEPTH.set(len(self._pending))
+
+    async def _write_batch(self, batch: List[tuple]) -> None:
+        rows = values(
+            column("id", Integer),
+            column("ts", DateTime(timezone=True)),
+            column("agent_version", String),
+            name="hb"
+        ).data([
+            (node_id, item.received_at, item.heartbeat.versions.get("agent"))
+            for node_id, item in batch
+        ])
+
+        stmt = (
+            update(Node)
+            .where(Node.id == rows.c.id)
+            .values(
+                last_heartbeat_at=rows.c.ts,
+                agent_version=func.coalesce(rows.c.agent_version, Node.agent_version)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        async with SessionLocal() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+heartbeat_buffer = HeartbeatBuffer(
+    flush_interval_ms=settings.heartbeat_flush_interval_ms,
+    batch_size=settings.heartbeat_batch_size
+)
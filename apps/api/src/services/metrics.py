@@ -1,55 +1,98 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, true
+from prometheus_client import Gauge
 from typing import Dict, Any
 
+from ..core.cache import TTLCache
+from ..core.config import settings
+from ..deps import SessionLocal, engine
 from ..models import Node, Task, User, Inbound
+from ..models.inbound import InboundStatus
 from ..models.node import NodeStatus
 from ..models.task import TaskStatus
+from ..models.user import UserStatus
+
+_metrics_registered = False
+
+def setup_metrics() -> None:
+    """Регистрирует метрики пула соединений БД."""
+    global _metrics_registered
+    if _metrics_registered:
+        return
+
+    pool = engine.sync_engine.pool
+    Gauge('mindvpn_db_pool_size', 'Configured DB pool size').set_function(pool.size)
+    Gauge('mindvpn_db_pool_checked_out', 'DB connections currently checked out').set_function(pool.checkedout)
+    Gauge('mindvpn_db_pool_overflow', 'DB connections opened above pool size').set_function(pool.overflow)
+    Gauge('mindvpn_db_pool_idle', 'Idle DB connections in the pool').set_function(pool.checkedin)
+    _metrics_registered = True
+
+dashboard_cache = TTLCache("dashboard", ttl=settings.dashboard_cache_ttl)
 
 class MetricsService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
     async def get_dashboard_metrics(self) -> Dict[str, Any]:
-        """Возвращает метрики для дашборда."""
-        
-        # Статистика узлов
-        nodes_total = self.db.query(Node).count()
-        nodes_online = self.db.query(Node).filter(Node.status == NodeStatus.READY).count()
-        nodes_offline = self.db.query(Node).filter(Node.status.in_([NodeStatus.DOWN, NodeStatus.DEGRADED])).count()
-        
-        # Статистика пользователей
-        users_total = self.db.query(User).count()
-        users_active = self.db.query(User).filter(User.status == "ACTIVE").count()
-        
-        # Статистика задач
-        tasks_total = self.db.query(Task).count()
-        tasks_running = self.db.query(Task).filter(Task.status == TaskStatus.RUNNING).count()
-        tasks_completed = self.db.query(Task).filter(Task.status == TaskStatus.SUCCESS).count()
-        tasks_failed = self.db.query(Task).filter(Task.status == TaskStatus.FAILED).count()
-        
-        # Статистика inbounds
-        inbounds_total = self.db.query(Inbound).count()
-        inbounds_active = self.db.query(Inbound).filter(Inbound.status == "APPLIED").count()
+        """Возвращает метрики для дашборда одним запросом к БД."""
+
+        nodes = select(
+            func.count().label("total"),
+            func.count().filter(Node.status == NodeStatus.READY).label("online"),
+            func.count().filter(Node.status.in_([NodeStatus.DOWN, NodeStatus.DEGRADED])).label("offline")
+        ).select_from(Node).subquery("n")
+
+        users = select(
+            func.count().label("total"),
+            func.count().filter(User.status == UserStatus.ACTIVE).label("active")
+        ).select_from(User).subquery("u")
+
+        tasks = select(
+            func.count().label("total"),
+            func.count().filter(Task.status == TaskStatus.RUNNING).label("running"),
+            func.count().filter(Task.status == TaskStatus.SUCCESS).label("completed"),
+            func.count().filter(Task.status == TaskStatus.FAILED).label("failed")
+        ).select_from(Task).subquery("t")
+
+        inbounds = select(
+            func.count().label("total"),
+            func.count().filter(Inbound.status == InboundStatus.APPLIED).label("active")
+        ).select_from(Inbound).subquery("i")
+
+        # Каждый подзапрос возвращает одну строку, поэтому join даёт ровно одну строку
+        query = select(nodes, users, tasks, inbounds).select_from(
+            nodes.join(users, true()).join(tasks, true()).join(inbounds, true())
+        )
+        row = (await self.db.execute(query)).one()
         
         return {
             "nodes": {
-                "total": nodes_total,
-                "online": nodes_online,
-                "offline": nodes_offline
+                "total": row[0],
+                "online": row[1],
+                "offline": row[2]
             },
             "users": {
-                "total": users_total,
-                "active": users_active
+                "total": row[3],
+                "active": row[4]
             },
             "tasks": {
-                "total": tasks_total,
-                "running": tasks_running,
-                "completed": tasks_completed,
-                "failed": tasks_failed
+                "total": row[5],
+                "running": row[6],
+                "completed": row[7],
+                "failed": row[8]
             },
             "inbounds": {
-                "total": inbounds_total,
-                "active": inbounds_active
+                "total": row[9],
+                "active": row[10]
             }
         }
+
+async def get_cached_dashboard_metrics(fresh: bool = False) -> Dict[str, Any]:
+    """Возвращает метрики дашборда из общего TTL-кэша."""
+
+    async def compute() -> Dict[str, Any]:
+        # Отдельная сессия: вычисление переживает запрос, который его запустил
+        async with SessionLocal() as db:
+            return await MetricsService(db).get_dashboard_metrics()
+
+    return await dashboard_cache.get_or_compute("dashboard", compute, fresh=fresh)
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Set
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import Integer, column, select, update, values
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import Node
+from ..models.node import NodeStatus
+from .events import event_bus
+from .node_scores import node_scores
+
+logger = logging.getLogger(__name__)
+
+NODES_BY_STATUS = Gauge('mindvpn_nodes', 'Nodes by health status', ['status'])
+NODE_TRANSITIONS = Counter(
+    'mindvpn_node_status_transitions_total',
+    'Node health status transitions',
+    ['from_status', 'to_status']
+)
+HEALTH_TICK_LATENCY = Histogram(
+    'mindvpn_node_health_tick_duration_seconds',
+    'Time spent expiring heartbeat timers and writing status transitions',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+class TimerWheel:
+    """
+    Колесо таймеров: кольцо слотов по одному на тик, у ключа не больше одного таймера.
+
+    schedule/cancel — O(1), advance обходит только слоты прошедших тиков и
+    возвращает сработавшие ключи. Таймер дальше горизонта колеса срабатывает
+    раньше срока: вызывающий код сверяет время сам и переставляет таймер.
+    """
+
+    def __init__(self, tick: float, horizon: float, now: float):
+        self.tick = tick
+        self._slots: List[Set[Hashable]] = [set() for _ in range(math.ceil(horizon / tick) + 2)]
+        self._due: Dict[Hashable, int] = {}  # ключ -> абсолютный номер тика
+        self._cursor = int(now / tick)  # последний обработанный тик
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, key: Hashable, at: float) -> None:
+        self.cancel(key)
+        due = min(max(math.ceil(at / self.tick), self._cursor + 1), self._cursor + len(self._slots) - 1)
+        self._due[key] = due
+        self._slots[due % len(self._slots)].add(key)
+
+    def cancel(self, key: Hashable) -> None:
+        due = self._due.pop(key, None)
+        if due is not None:
+            self._slots[due % len(self._slots)].discard(key)
+
+    def advance(self, now: float) -> List[Hashable]:
+        target = int(now / self.tick)
+        expired = []
+        # В окне колеса каждый слот содержит таймеры ровно одного тика
+        for t in range(self._cursor + 1, self._cursor + 1 + min(target - self._cursor, len(self._slots))):
+            slot = self._slots[t % len(self._slots)]
+            for key in slot:
+                del self._due[key]
+            expired.extend(slot)
+            slot.clear()
+        self._cursor = max(self._cursor, target)
+        return expired
+
+class NodeHealthTracker:
+    """
+    Машина состояний здоровья узлов по heartbeat'ам.
+
+    Heartbeat переводит узел в READY; без heartbeat'а settings.node_degraded_after
+    секунд узел становится DEGRADED, через settings.agent_timeout — DOWN.
+    Время последнего heartbeat'а и таймеры живут в памяти (TimerWheel), таблица
+    nodes читается один раз при старте. Перед понижением статуса сработавшие
+    узлы сверяются с nodes.last_heartbeat_at — heartbeat мог прийти в другую
+    реплику API. Переходы пишутся в БД пачками UPDATE ... FROM (VALUES ...).
+
+    Heartbeat с node_id, которого трекер не знает, не создает узел: id
+    проверяется по таблице nodes в ближайший тик (узел мог зарегистрироваться
+    в другой реплике), несуществующие отбрасываются.
+    """
+
+    def __init__(self, tick_ms: int, degraded_after: float, timeout: float, batch_size: int):
+        self.tick = tick_ms / 1000
+        self.degraded_after = degraded_after
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._status: Dict[int, NodeStatus] = {}
+        self._last_seen: Dict[int, float] = {}
+        self._pending: Dict[int, NodeStatus] = {}
+        self._unknown: Dict[int, float] = {}  # node_id -> время heartbeat'а
+        self._counts: Dict[NodeStatus, int] = {status: 0 for status in NodeStatus}
+        self._wheel = TimerWheel(self.tick, max(degraded_after, timeout), time.time())
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.load()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final node status flush failed")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            started = time.perf_counter()
+            try:
+                await self.tick_once()
+            except Exception:
+                logger.exception("Node health tick failed")
+            finally:
+                HEALTH_TICK_LATENCY.observe(time.perf_counter() - started)
+
+    async def load(self) -> None:
+        """Загружает статусы узлов при старте; живым узлам дается полный интервал до понижения."""
+        async with SessionLocal() as db:
+            rows = (await db.execute(select(Node.id, Node.status))).all()
+        now = time.time()
+        for node_id, status in rows:
+            self._set_status(node_id, status)
+            if status in (NodeStatus.READY, NodeStatus.DEGRADED):
+                # После рестарта API отсчет идет с момента загрузки, а не с последнего heartbeat'а
+                self._last_seen[node_id] = now
+                self._wheel.schedule(node_id, now + self._next_delay(status))
+        self._publish_counts()
+
+    def track(self, node_id: int, status: NodeStatus) -> None:
+        """Учитывает статус узла, уже записанный в БД (например, при регистрации)."""
+        self._set_status(node_id, status)
+        self._publish_counts()
+
+    def observe(self, node_id: int) -> None:
+        """Heartbeat узла: O(1), запись статуса — в ближайший тик."""
+        now = time.time()
+        if node_id not in self._status:
+            self._unknown[node_id] = now
+            return
+        self._seen(node_id, now)
+
+    def _seen(self, node_id: int, at: float) -> None:
+        self._last_seen[node_id] = max(self._last_seen.get(node_id, 0.0), at)
+        if self._status.get(node_id) != NodeStatus.READY:
+            self._transition(node_id, NodeStatus.READY)
+        self._wheel.schedule(node_id, self._last_seen[node_id] + self.degraded_after)
+
+    def status(self, node_id: int) -> Optional[NodeStatus]:
+        return self._status.get(node_id)
+
+    async def tick_once(self) -> None:
+        """Обрабатывает сработавшие таймеры и записывает накопленные переходы."""
+        if self._unknown:
+            await self._adopt()
+        expired = self._wheel.advance(time.time())
+        if expired:
+            await self._expire(expired)
+        self._publish_counts()
+        await self.flush()
+
+    async def _adopt(self) -> None:
+        """Начинает отслеживать узлы из heartbeat'ов, если они есть в таблице nodes."""
+        unknown, self._unknown = self._unknown, {}
+        node_ids = list(unknown)
+        async with SessionLocal() as db:
+            for start in range(0, len(node_ids), self.batch_size):
+                batch = node_ids[start:start + self.batch_size]
+                rows = (await db.execute(select(Node.id, Node.status).where(Node.id.in_(batch)))).all()
+                for node_id, status in rows:
+                    if node_id not in self._status:
+                        self._set_status(node_id, status)
+                    self._seen(node_id, unknown[node_id])
+
+    async def _expire(self, node_ids: List[int]) -> None:
+        confirmed: Dict[int, float] = {}
+        async with SessionLocal() as db:
+            for start in range(0, len(node_ids), self.batch_size):
+                batch = node_ids[start:start + self.batch_size]
+                rows = await db.execute(select(Node.id, Node.last_heartbeat_at).where(Node.id.in_(batch)))
+                confirmed.update((node_id, ts.timestamp()) for node_id, ts in rows if ts is not None)
+
+        now = time.time()
+        for node_id in node_ids:
+            if node_id not in self._status:
+                continue
+            seen = max(self._last_seen.get(node_id, 0.0), confirmed.get(node_id, 0.0))
+            self._last_seen[node_id] = seen
+            silent = now - seen
+            if silent >= self.timeout:
+                if self._status[node_id] != NodeStatus.DOWN:
+                    self._transition(node_id, NodeStatus.DOWN)
+                continue
+            if silent >= self.degraded_after and self._status[node_id] == NodeStatus.READY:
+                self._transition(node_id, NodeStatus.DEGRADED)
+            self._wheel.schedule(node_id, seen + self._next_delay(self._status[node_id]))
+
+    def _next_delay(self, status: NodeStatus) -> float:
+        return self.degraded_after if status == NodeStatus.READY else self.timeout
+
+    def _transition(self, node_id: int, status: NodeStatus) -> None:
+        old = self._status.get(node_id)
+        NODE_TRANSITIONS.labels(from_status=old.value if old else "UNKNOWN", to_status=status.value).inc()
+        self._set_status(node_id, status)
+        self._pending[node_id] = status
+        node_scores.update(node_id, status=status)
+        event_bus.emit("node.status", node_id=node_id, status=status.value, previous=old.value if old else None)
+
+    def _set_status(self, node_id: int, status: NodeStatus) -> None:
+        old = self._status.get(node_id)
+        if old is not None:
+            self._counts[old] -= 1
+        self._status[node_id] = status
+        self._counts[status] += 1
+
+    def _publish_counts(self) -> None:
+        for status, count in self._counts.items():
+            NODES_BY_STATUS.labels(status=status.value).set(count)
+
+    async def flush(self) -> int:
+        """Записывает накопленные переходы статусов одним UPDATE ... FROM (VALUES ...) на пачку."""
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        items = list(pending.items())
+        for start in range(0, len(items), self.batch_size):
+            try:
+                await self._write_batch(items[start:start + self.batch_size])
+            except BaseException:
+                # В том числе отмена из stop(), чтобы финальный flush записал
+                # переход; переход, случившийся во время записи, новее
+                for node_id, status in items[start:]:
+                    self._pending.setdefault(node_id, status)
+                raise
+        return len(items)
+
+    async def _write_batch(self, batch: List[tuple]) -> None:
+        rows = values(
+            column("id", Integer),
+            column("status", Node.__table__.c.status.type),
+            name="transitions"
+        ).data(batch)
+
+        stmt = (
+            update(Node)
+            .where(Node.id == rows.c.id, Node.status != rows.c.status)
+            .values(status=rows.c.status)
+            .execution_options(synchronize_session=False)
+        )
+
+        async with SessionLocal() as db:
+            await db.execute(stmt)
+            await db.commit()
+
+node_health = NodeHealthTracker(
+    tick_ms=settings.node_health_tick_ms,
+    degraded_after=settings.node_degraded_after,
+    timeout=settings.agent_timeout,
+    batch_size=settings.heartbeat_batch_size
+)
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.pagination import keyset_paginate, page_cursor
+from ..core.selectors import LabelSelector, SelectorError
+from ..models import Node, Task
+from ..models.node import NodeStatus
+from ..models.task import TaskAction, TargetType, TaskStatus
+from ..schemas.node import NodeCreate, NodeRegister
+from .dispatch import task_dispatcher
+from .events import event_bus
+from .node_health import node_health
+from .node_scores import node_scores
+from .orgs import resolve_org_id
+
+def parse_label_selector(selector: Optional[str]) -> LabelSelector:
+    """Разбирает label selector из запроса; ошибки синтаксиса превращаются в 400."""
+    try:
+        return LabelSelector.parse(selector)
+    except SelectorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def select_nodes(selector: LabelSelector):
+    """Запрос узлов, подходящих под селектор; используется и для массовых задач."""
+    query = select(Node)
+    if selector:
+        query = query.where(selector.where(Node.labels))
+    return query
+
+class NodeRegistryService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _issue_certificate(self, csr_pem: str) -> Tuple[str, str]:
+        """Подписывает CSR агента корневым CA и возвращает (cert_pem, ca_pem)."""
+        try:
+            csr = x509.load_pem_x509_csr(csr_pem.encode("utf-8"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid CSR")
+        if not csr.is_signature_valid:
+            raise HTTPException(status_code=400, detail="Invalid CSR signature")
+
+        try:
+            with open(settings.ca_cert_path, "rb") as f:
+                ca_pem = f.read()
+            with open(settings.ca_key_path, "rb") as f:
+                ca_key = serialization.load_pem_private_key(f.read(), password=None)
+        except OSError:
+            raise HTTPException(status_code=503, detail="Certificate authority is not configured")
+        ca_cert = x509.load_pem_x509_certificate(ca_pem)
+
+        now = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(csr.subject)
+            .issuer_name(ca_cert.subject)
+            .public_key(csr.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(minutes=5))
+            .not_valid_after(now + timedelta(days=settings.agent_cert_validity_days))
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+            .add_extension(x509.ExtendedKeyUsage([x509.oid.ExtendedKeyUsageOID.CLIENT_AUTH]), critical=False)
+            .sign(ca_key, hashes.SHA256())
+        )
+        return cert.public_bytes(serialization.Encoding.PEM).decode("utf-8"), ca_pem.decode("utf-8")
+
+    async def register_node(self, node_data: NodeCreate) -> NodeRegister:
+        """Регистрирует узел (или перерегистрирует существующий по hostname) и выпускает сертификат агента."""
+        cert_pem, ca_pem = self._issue_certificate(node_data.csr_pem)
+
+        node = (await self.db.execute(select(Node).where(Node.hostname == node_data.hostname))).scalar_one_or_none()
+        if node is None:
+            node = Node(
+                hostname=node_data.hostname,
+                org_id=await resolve_org_id(self.db),
+                status=NodeStatus.NEW
+            )
+            self.db.add(node)
+
+        node.name = node_data.name or node.name or node_data.hostname
+        node.ipv4 = node_data.ipv4 or node.ipv4
+        node.ipv6 = node_data.ipv6 or node.ipv6
+        node.region = node_data.region or node_data.labels.get("region") or node.region
+        node.provider = node_data.provider or node_data.labels.get("provider") or node.provider
+        node.labels = node_data.labels
+        node.agent_cert_cn = x509.load_pem_x509_certificate(cert_pem.encode("utf-8")).subject.rfc4514_string()
+
+        await self.db.commit()
+        await self.db.refresh(node)
+        node_health.track(node.id, node.status)
+        node_scores.update(node.id, region=node.region or "", status=node.status, draining=node.draining)
+
+        return NodeRegister(
+            node_id=node.id,
+            agent_config={
+                "cp_url": settings.cp_url,
+                "node_id": node.id,
+                "heartbeat_interval": settings.agent_heartbeat_interval
+            },
+            cert_pem=cert_pem,
+            ca_pem=ca_pem
+        )
+
+    async def get_node(self, node_id: int) -> Optional[Node]:
+        return await self.db.get(Node, node_id)
+
+    def list_query(
+        self,
+        region: Optional[str] = None,
+        provider: Optional[str] = None,
+        status: Optional[NodeStatus] = None,
+        labels: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ):
+        """Строит запрос списка узлов с фильтрами и keyset-пагинацией."""
+        query = select_nodes(parse_label_selector(labels))
+        if region:
+            query = query.where(Node.region == region)
+        if provider:
+            query = query.where(Node.provider == provider)
+        if status:
+            query = query.where(Node.status == status)
+        return keyset_paginate(query, Node, cursor, limit)
+
+    async def list_nodes(
+        self,
+        region: Optional[str],
+        provider: Optional[str],
+        status: Optional[NodeStatus],
+        labels: Optional[str],
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Node], Optional[str]]:
+        """Возвращает страницу узлов и курсор следующей страницы."""
+        result = await self.db.execute(self.list_query(region, provider, status, labels, cursor, limit))
+        return page_cursor(result.scalars().all(), limit)
+
+    async def drain_node(self, node_id: int, enabled: bool) -> dict:
+        """Включает/выключает drain и ставит агенту задачу DRAIN_NODE."""
+        node = await self.db.get(Node, node_id)
+        if not node:
+            raise HTTPException(status_code=404, detail="Node not found")
+
+        node.draining = enabled
+        task = Task(
+            action=TaskAction.DRAIN_NODE,
+            target_type=TargetType.NODE,
+            target_id=node.id,
+            org_id=node.org_id,
+            node_id=node.id,
+            status=TaskStatus.QUEUED,
+            payload={"enabled": enabled},
+            retry_count=0,
+            max_retries=settings.task_retry_attempts
+        )
+        self.db.add(task)
+        await self.db.commit()
+        node_scores.update(node.id, draining=enabled)
+        event_bus.emit("node.drain", node_id=node.id, draining=enabled)
+        await task_dispatcher.publish([(task.id, task.node_id, task.retry_count)])
+        return {"node_id": node.id, "draining": enabled, "task_id": task.id}
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from prometheus_client import Gauge
+from sqlalchemy import func, select
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import Node, TrafficSample1m
+from ..models.node import NodeStatus
+
+logger = logging.getLogger(__name__)
+
+NODES_SELECTABLE = Gauge(
+    'mindvpn_node_score_selectable_nodes',
+    'Nodes eligible for new connections in the scoring index',
+    ['region']
+)
+
+# Узлы в этих статусах идут после всех READY
+STATUS_PENALTY = {
+    NodeStatus.READY: 0.0,
+    NodeStatus.NEW: 1e6,
+    NodeStatus.DEGRADED: 1e6,
+}
+
+@dataclass
+class NodeLoad:
+    region: Optional[str] = None
+    status: Optional[NodeStatus] = None
+    draining: bool = False
+    users_online: int = 0
+    throughput: float = 0.0  # байт/с за окно settings.node_score_throughput_window
+    score: Optional[float] = None  # None — узел не выдается в bundle
+
+    def compute_score(self) -> Optional[float]:
+        if self.region is None or self.draining or self.status not in STATUS_PENALTY:
+            return None
+        return (
+            STATUS_PENALTY[self.status]
+            + self.users_online * settings.node_score_users_weight
+            + self.throughput * 8 / 1e6 * settings.node_score_mbps_weight
+        )
+
+class NodeScoreIndex:
+    """
+    Индекс загрузки узлов в памяти: по региону отсортированный список (score, node_id).
+
+    Обновляется heartbeat'ами (users_online), drain/статусом узла и раз в
+    settings.node_score_refresh_interval — пропускной способностью из
+    traffic_samples_1m. Поиск позиции — bisect, вставка и удаление сдвигают
+    хвост списка (O(n), memmove; регион — до тысяч узлов), K лучших узлов
+    региона — срез начала списка. DOWN и draining узлы в списки не попадают.
+
+    Подписчики получают регион, когда узел входит в число выдаваемых или
+    выходит из него (drain, DOWN, смена региона) и когда меняется состав
+    первых watch_depth узлов (окно выбора для bundle). Организация выбирает
+    из своих узлов, которые могут стоять ниже общего окна, поэтому вход и
+    выход отслеживаются по всему региону; перестановки ниже окна на каждый
+    heartbeat не сообщаются — их подхватывает пересборка bundle'ов по
+    settings.bundle_cache_max_age.
+    """
+
+    def __init__(self, refresh_interval: float, watch_depth: int):
+        self.refresh_interval = refresh_interval
+        self.watch_depth = watch_depth
+        self.loaded = False
+        self._nodes: Dict[int, NodeLoad] = {}
+        self._regions: Dict[str, List[Tuple[float, int]]] = {}
+        self._tops: Dict[str, Set[int]] = {}
+        self._unknown: Set[int] = set()
+        self._subscribers: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        self._subscribers.append(callback)
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.load()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Node score refresh failed")
+
+    async def load(self) -> None:
+        """Полная загрузка узлов при старте."""
+        async with SessionLocal() as db:
+            rows = (await db.execute(select(Node.id, Node.region, Node.status, Node.draining))).all()
+        for node_id, region, status, draining in rows:
+            self.update(node_id, region=region or "", status=status, draining=draining)
+        self.loaded = True
+        await self.refresh()
+
+    async def refresh(self) -> None:
+        """Догружает узлы, впервые замеченные по heartbeat, и пересчитывает пропускную способность."""
+        window = settings.node_score_throughput_window
+        since = datetime.now(timezone.utc) - timedelta(seconds=window)
+        unknown, self._unknown = self._unknown, set()
+        async with SessionLocal() as db:
+            if unknown:
+                rows = (await db.execute(
+                    select(Node.id, Node.region, Node.status, Node.draining).where(Node.id.in_(unknown))
+                )).all()
+                for node_id, region, status, draining in rows:
+                    # Статус, уже выставленный трекером здоровья, свежее записанного в БД
+                    load = self._nodes.get(node_id)
+                    status = load.status if load is not None and load.status is not None else status
+                    self.update(node_id, region=region or "", status=status, draining=draining)
+                # Heartbeat'ы с id несуществующих узлов не оставляют записей в индексе
+                for node_id in unknown - {row[0] for row in rows}:
+                    self.remove(node_id)
+            totals = dict((await db.execute(
+                select(TrafficSample1m.node_id, func.sum(TrafficSample1m.bytes_in + TrafficSample1m.bytes_out))
+                .where(TrafficSample1m.bucket >= since)
+                .group_by(TrafficSample1m.node_id)
+            )).all())
+
+        for node_id, load in list(self._nodes.items()):
+            throughput = float(totals.get(node_id) or 0) / window
+            if throughput != load.throughput:
+                self.update(node_id, throughput=throughput)
+
+    def observe_heartbeat(self, node_id: int, users_online: int) -> None:
+        if node_id not in self._nodes:
+            self._unknown.add(node_id)
+        self.update(node_id, users_online=users_online)
+
+    def update(self, node_id: int, **changes) -> None:
+        """Меняет поля NodeLoad узла и переставляет его в списке региона."""
+        load = self._nodes.get(node_id)
+        if load is None:
+            load = self._nodes[node_id] = NodeLoad()
+        old_region, old_score = load.region, load.score
+        for name, value in changes.items():
+            setattr(load, name, value)
+        load.score = load.compute_score()
+        if (old_region, old_score) == (load.region, load.score):
+            return
+
+        if old_score is not None:
+            ranked = self._regions[old_region]
+            del ranked[bisect_left(ranked, (old_score, node_id))]
+        if load.score is not None:
+            insort(self._regions.setdefault(load.region, []), (load.score, node_id))
+
+        for region in {old_region, load.region} - {None}:
+            was_selectable = old_region == region and old_score is not None
+            is_selectable = load.region == region and load.score is not None
+            self._check_top(region, notify=was_selectable != is_selectable)
+
+    def remove(self, node_id: int) -> None:
+        if node_id in self._nodes:
+            self.update(node_id, region=None)
+            del self._nodes[node_id]
+
+    def _check_top(self, region: str, notify: bool = False) -> None:
+        ranked = self._regions.get(region, [])
+        NODES_SELECTABLE.labels(region=region).set(len(ranked))
+        top = {node_id for _, node_id in ranked[:self.watch_depth]}
+        if notify or top != self._tops.get(region, set()):
+            self._tops[region] = top
+            for callback in self._subscribers:
+                callback(region)
+
+    def iter_best(self, region: str) -> Iterator[int]:
+        """Узлы региона от наименее к наиболее загруженному."""
+        for _, node_id in self._regions.get(region or "", []):
+            yield node_id
+
+    def best(self, region: str, k: int) -> List[int]:
+        return [node_id for _, node_id in self._regions.get(region or "", [])[:k]]
+
+    def score(self, node_id: int) -> Optional[float]:
+        load = self._nodes.get(node_id)
+        return load.score if load else None
+
+    def choose(self, candidates: Dict[str, Iterable[int]], k: int, spread: int, key: int) -> Set[int]:
+        """
+        Выбирает k узлов каждого региона среди k * spread наименее загруженных кандидатов.
+
+        Выбор внутри этого окна — rendezvous-хэш по key (ID пользователя):
+        у одного пользователя он стабилен, а разные пользователи равномерно
+        расходятся по окну вместо того, чтобы всем достался один лучший узел.
+
+        Args:
+            candidates: Регион -> узлы, на которых есть подходящие inbound'ы
+            k: Узлов на регион
+            spread: Во сколько раз окно кандидатов шире k
+            key: Ключ распределения
+        """
+        chosen = set()
+        for region, node_ids in candidates.items():
+            allowed = set(node_ids)
+            window = []
+            for node_id in self.iter_best(region):
+                if node_id in allowed:
+                    window.append(node_id)
+                    if len(window) == k * spread:
+                        break
+            window.sort(key=lambda node_id: hash((key, node_id)))
+            chosen.update(window[:k])
+        return chosen
+
+node_scores = NodeScoreIndex(
+    refresh_interval=settings.node_score_refresh_interval,
+    watch_depth=settings.bundle_nodes_per_region * settings.bundle_node_spread
+)
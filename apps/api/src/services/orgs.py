@@ -0,0 +1,15 @@
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from ..models import Org
+
+async def resolve_org_id(db: AsyncSession, org_id: Optional[int] = None) -> int:
+    """Возвращает org_id запроса или организацию по умолчанию (первую созданную)."""
+    if org_id is not None:
+        return org_id
+    default_id = (await db.execute(select(Org.id).order_by(Org.id).limit(1))).scalar_one_or_none()
+    if default_id is None:
+        raise HTTPException(status_code=400, detail="No organization exists")
+    return default_id
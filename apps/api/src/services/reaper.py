@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import case, func, literal, select, update
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import Task
+from ..models.task import TaskStatus
+from .dispatch import task_dispatcher
+from .events import event_bus
+
+logger = logging.getLogger(__name__)
+
+REAP_LAG = Gauge(
+    'mindvpn_task_reap_lag_seconds',
+    'How long the oldest expired RUNNING task has been waiting to be reaped'
+)
+REAP_DURATION = Histogram(
+    'mindvpn_task_reap_duration_seconds',
+    'Time spent in one reaper pass',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+TASKS_REAPED = Counter(
+    'mindvpn_tasks_reaped_total',
+    'Tasks handled by the reaper',
+    ['result']  # requeued, timeout, republished
+)
+
+class TaskReaper:
+    """
+    Фоновый обработчик зависших задач.
+
+    RUNNING-задачи с started_at старше settings.task_timeout возвращаются
+    в очередь (retry_count+1) или, если исчерпан max_retries, переводятся
+    в TIMEOUT. Задачи берутся пачками через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому несколько реплик API делят работу без блокировок друг друга.
+
+    Кроме того, QUEUED-задачи, которые не забрали за task_timeout (например,
+    публикация в Redis не удалась), публикуются повторно.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Task reaper pass failed")
+            finally:
+                REAP_DURATION.observe(time.perf_counter() - started)
+            await asyncio.sleep(self.interval)
+
+    async def reap(self) -> dict:
+        """Один проход: замер лага, пачки истекших задач до исчерпания, затем переопубликация."""
+        await self._update_lag()
+        stats = {"requeued": 0, "timeout": 0, "republished": 0}
+        while True:
+            requeued, timed_out = await self._reap_batch()
+            stats["requeued"] += len(requeued)
+            stats["timeout"] += timed_out
+            if requeued:
+                await task_dispatcher.publish(requeued)
+            if len(requeued) + timed_out < self.batch_size:
+                break
+
+        while True:
+            stale = await self._republish_batch()
+            stats["republished"] += len(stale)
+            if stale:
+                await task_dispatcher.publish(stale)
+            if len(stale) < self.batch_size:
+                break
+
+        for result, count in stats.items():
+            if count:
+                TASKS_REAPED.labels(result=result).inc(count)
+        return stats
+
+    async def _reap_batch(self) -> Tuple[List[Tuple[int, int, int]], int]:
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=settings.task_timeout)
+        expired = (
+            select(Task.id)
+            .where(Task.status == TaskStatus.RUNNING, Task.started_at < deadline)
+            .order_by(Task.started_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("expired")
+        )
+        retry = Task.retry_count < Task.max_retries
+        stmt = (
+            update(Task)
+            .where(Task.id == expired.c.id)
+            .values(
+                status=case(
+                    (retry, literal(TaskStatus.QUEUED, Task.status.type)),
+                    else_=literal(TaskStatus.TIMEOUT, Task.status.type)
+                ),
+                retry_count=case((retry, Task.retry_count + 1), else_=Task.retry_count),
+                started_at=case((retry, None), else_=Task.started_at),
+                completed_at=case((retry, None), else_=func.now())
+            )
+            .returning(Task.id, Task.node_id, Task.retry_count, Task.status, Task.batch_id)
+            .execution_options(synchronize_session=False)
+        )
+        async with SessionLocal() as db:
+            rows = (await db.execute(stmt)).all()
+            await db.commit()
+
+        for id, node_id, retry_count, status, batch_id in rows:
+            event_bus.emit("task.status", task_id=id, node_id=node_id, status=status.value,
+                           batch_id=str(batch_id) if batch_id else None)
+        requeued = [(id, node_id, retry_count) for id, node_id, retry_count, status, _ in rows if status == TaskStatus.QUEUED]
+        return requeued, len(rows) - len(requeued)
+
+    async def _republish_batch(self) -> List[Tuple[int, int, int]]:
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=settings.task_timeout)
+        stale = (
+            select(Task.id)
+            .where(Task.status == TaskStatus.QUEUED, Task.updated_at < deadline)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("stale")
+        )
+        # updated_at сдвигается, чтобы следующая публикация была не раньше чем через task_timeout
+        stmt = (
+            update(Task)
+            .where(Task.id == stale.c.id)
+            .values(updated_at=func.now())
+            .returning(Task.id, Task.node_id, Task.retry_count)
+            .execution_options(synchronize_session=False)
+        )
+        async with SessionLocal() as db:
+            rows = (await db.execute(stmt)).all()
+            await db.commit()
+        return [tuple(row) for row in rows]
+
+    async def _update_lag(self) -> None:
+        # Насколько самая старая истекшая задача пережила свой дедлайн к началу прохода;
+        # min(started_at) по RUNNING — index-only scan по (status, started_at)
+        async with SessionLocal() as db:
+            oldest = (await db.execute(
+                select(func.min(Task.started_at)).where(Task.status == TaskStatus.RUNNING)
+            )).scalar()
+        lag = 0.0
+        if oldest is not None:
+            expires_at = oldest + timedelta(seconds=settings.task_timeout)
+            lag = max((datetime.now(timezone.utc) - expires_at).total_seconds(), 0.0)
+        REAP_LAG.set(lag)
+
+task_reaper = TaskReaper(
+    interval=settings.task_reaper_interval,
+    batch_size=settings.task_reaper_batch_size
+)
@@ -0,0 +1,259 @@
+import asyncio
+import codecs
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from prometheus_client import Counter
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import Task, TaskLogChunk
+from ..models.task import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+LOG_BYTES_APPENDED = Counter('mindvpn_task_log_bytes_appended_total', 'Task log bytes appended by agents')
+LOG_CHUNKS_COMPACTED = Counter('mindvpn_task_log_chunks_compacted_total', 'Cold task log chunks merged and compressed')
+
+FINISHED_STATUSES = (TaskStatus.SUCCESS, TaskStatus.FAILED, TaskStatus.TIMEOUT)
+
+def _chunk_bytes(chunk: TaskLogChunk) -> bytes:
+    return zlib.decompress(chunk.data) if chunk.compressed else chunk.data
+
+class TaskLogService:
+    """
+    Логи задач в task_log_chunks.
+
+    Каждая дозапись — новый кусок со смещением start_offset; смещение и номер
+    берутся из счетчиков Task.log_size/log_chunk_count одним UPDATE ... RETURNING,
+    поэтому дозапись не зависит от размера лога и не переписывает старые данные.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def append(self, task_id: int, data: bytes, node_id: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Дописывает данные в лог задачи.
+
+        Args:
+            task_id: ID задачи
+            data: Байты лога (UTF-8)
+            node_id: Если задан, задача должна принадлежать этому узлу
+
+        Returns:
+            (смещение начала записанного куска, размер лога после записи)
+        """
+        where = [Task.id == task_id]
+        if node_id is not None:
+            where.append(Task.node_id == node_id)
+        if not data:
+            size = (await self.db.execute(select(Task.log_size).where(*where))).scalar()
+            if size is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            return size, size
+        # Блокировка строки задачи упорядочивает конкурентные дозаписи
+        result = await self.db.execute(
+            update(Task)
+            .where(*where)
+            .values(log_size=Task.log_size + len(data), log_chunk_count=Task.log_chunk_count + 1)
+            .returning(Task.log_size, Task.log_chunk_count)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        size, count = row
+        start_offset = size - len(data)
+
+        await self.db.execute(insert(TaskLogChunk).values(
+            task_id=task_id,
+            seq=count - 1,
+            start_offset=start_offset,
+            size=len(data),
+            data=data
+        ))
+        LOG_BYTES_APPENDED.inc(len(data))
+        return start_offset, size
+
+    async def read(self, task_id: int, offset: int, length: int) -> Tuple[bytes, int, int]:
+        """
+        Читает диапазон байт лога.
+
+        Args:
+            task_id: ID задачи
+            offset: Смещение; отрицательное — от конца лога (хвост)
+            length: Максимальное число байт
+
+        Returns:
+            (данные, фактическое смещение начала, текущий размер лога)
+        """
+        size = (await self.db.execute(select(Task.log_size).where(Task.id == task_id))).scalar()
+        if size is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+        start = max(size + offset, 0) if offset < 0 else min(offset, size)
+        end = min(start + length, size)
+        if start >= end:
+            return b"", start, size
+
+        # Первый кусок — последний, начинающийся не позже start
+        first = (
+            select(func.coalesce(func.max(TaskLogChunk.start_offset), 0))
+            .where(TaskLogChunk.task_id == task_id, TaskLogChunk.start_offset <= start)
+            .scalar_subquery()
+        )
+        chunks = (await self.db.execute(
+            select(TaskLogChunk)
+            .where(
+                TaskLogChunk.task_id == task_id,
+                TaskLogChunk.start_offset >= first,
+                TaskLogChunk.start_offset < end
+            )
+            .order_by(TaskLogChunk.start_offset)
+        )).scalars().all()
+
+        data = b"".join(_chunk_bytes(c) for c in chunks)
+        base = chunks[0].start_offset if chunks else start
+        return data[start - base:end - base], start, size
+
+    async def tail(self, task_id: int, offset: int, poll_interval: float) -> AsyncIterator[str]:
+        """
+        SSE-поток лога начиная с offset; завершается, когда задача закончена и лог дочитан.
+
+        id события — смещение после переданных данных, поэтому клиент
+        продолжает с Last-Event-ID после переподключения.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data, start, size = await self.read(task_id, offset, settings.task_log_max_read)
+            offset = start + len(data)
+            if data:
+                text = decoder.decode(data)
+                if text:
+                    lines = "\n".join(f"data: {line}" for line in text.split("\n"))
+                    yield f"id: {offset}\nevent: log\n{lines}\n\n"
+                continue
+
+            status = (await self.db.execute(select(Task.status).where(Task.id == task_id))).scalar()
+            # Сессия не держит соединение между опросами
+            await self.db.rollback()
+            if status in FINISHED_STATUSES and offset >= size:
+                yield f"id: {offset}\nevent: end\ndata: {status.value}\n\n"
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def compact_task(self, task_id: int, cold_before: datetime) -> int:
+        """
+        Склеивает подряд идущие холодные несжатые куски задачи в сегменты
+        до settings.task_log_segment_size и сжимает их zlib. Смещения
+        сохраняются: сегмент получает start_offset и seq своего первого куска.
+
+        Returns:
+            Число исходных кусков, замененных сегментами
+        """
+        locked = (await self.db.execute(
+            select(Task.id).where(Task.id == task_id).with_for_update(skip_locked=True)
+        )).scalar()
+        if locked is None:
+            # Задачу сейчас дописывают или сжимает другая реплика
+            await self.db.rollback()
+            return 0
+
+        chunks = (await self.db.execute(
+            select(TaskLogChunk)
+            .where(
+                TaskLogChunk.task_id == task_id,
+                TaskLogChunk.compressed.is_(False),
+                TaskLogChunk.created_at < cold_before
+            )
+            .order_by(TaskLogChunk.seq)
+        )).scalars().all()
+
+        segments: List[List[TaskLogChunk]] = []
+        for chunk in chunks:
+            current = segments[-1] if segments else None
+            if (
+                current
+                and current[-1].seq + 1 == chunk.seq
+                and sum(c.size for c in current) + chunk.size <= settings.task_log_segment_size
+            ):
+                current.append(chunk)
+            else:
+                segments.append([chunk])
+
+        for segment in segments:
+            data = b"".join(c.data for c in segment)
+            await self.db.execute(
+                delete(TaskLogChunk)
+                .where(TaskLogChunk.task_id == task_id, TaskLogChunk.seq.in_([c.seq for c in segment]))
+                .execution_options(synchronize_session=False)
+            )
+            await self.db.execute(insert(TaskLogChunk).values(
+                task_id=task_id,
+                seq=segment[0].seq,
+                start_offset=segment[0].start_offset,
+                size=len(data),
+                data=zlib.compress(data, 6),
+                compressed=True,
+                created_at=segment[0].created_at
+            ))
+        await self.db.commit()
+        LOG_CHUNKS_COMPACTED.inc(len(chunks))
+        return len(chunks)
+
+class TaskLogCompactor:
+    """Фоновое сжатие холодных кусков логов (старше settings.task_log_cold_after)."""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.compact()
+            except Exception:
+                logger.exception("Task log compaction failed")
+            await asyncio.sleep(self.interval)
+
+    async def compact(self) -> int:
+        cold_before = datetime.now(timezone.utc) - timedelta(seconds=settings.task_log_cold_after)
+        async with SessionLocal() as db:
+            task_ids = (await db.execute(
+                select(TaskLogChunk.task_id)
+                .where(TaskLogChunk.compressed.is_(False), TaskLogChunk.created_at < cold_before)
+                .group_by(TaskLogChunk.task_id)
+                .limit(self.batch_size)
+            )).scalars().all()
+            await db.rollback()
+
+            compacted = 0
+            service = TaskLogService(db)
+            for task_id in task_ids:
+                compacted += await service.compact_task(task_id, cold_before)
+        return compacted
+
+task_log_compactor = TaskLogCompactor(
+    interval=settings.task_log_compact_interval,
+    batch_size=settings.task_log_compact_batch_size
+)
@@ -0,0 +1,241 @@
+import uuid
+from fastapi import HTTPException
+from sqlalchemy import cast, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.pagination import keyset_paginate, page_cursor
+from ..models import Task, Node, Inbound
+from ..models.task import TaskStatus, TaskAction, TargetType
+from ..schemas.task import TaskBatchCreated, TaskBatchStatus, TaskBulkCreate, TaskCreate, TaskResult
+from .dispatch import task_dispatcher
+from .events import event_bus, task_event
+from .node_registry import parse_label_selector, select_nodes
+from .task_logs import TaskLogService
+
+class TaskService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _resolve_node(self, task_data: TaskCreate) -> Node:
+        """Находит узел, на котором должна выполниться задача."""
+        node_id = task_data.node_id
+        if node_id is None:
+            if task_data.target_type == TargetType.NODE:
+                node_id = task_data.target_id
+            else:
+                inbound = await self.db.get(Inbound, task_data.target_id)
+                if not inbound:
+                    raise HTTPException(status_code=404, detail="Inbound not found")
+                node_id = inbound.node_id
+
+        node = await self.db.get(Node, node_id)
+        if not node:
+            raise HTTPException(status_code=404, detail="Node not found")
+        return node
+
+    async def _build_task(self, task_data: TaskCreate) -> Task:
+        node = await self._resolve_node(task_data)
+        return Task(
+            action=task_data.action,
+            target_type=task_data.target_type,
+            target_id=task_data.target_id,
+            org_id=node.org_id,
+            node_id=node.id,
+            status=TaskStatus.QUEUED,
+            payload=task_data.payload,
+            retry_count=0,
+            max_retries=task_data.max_retries if task_data.max_retries is not None else settings.task_retry_attempts
+        )
+
+    async def create_task(self, task_data: TaskCreate) -> Task:
+        """Создает задачу в статусе QUEUED."""
+        task = await self._build_task(task_data)
+        self.db.add(task)
+        await self.db.commit()
+        await self.db.refresh(task)
+        task_event(task)
+        await task_dispatcher.publish([(task.id, task.node_id, task.retry_count)])
+        return task
+
+    async def create_bulk_tasks(self, tasks_data: List[TaskCreate]) -> TaskBatchCreated:
+        """
+        Создает задачи из явного списка одним INSERT ... RETURNING.
+
+        Узлы и inbound'ы целей разрешаются двумя запросами на весь список,
+        а не по запросу на задачу.
+        """
+        inbound_ids = {
+            t.target_id for t in tasks_data
+            if t.node_id is None and t.target_type == TargetType.INBOUND
+        }
+        inbound_nodes = {}
+        if inbound_ids:
+            result = await self.db.execute(
+                select(Inbound.id, Inbound.node_id).where(Inbound.id.in_(inbound_ids))
+            )
+            inbound_nodes = dict(result.all())
+
+        node_ids = []
+        for t in tasks_data:
+            if t.node_id is not None:
+                node_ids.append(t.node_id)
+            elif t.target_type == TargetType.NODE:
+                node_ids.append(t.target_id)
+            elif t.target_id in inbound_nodes:
+                node_ids.append(inbound_nodes[t.target_id])
+            else:
+                raise HTTPException(status_code=404, detail=f"Inbound {t.target_id} not found")
+
+        result = await self.db.execute(select(Node.id, Node.org_id).where(Node.id.in_(set(node_ids))))
+        node_orgs = dict(result.all())
+        missing = sorted(set(node_ids) - node_orgs.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Nodes not found: {missing}")
+
+        batch_id = uuid.uuid4()
+        rows = [
+            {
+                "action": t.action,
+                "target_type": t.target_type,
+                "target_id": t.target_id,
+                "org_id": node_orgs[node_id],
+                "node_id": node_id,
+                "status": TaskStatus.QUEUED,
+                "payload": t.payload,
+                "retry_count": 0,
+                "max_retries": t.max_retries if t.max_retries is not None else settings.task_retry_attempts,
+                "batch_id": batch_id,
+            }
+            for t, node_id in zip(tasks_data, node_ids)
+        ]
+        created = []
+        if rows:
+            # insertmanyvalues: многострочный VALUES пачками, порядок id совпадает с порядком входа
+            result = await self.db.execute(
+                insert(Task).returning(Task.id, Task.node_id, sort_by_parameter_order=True), rows
+            )
+            created = result.all()
+        await self.db.commit()
+        await task_dispatcher.publish((task_id, node_id, 0) for task_id, node_id in created)
+        task_ids = [task_id for task_id, _ in created]
+        event_bus.emit("task.batch", batch_id=str(batch_id), created=len(task_ids))
+        return TaskBatchCreated(batch_id=batch_id, created=len(task_ids), task_ids=task_ids)
+
+    async def create_batch(self, batch: TaskBulkCreate) -> TaskBatchCreated:
+        """
+        Размножает одно действие на все подходящие узлы.
+
+        Выполняется одним INSERT ... SELECT FROM nodes WHERE <selector> RETURNING id:
+        строки задач не проходят через Python, сколько бы узлов ни попало под селектор.
+        """
+        nodes = select_nodes(parse_label_selector(batch.selector))
+        if batch.node_ids:
+            nodes = nodes.where(Node.id.in_(batch.node_ids))
+        if not batch.include_draining:
+            nodes = nodes.where(Node.draining.is_(False))
+
+        batch_id = uuid.uuid4()
+        max_retries = batch.max_retries if batch.max_retries is not None else settings.task_retry_attempts
+        rows = nodes.with_only_columns(
+            literal(batch.action, Task.action.type),
+            literal(TargetType.NODE, Task.target_type.type),
+            Node.id,
+            Node.org_id,
+            Node.id,
+            literal(TaskStatus.QUEUED, Task.status.type),
+            cast(literal(batch.payload, JSONB), JSONB),
+            literal(0),
+            literal(max_retries),
+            cast(literal(batch_id, UUID(as_uuid=True)), UUID(as_uuid=True)),
+        ).order_by(Node.id)
+
+        result = await self.db.execute(
+            insert(Task)
+            .from_select(
+                ["action", "target_type", "target_id", "org_id", "node_id", "status",
+                 "payload", "retry_count", "max_retries", "batch_id"],
+                rows
+            )
+            .returning(Task.id, Task.node_id)
+        )
+        created = sorted(result.all())
+        await self.db.commit()
+        await task_dispatcher.publish((task_id, node_id, 0) for task_id, node_id in created)
+        task_ids = [task_id for task_id, _ in created]
+        event_bus.emit("task.batch", batch_id=str(batch_id), created=len(task_ids))
+        return TaskBatchCreated(batch_id=batch_id, created=len(task_ids), task_ids=task_ids)
+
+    async def get_batch_status(self, batch_id: uuid.UUID) -> TaskBatchStatus:
+        """Сводка по батчу: количество задач в каждом статусе."""
+        result = await self.db.execute(
+            select(Task.status, func.count())
+            .where(Task.batch_id == batch_id)
+            .group_by(Task.status)
+        )
+        counts = {status: 0 for status in TaskStatus}
+        counts.update(dict(result.all()))
+        total = sum(counts.values())
+        if not total:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return TaskBatchStatus(
+            batch_id=batch_id,
+            total=total,
+            counts=counts,
+            finished=counts[TaskStatus.QUEUED] + counts[TaskStatus.RUNNING] == 0
+        )
+
+    async def complete_task(self, node_id: int, task_id: int, result: TaskResult) -> Task:
+        """Принимает результат выполнения от агента узла, на котором задача в RUNNING."""
+        updated = await self.db.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.node_id == node_id, Task.status == TaskStatus.RUNNING)
+            .values(status=result.status, completed_at=func.now())
+            .returning(Task.id)
+        )
+        if updated.scalar_one_or_none() is None:
+            await self.db.rollback()
+            raise HTTPException(status_code=409, detail="Task is not running on this node")
+        if result.logs:
+            await TaskLogService(self.db).append(task_id, result.logs.encode("utf-8"))
+        await self.db.commit()
+        task = await self.db.get(Task, task_id, populate_existing=True)
+        task_event(task)
+        if result.delivery_id:
+            await task_dispatcher.ack(node_id, result.delivery_id)
+        return task
+
+    async def get_task(self, task_id: int) -> Optional[Task]:
+        return await self.db.get(Task, task_id)
+
+    def list_query(
+        self,
+        status: Optional[TaskStatus] = None,
+        action: Optional[TaskAction] = None,
+        node_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ):
+        """Строит запрос списка задач с фильтрами и keyset-пагинацией."""
+        query = select(Task)
+        if status:
+            query = query.where(Task.status == status)
+        if action:
+            query = query.where(Task.action == action)
+        if node_id:
+            query = query.where(Task.node_id == node_id)
+        return keyset_paginate(query, Task, cursor, limit)
+
+    async def list_tasks(
+        self,
+        status: Optional[TaskStatus],
+        action: Optional[TaskAction],
+        node_id: Optional[int],
+        limit: int,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Task], Optional[str]]:
+        """Возвращает страницу задач и курсор следующей страницы."""
+        result = await self.db.execute(self.list_query(status, action, node_id, cursor, limit))
+        return page_cursor(result.scalars().all(), limit)
@@ -0,0 +1,619 @@
+import asyncio
+import json
+import logging
+import struct
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import BigInteger, Date, DateTime, case, cast, func, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..deps import SessionLocal
+from ..models import TrafficRollupState, TrafficSample, TrafficSample1h, TrafficSample1m
+from ..schemas.traffic import TrafficBulkIngestResult, TrafficPoint, TrafficSampleIn, TrafficSeries
+
+logger = logging.getLogger(__name__)
+
+TRAFFIC_SAMPLES_INGESTED = Counter(
+    'mindvpn_traffic_samples_ingested_total',
+    'Per-minute traffic samples accepted or rejected',
+    ['result']
+)
+TRAFFIC_INGEST_RATE = Gauge(
+    'mindvpn_traffic_ingest_rows_per_second',
+    'Rows per second of the last bulk traffic ingest batch'
+)
+TRAFFIC_ROLLUP_DURATION = Histogram(
+    'mindvpn_traffic_rollup_duration_seconds',
+    'Time spent in one traffic rollup pass',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+TRAFFIC_ROLLUP_LAG = Gauge(
+    'mindvpn_traffic_rollup_watermark_lag_seconds',
+    'Age of the rollup watermark',
+    ['rollup']
+)
+
+EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# Бинарный формат пакетной загрузки: кадры [uint32 длина][записи], запись —
+# node_id uint32, bucket int64 (unix-секунды), bytes_in uint64, bytes_out uint64,
+# users_online uint32; все поля big-endian
+FRAME_HEADER = struct.Struct("!I")
+FRAME_RECORD = struct.Struct("!IqQQI")
+FRAME_MEDIA_TYPE = "application/vnd.mindvpn.traffic-frames"
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+INGEST_STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS traffic_ingest (
+    node_id integer NOT NULL,
+    ts bigint NOT NULL,
+    bytes_in bigint NOT NULL,
+    bytes_out bigint NOT NULL,
+    users_online integer NOT NULL,
+    seq bigint NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+INGEST_COLUMNS = ["node_id", "ts", "bytes_in", "bytes_out", "users_online", "seq"]
+
+# Допустимые значения полей записи — типы колонок staging-таблицы (integer и
+# bigint). Кадр допускает uint32/uint64, и без проверки такие значения падали бы
+# внутри COPY с ошибкой сервера вместо 400
+INT32_MAX = 2 ** 31 - 1
+INT64_MAX = 2 ** 63 - 1
+RECORD_RANGES = (
+    ("node_id", 0, INT32_MAX),
+    ("bucket", -INT64_MAX - 1, INT64_MAX),
+    ("bytes_in", 0, INT64_MAX),
+    ("bytes_out", 0, INT64_MAX),
+    ("users_online", 0, INT32_MAX),
+)
+
+# Время в staging хранится unix-секундами, округление до минуты делает сервер.
+# Последняя запись минуты в пачке (по порядковому номеру seq) побеждает, минуты
+# вне окна секций отбрасываются; повтор уже записанных значений не порождает
+# новых версий строк. earliest — самая ранняя реально измененная минута
+INGEST_UPSERT = """
+WITH staged AS (
+    SELECT DISTINCT ON (node_id, minute) node_id, minute, bytes_in, bytes_out, users_online
+    FROM (SELECT s.*, s.ts / 60 AS minute FROM traffic_ingest s) raw
+    WHERE minute >= $1 AND minute < $2
+    ORDER BY node_id, minute, seq DESC
+), written AS (
+    INSERT INTO traffic_samples_1m (node_id, bucket, bytes_in, bytes_out, users_online)
+    SELECT node_id, to_timestamp(minute * 60), bytes_in, bytes_out, users_online FROM staged
+    ON CONFLICT (node_id, bucket) DO UPDATE SET
+        bytes_in = EXCLUDED.bytes_in,
+        bytes_out = EXCLUDED.bytes_out,
+        users_online = EXCLUDED.users_online
+    WHERE (traffic_samples_1m.bytes_in, traffic_samples_1m.bytes_out, traffic_samples_1m.users_online)
+        IS DISTINCT FROM (EXCLUDED.bytes_in, EXCLUDED.bytes_out, EXCLUDED.users_online)
+    RETURNING bucket
+)
+SELECT (SELECT count(*) FROM staged) AS accepted, (SELECT count(*) FROM written) AS written,
+    (SELECT min(bucket) FROM written) AS earliest
+"""
+
+class IngestFormatError(ValueError):
+    """Ошибка формата пакета трафика."""
+
+# Порядок блокировки строк traffic_rollup_state (по имени) общий для ingest и rollup
+ROLLUP_NAMES = ("1d", "1h")
+
+def ingest_window(now: datetime) -> Tuple[datetime, datetime]:
+    """Диапазон минут [oldest, newest), для которого существуют секции traffic_samples_1m."""
+    today = floor_time(now, 86400)
+    return (
+        today - timedelta(days=settings.traffic_1m_retention_days - 1),
+        today + timedelta(days=settings.traffic_partitions_ahead + 1),
+    )
+
+def _ts_from_json(value) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+    bucket = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return int((bucket if bucket.tzinfo else bucket.replace(tzinfo=timezone.utc)).timestamp())
+
+async def iter_ndjson_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple]:
+    """
+    Разбирает NDJSON по мере чтения тела запроса.
+
+    Строка — массив [node_id, bucket, bytes_in, bytes_out, users_online]
+    или объект с этими ключами; bucket — unix-секунды или ISO 8601.
+    """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield _ndjson_record(line, line_no)
+    if buffer.strip():
+        yield _ndjson_record(buffer, line_no + 1)
+
+def _check_ranges(record: tuple) -> tuple:
+    for (field, low, high), value in zip(RECORD_RANGES, record):
+        if not low <= value <= high:
+            raise ValueError(f"{field} {value} is out of range [{low}, {high}]")
+    return record
+
+def _ndjson_record(line: bytes, line_no: int) -> tuple:
+    try:
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item = [item["node_id"], item["bucket"], item.get("bytes_in", 0),
+                    item.get("bytes_out", 0), item.get("users_online", 0)]
+        node_id, bucket, *counters = item
+        counters = [int(v) for v in counters]
+        if len(counters) != 3:
+            raise ValueError("expected three counters")
+        return _check_ranges((int(node_id), _ts_from_json(bucket), *counters))
+    except (ValueError, KeyError, TypeError) as e:
+        raise IngestFormatError(f"Invalid NDJSON record on line {line_no}: {e}")
+
+async def iter_frame_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple]:
+    """Разбирает поток бинарных кадров по мере чтения тела запроса."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(buffer)
+            if length % FRAME_RECORD.size or length > MAX_FRAME_SIZE:
+                raise IngestFormatError(f"Invalid frame length {length}")
+            end = FRAME_HEADER.size + length
+            if len(buffer) < end:
+                break
+            for record in FRAME_RECORD.iter_unpack(bytes(buffer[FRAME_HEADER.size:end])):
+                try:
+                    _check_ranges(record)
+                except ValueError as e:
+                    raise IngestFormatError(f"Invalid frame record: {e}")
+                yield record
+            del buffer[:end]
+    if buffer:
+        raise IngestFormatError("Truncated frame at end of body")
+
+async def _numbered(records: AsyncIterable[tuple]) -> AsyncIterator[tuple]:
+    """Добавляет к записям порядковый номер в пачке (колонка seq staging-таблицы)."""
+    seq = 0
+    async for record in records:
+        yield (*record, seq)
+        seq += 1
+
+def encode_frame(records: List[tuple]) -> bytes:
+    """Кодирует записи (node_id, unix_ts, bytes_in, bytes_out, users_online) в один кадр."""
+    payload = b"".join(FRAME_RECORD.pack(*r) for r in records)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+@dataclass(frozen=True)
+class Resolution:
+    name: str
+    seconds: int
+    retention_days: Optional[int]
+
+    def covers(self, start: datetime, now: datetime) -> bool:
+        return self.retention_days is None or start >= now - timedelta(days=self.retention_days)
+
+# От мелкого к крупному
+RESOLUTIONS = [
+    Resolution("1m", 60, settings.traffic_1m_retention_days),
+    Resolution("1h", 3600, settings.traffic_1h_retention_days),
+    Resolution("1d", 86400, None),
+]
+
+def floor_time(ts: datetime, seconds: int) -> datetime:
+    ts = ts.astimezone(timezone.utc)
+    return EPOCH + timedelta(seconds=(ts - EPOCH).total_seconds() // seconds * seconds)
+
+def pick_resolution(start: datetime, step: int, now: datetime) -> Resolution:
+    """
+    Выбирает самое крупное разрешение, которое не грубее step и еще хранит
+    данные на начало диапазона. Если step мельче всего доступного на start,
+    берется самое мелкое разрешение, которое этот диапазон покрывает.
+    """
+    available = [r for r in RESOLUTIONS if r.covers(start, now)]
+    fitting = [r for r in available if r.seconds <= step]
+    if fitting:
+        return fitting[-1]
+    return available[0]
+
+def _series_source(resolution: Resolution):
+    """(node_id, bucket, bytes_in, bytes_out, users_online) для таблицы разрешения."""
+    if resolution.name == "1m":
+        t = TrafficSample1m
+        return t.node_id, t.bucket, t.bytes_in, t.bytes_out, t.users_online
+    if resolution.name == "1h":
+        t = TrafficSample1h
+        return t.node_id, t.bucket, t.bytes_in, t.bytes_out, t.users_online
+    t = TrafficSample
+    # Дневная таблица хранит гигабайты и дату (UTC)
+    return (
+        t.node_id,
+        func.timezone("UTC", cast(t.day, DateTime())),
+        cast(t.gb_in * 1e9, BigInteger),
+        cast(t.gb_out * 1e9, BigInteger),
+        t.users_online,
+    )
+
+class TrafficService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def ingest(self, node_id: int, samples: List[TrafficSampleIn]) -> Tuple[int, int]:
+        """
+        Записывает поминутные счетчики узла; повторная отправка той же минуты
+        заменяет значения (INSERT ... ON CONFLICT DO UPDATE).
+
+        Минуты вне хранимого окна (старше retention или дальше созданных
+        секций) отбрасываются.
+
+        Returns:
+            (принято, отброшено)
+        """
+        oldest, newest = ingest_window(datetime.now(timezone.utc))
+
+        rows: Dict[datetime, dict] = {}
+        for sample in samples:
+            bucket = floor_time(sample.bucket if sample.bucket.tzinfo else sample.bucket.replace(tzinfo=timezone.utc), 60)
+            if oldest <= bucket < newest:
+                rows[bucket] = {
+                    "node_id": node_id,
+                    "bucket": bucket,
+                    "bytes_in": sample.bytes_in,
+                    "bytes_out": sample.bytes_out,
+                    "users_online": sample.users_online,
+                }
+        rejected = len(samples) - len(rows)
+
+        if rows:
+            stmt = insert(TrafficSample1m).values(list(rows.values()))
+            await self.db.execute(stmt.on_conflict_do_update(
+                index_elements=[TrafficSample1m.node_id, TrafficSample1m.bucket],
+                set_={
+                    "bytes_in": stmt.excluded.bytes_in,
+                    "bytes_out": stmt.excluded.bytes_out,
+                    "users_online": stmt.excluded.users_online,
+                }
+            ))
+            await self.rewind_rollups(min(rows))
+            await self.db.commit()
+
+        TRAFFIC_SAMPLES_INGESTED.labels(result="accepted").inc(len(rows))
+        if rejected:
+            TRAFFIC_SAMPLES_INGESTED.labels(result="rejected").inc(rejected)
+        return len(rows), rejected
+
+    async def ingest_stream(self, records: AsyncIterable[tuple]) -> TrafficBulkIngestResult:
+        """
+        Пакетная загрузка поминутных счетчиков любых узлов.
+
+        Записи потоком идут через COPY во временную staging-таблицу
+        соединения, затем одним INSERT ... SELECT ... ON CONFLICT (node_id, bucket)
+        переносятся в traffic_samples_1m, так что повторная загрузка
+        идемпотентна.
+
+        Args:
+            records: Кортежи (node_id, unix_ts, bytes_in, bytes_out, users_online)
+
+        Returns:
+            Сколько записей получено и принято, время и скорость загрузки
+        """
+        started = time.perf_counter()
+        oldest, newest = ingest_window(datetime.now(timezone.utc))
+
+        # Запрос через сессию открывает транзакцию, в которой идут COPY и upsert.
+        # Семплы агенты переотправляют, поэтому синхронный коммит не нужен
+        await self.db.execute(text("SET LOCAL synchronous_commit = off"))
+        await self.db.execute(text(f"SET LOCAL work_mem = '{settings.traffic_ingest_work_mem}'"))
+        await self.db.execute(text(INGEST_STAGING_DDL))
+        connection = await self.db.connection()
+        raw = (await connection.get_raw_connection()).driver_connection
+        try:
+            copied = await raw.copy_records_to_table(
+                "traffic_ingest",
+                records=_numbered(records),
+                columns=INGEST_COLUMNS
+            )
+        except IngestFormatError as e:
+            await self.db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        received = int(copied.split()[-1])
+        accepted, written, earliest = await raw.fetchrow(
+            INGEST_UPSERT, int(oldest.timestamp()) // 60, int(newest.timestamp()) // 60
+        )
+        if earliest is not None:
+            await self.rewind_rollups(earliest)
+        await self.db.commit()
+
+        seconds = time.perf_counter() - started
+        rate = received / seconds if seconds > 0 else 0.0
+        TRAFFIC_INGEST_RATE.set(rate)
+        TRAFFIC_SAMPLES_INGESTED.labels(result="accepted").inc(accepted)
+        if received - accepted:
+            # Отброшенные вне окна и дубли одной минуты в пачке
+            TRAFFIC_SAMPLES_INGESTED.labels(result="rejected").inc(received - accepted)
+        return TrafficBulkIngestResult(
+            received=received,
+            accepted=accepted,
+            written=written,
+            rejected=received - accepted,
+            seconds=round(seconds, 4),
+            rows_per_sec=round(rate, 1)
+        )
+
+    async def rewind_rollups(self, earliest: datetime) -> None:
+        """
+        Откатывает watermark rollup'ов, если записанные минуты старше окна,
+        которое пересчитывает следующий проход (traffic_rollup_lateness).
+
+        Иначе опоздавшие больше чем на lateness данные остались бы только в 1m,
+        а 1h и 1d с ними разошлись бы. Обычная запись свежих минут под условие
+        не попадает и строки состояния не блокирует. Строки обновляются в том
+        же порядке, в каком их блокирует TrafficRollup.run_once.
+        """
+        lateness = timedelta(seconds=settings.traffic_rollup_lateness)
+        state = TrafficRollupState
+        for name in ROLLUP_NAMES:
+            seconds = 3600 if name == "1h" else 86400
+            await self.db.execute(
+                update(state)
+                .where(state.name == name, state.watermark - lateness > earliest)
+                .values(watermark=func.least(state.watermark, floor_time(earliest, seconds)))
+            )
+
+    async def query(
+        self,
+        start: datetime,
+        end: datetime,
+        step: Optional[int] = None,
+        node_id: Optional[int] = None
+    ) -> TrafficSeries:
+        """
+        Временной ряд трафика по узлу или по всем узлам.
+
+        Args:
+            start, end: Диапазон [start, end)
+            step: Шаг точек в секундах; по умолчанию диапазон делится на traffic_max_points
+            node_id: Узел; None — сумма по всем узлам
+
+        Returns:
+            Ряд с разрешением, выбранным pick_resolution
+        """
+        start, end = start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+        if end <= start:
+            raise HTTPException(status_code=400, detail="end must be after start")
+        span = (end - start).total_seconds()
+        if step is None:
+            step = max(int(span // settings.traffic_max_points), 60)
+        if span / step > settings.traffic_max_points:
+            raise HTTPException(status_code=400, detail=f"Too many points, max {settings.traffic_max_points}")
+
+        resolution = pick_resolution(start, step, datetime.now(timezone.utc))
+        # Шаг кратен разрешению источника
+        step = max(step // resolution.seconds, 1) * resolution.seconds
+
+        node_col, bucket_col, in_col, out_col, users_col = _series_source(resolution)
+        ts = func.date_bin(literal(timedelta(seconds=step)), bucket_col, literal(EPOCH)).label("ts")
+        per_node = (
+            select(
+                ts,
+                func.sum(in_col).label("bytes_in"),
+                func.sum(out_col).label("bytes_out"),
+                func.max(users_col).label("users_online"),
+            )
+            .where(bucket_col >= start, bucket_col < end)
+            .group_by(ts, node_col)
+        )
+        if node_id is not None:
+            per_node = per_node.where(node_col == node_id)
+        per_node = per_node.subquery()
+
+        # Пользователи онлайн: максимум по узлу внутри точки, затем сумма по узлам
+        result = await self.db.execute(
+            select(
+                per_node.c.ts,
+                func.sum(per_node.c.bytes_in),
+                func.sum(per_node.c.bytes_out),
+                func.sum(per_node.c.users_online),
+            )
+            .group_by(per_node.c.ts)
+            .order_by(per_node.c.ts)
+        )
+        points = [
+            TrafficPoint(ts=row[0], bytes_in=int(row[1]), bytes_out=int(row[2]), users_online=int(row[3]))
+            for row in result.all()
+        ]
+        return TrafficSeries(
+            node_id=node_id,
+            resolution=resolution.name,
+            step_seconds=step,
+            start=start,
+            end=end,
+            points=points
+        )
+
+class TrafficRollup:
+    """
+    Фоновое обслуживание временных рядов трафика.
+
+    За проход: создает секции наперед, инкрементально сворачивает 1m → 1h → 1d
+    от watermark (с запасом traffic_rollup_lateness на опоздавшие данные,
+    свертка идемпотентна) и удаляет секции старше retention. Проход
+    выполняется под advisory lock, поэтому при нескольких репликах его
+    делает одна.
+
+    Данные старше этого запаса ingest отмечает откатом watermark
+    (TrafficService.rewind_rollups). Строки состояния проход держит под
+    FOR UPDATE до коммита: откат, записанный во время прохода, не затирается
+    новым watermark, а дожидается его и попадает в следующий проход.
+    """
+
+    LOCK_KEY = 0x6d76706e  # "mvpn"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            # Секции нужны до первой записи от агентов
+            await self.ensure_partitions()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Traffic rollup failed")
+            finally:
+                TRAFFIC_ROLLUP_DURATION.observe(time.perf_counter() - started)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        async with SessionLocal() as db:
+            locked = (await db.execute(select(func.pg_try_advisory_xact_lock(self.LOCK_KEY)))).scalar()
+            if not locked:
+                return False
+            await self._ensure_partitions(db, now)
+            await db.execute(
+                select(TrafficRollupState.name).order_by(TrafficRollupState.name).with_for_update()
+            )
+            await self._rollup(db, "1h", now, self._rollup_hourly)
+            await self._rollup(db, "1d", now, self._rollup_daily)
+            await self._apply_retention(db, now)
+            await db.commit()
+        return True
+
+    async def ensure_partitions(self) -> None:
+        async with SessionLocal() as db:
+            await self._ensure_partitions(db, datetime.now(timezone.utc))
+            await db.commit()
+
+    async def _ensure_partitions(self, db: AsyncSession, now: datetime) -> None:
+        # Секции на все окно, которое принимает ingest(), плюс traffic_partitions_ahead суток вперед
+        today = floor_time(now, 86400)
+        first_day = today - timedelta(days=settings.traffic_1m_retention_days - 1)
+        last_day = today + timedelta(days=settings.traffic_partitions_ahead)
+        day = first_day
+        while day <= last_day:
+            await self._create_partition(db, "traffic_samples_1m", day.strftime("%Y%m%d"), day, day + timedelta(days=1))
+            day += timedelta(days=1)
+
+        # Почасовые секции — на все месяцы, куда может попасть rollup поминутных данных
+        month = first_day.replace(day=1)
+        while month <= last_day:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            await self._create_partition(db, "traffic_samples_1h", month.strftime("%Y%m"), month, next_month)
+            month = next_month
+
+    async def _create_partition(self, db: AsyncSession, parent: str, suffix: str, start: datetime, end: datetime) -> None:
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {parent}_p{suffix} PARTITION OF {parent} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+
+    async def _rollup(self, db: AsyncSession, name: str, now: datetime, rollup) -> None:
+        seconds = 3600 if name == "1h" else 86400
+        state = await db.get(TrafficRollupState, name)
+        if state is None:
+            source = TrafficSample1m if name == "1h" else TrafficSample1h
+            oldest = (await db.execute(select(func.min(source.bucket)))).scalar()
+            if oldest is None:
+                return
+            start = floor_time(oldest, seconds)
+            state = TrafficRollupState(name=name, watermark=start)
+            db.add(state)
+        else:
+            start = state.watermark - timedelta(seconds=settings.traffic_rollup_lateness)
+
+        # Текущий неполный интервал тоже сворачивается, но watermark встает на его начало,
+        # так что следующий проход пересчитает его целиком
+        current = floor_time(now, seconds)
+        await rollup(db, floor_time(start, seconds), current + timedelta(seconds=seconds))
+        state.watermark = current
+        TRAFFIC_ROLLUP_LAG.labels(rollup=name).set((now - current).total_seconds())
+
+    async def _rollup_hourly(self, db: AsyncSession, start: datetime, end: datetime) -> None:
+        src = TrafficSample1m
+        hour = func.date_bin(literal(timedelta(hours=1)), src.bucket, literal(EPOCH))
+        rows = (
+            select(src.node_id, hour, func.sum(src.bytes_in), func.sum(src.bytes_out), func.max(src.users_online))
+            .where(src.bucket >= start, src.bucket < end)
+            .group_by(src.node_id, hour)
+        )
+        stmt = insert(TrafficSample1h).from_select(["node_id", "bucket", "bytes_in", "bytes_out", "users_online"], rows)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TrafficSample1h.node_id, TrafficSample1h.bucket],
+            set_={
+                "bytes_in": stmt.excluded.bytes_in,
+                "bytes_out": stmt.excluded.bytes_out,
+                "users_online": stmt.excluded.users_online,
+            }
+        ))
+
+    async def _rollup_daily(self, db: AsyncSession, start: datetime, end: datetime) -> None:
+        src = TrafficSample1h
+        day = cast(func.timezone("UTC", src.bucket), Date)
+        rows = (
+            select(
+                src.node_id,
+                day,
+                func.max(src.users_online),
+                func.sum(src.bytes_in) / 1e9,
+                func.sum(src.bytes_out) / 1e9,
+            )
+            .where(src.bucket >= start, src.bucket < end)
+            .group_by(src.node_id, day)
+        )
+        stmt = insert(TrafficSample).from_select(["node_id", "day", "users_online", "gb_in", "gb_out"], rows)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[TrafficSample.node_id, TrafficSample.day],
+            set_={
+                "users_online": stmt.excluded.users_online,
+                "gb_in": stmt.excluded.gb_in,
+                "gb_out": stmt.excluded.gb_out,
+            }
+        ))
+
+    async def _apply_retention(self, db: AsyncSession, now: datetime) -> None:
+        """Удаляет секции, целиком вышедшие за retention: DROP TABLE вместо DELETE по строкам."""
+        policies = [
+            ("traffic_samples_1m", "%Y%m%d", settings.traffic_1m_retention_days),
+            ("traffic_samples_1h", "%Y%m", settings.traffic_1h_retention_days),
+        ]
+        for parent, fmt, days in policies:
+            cutoff = now - timedelta(days=days)
+            partitions = (await db.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = :parent"
+            ), {"parent": parent})).scalars().all()
+            for name in partitions:
+                start = datetime.strptime(name.rsplit("_p", 1)[1], fmt).replace(tzinfo=timezone.utc)
+                end = start + timedelta(days=1) if fmt == "%Y%m%d" else (start + timedelta(days=32)).replace(day=1)
+                if end <= cutoff:
+                    await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    logger.info("Dropped traffic partition %s", name)
+
+traffic_rollup = TrafficRollup(interval=settings.traffic_rollup_interval)
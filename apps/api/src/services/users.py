@@ -0,0 +1,57 @@
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+
+from ..core.pagination import keyset_paginate, page_cursor
+from ..models import User
+from ..schemas.user import UserCreate
+from .orgs import resolve_org_id
+
+class UserService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_user(self, user_data: UserCreate) -> User:
+        existing = (await self.db.execute(select(User.id).where(User.email == user_data.email))).scalar_one_or_none()
+        if existing is not None:
+            raise HTTPException(status_code=400, detail="User with this email already exists")
+
+        user = User(
+            org_id=await resolve_org_id(self.db, user_data.org_id),
+            email=user_data.email,
+            role=user_data.role
+        )
+        self.db.add(user)
+        await self.db.commit()
+        await self.db.refresh(user)
+        return user
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        return await self.db.get(User, user_id)
+
+    def list_query(
+        self,
+        role: Optional[str] = None,
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ):
+        """Строит запрос списка пользователей с фильтрами и keyset-пагинацией."""
+        query = select(User)
+        if role:
+            query = query.where(User.role == role)
+        if status:
+            query = query.where(User.status == status)
+        return keyset_paginate(query, User, cursor, limit)
+
+    async def list_users(
+        self,
+        role: Optional[str],
+        status: Optional[str],
+        limit: int,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[User], Optional[str]]:
+        """Возвращает страницу пользователей и курсор следующей страницы."""
+        result = await self.db.execute(self.list_query(role, status, cursor, limit))
+        return page_cursor(result.scalars().all(), limit)
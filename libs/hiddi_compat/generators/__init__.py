@@ -1,6 +1,66 @@
-from typing import Dict, Any, Optional
-from .xray import XrayGenerator
-from .singbox import SingboxGenerator
+import importlib
+import os
+import threading
+from contextlib import nullcontext
+from typing import Dict, Any, Iterable, List, Optional, TextIO
+from .cache import RenderCache, render_key
+from .validation import ConfigError, ValidationResult
+
+# Модули генераторов импортируются при первом обращении: xray работает и без
+# зависимостей sing-box
+_GENERATOR_CLASSES = {
+    "xray": ("xray", "XrayGenerator"),
+    "singbox": ("singbox", "SingboxGenerator"),
+}
+
+# Генераторы создаются один раз на процесс: каждый держит Jinja Environment
+# со скомпилированными шаблонами
+_generators: Dict[str, Any] = {}
+_generators_lock = threading.Lock()
+
+render_cache = RenderCache(maxsize=int(os.environ.get("HIDDI_COMPAT_RENDER_CACHE_SIZE", "1024")))
+
+# Хук трассировки: фабрика контекст-менеджеров span(name, **attributes).
+# По умолчанию ничего не делает; приложение подставляет свою через set_tracer
+_NOOP_SPAN = nullcontext()
+_span = lambda name, **attributes: _NOOP_SPAN
+
+def set_tracer(span) -> None:
+    """
+    Подключает трассировку рендера.
+
+    Args:
+        span: Функция span(name, **attributes), возвращающая контекст-менеджер
+    """
+    global _span
+    _span = span
+
+def get_generator(protocol: str):
+    """
+    Возвращает общий экземпляр генератора для протокола.
+
+    Args:
+        protocol: Протокол (xray, singbox)
+
+    Returns:
+        Экземпляр XrayGenerator или SingboxGenerator
+    """
+    name = protocol.lower()
+    generator = _generators.get(name)
+    if generator is not None:
+        return generator
+
+    if name not in _GENERATOR_CLASSES:
+        raise ValueError(f"Unsupported protocol: {protocol}")
+
+    with _generators_lock:
+        generator = _generators.get(name)
+        if generator is None:
+            module, class_name = _GENERATOR_CLASSES[name]
+            generator_class = getattr(importlib.import_module(f".{module}", __name__), class_name)
+            generator = generator_class()
+            _generators[name] = generator
+    return generator
 
 def render_inbound(
     protocol: str,
@@ -11,49 +71,134 @@ def render_inbound(
 ) -> Dict[str, str]:
     """
     Генерирует конфигурационные файлы для inbound.
-    
+
+    Одинаковые наборы параметров рендерятся один раз: результат берется
+    из LRU-кэша по хэшу (protocol, preset, port, overrides, node_caps).
+
     Args:
         protocol: Протокол (xray, singbox)
         port: Порт для inbound
         preset: Пресет конфигурации (reality_tcp, hysteria2, etc.)
         overrides: Дополнительные параметры
         node_caps: Возможности узла
-        
+
     Returns:
         Словарь {filename: content} с конфигурационными файлами
     """
-    
-    if protocol.lower() == "xray":
-        generator = XrayGenerator()
-    elif protocol.lower() == "singbox":
-        generator = SingboxGenerator()
-    else:
-        raise ValueError(f"Unsupported protocol: {protocol}")
-    
-    return generator.render_inbound(port, preset, overrides, node_caps)
+
+    generator = get_generator(protocol)
+
+    key = render_key(protocol.lower(), preset, port, overrides, node_caps)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with _span("hiddi_compat.render", protocol=protocol.lower(), preset=preset, users=len(overrides.get("users", []))):
+        result = generator.render_inbound(port, preset, overrides, node_caps)
+    render_cache.put(key, result)
+    return result
+
+def stream_config(
+    protocol: str,
+    out: TextIO,
+    port: int,
+    preset: str,
+    overrides: Dict[str, Any],
+    node_caps: Dict[str, Any],
+    indent: Optional[int] = None
+) -> None:
+    """
+    Пишет полную конфигурацию ядра в файл или буфер по частям.
+
+    Для конфигураций на десятки тысяч пользователей: память не растет с
+    числом клиентов, кэш render_inbound не используется.
+
+    Args:
+        protocol: Протокол (xray)
+        out: Файл или буфер для записи
+        port: Порт для inbound
+        preset: Пресет конфигурации
+        overrides: Дополнительные параметры
+        node_caps: Возможности узла
+        indent: Отступ; по умолчанию компактный JSON
+    """
+
+    generator = get_generator(protocol)
+    with _span("hiddi_compat.stream", protocol=protocol.lower(), preset=preset):
+        generator.stream_config(out, port, preset, overrides, node_caps, indent=indent)
+
+def render_clients_diff(
+    protocol: str,
+    port: int,
+    preset: str,
+    overrides: Dict[str, Any],
+    node_caps: Dict[str, Any],
+    previous_users: Iterable[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Изменения массивов clients для горячего обновления пользователей.
+
+    Args:
+        protocol: Протокол (xray)
+        port: Порт для inbound
+        preset: Пресет конфигурации
+        overrides: Параметры с новым списком users
+        node_caps: Возможности узла
+        previous_users: Пользователи текущей конфигурации
+
+    Returns:
+        {"inbounds": [{"tag": ..., "add": [...], "remove": [...]}]}
+    """
+
+    return get_generator(protocol).render_clients_diff(port, preset, overrides, node_caps, previous_users)
 
 def validate_config(
     protocol: str,
-    config_content: str
+    config_content: str,
+    use_binary: bool = False
 ) -> bool:
     """
     Валидирует конфигурацию.
-    
+
     Args:
         protocol: Протокол (xray, singbox)
         config_content: Содержимое конфигурации
-        
+        use_binary: Дополнительно проверить конфигурацию бинарником ядра
+
     Returns:
         True если конфигурация валидна
     """
-    
-    if protocol.lower() == "xray":
-        generator = XrayGenerator()
-    elif protocol.lower() == "singbox":
-        generator = SingboxGenerator()
-    else:
-        raise ValueError(f"Unsupported protocol: {protocol}")
-    
-    return generator.validate_config(config_content)
 
-__all__ = ["render_inbound", "validate_config"]
+    return get_generator(protocol).validate_config(config_content, use_binary=use_binary)
+
+def validate_configs(
+    protocol: str,
+    contents: List[str],
+    use_binary: bool = False
+) -> List[ValidationResult]:
+    """
+    Валидирует пачку конфигураций и возвращает структурированные ошибки.
+
+    Args:
+        protocol: Протокол (xray, singbox)
+        contents: Содержимое конфигураций
+        use_binary: Дополнительно проверить структурно валидные конфигурации бинарником ядра
+
+    Returns:
+        Список ValidationResult в порядке входных конфигураций
+    """
+
+    return get_generator(protocol).validate_configs(contents, use_binary=use_binary)
+
+__all__ = [
+    "render_inbound",
+    "stream_config",
+    "render_clients_diff",
+    "validate_config",
+    "validate_configs",
+    "get_generator",
+    "render_cache",
+    "set_tracer",
+    "ConfigError",
+    "ValidationResult",
+]
@@ -0,0 +1,49 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+def render_key(*parts: Any) -> str:
+    """Стабильный хэш параметров рендера (порядок ключей в словарях не важен)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class RenderCache:
+    """Потокобезопасный LRU-кэш отрендеренных конфигураций."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            # Копия, чтобы вызывающий код не мог испортить закэшированное значение
+            return dict(value)
+
+    def put(self, key: str, value: Dict[str, str]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = dict(value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,392 @@
+import base64
+import binascii
+import hashlib
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+LOG_LEVELS = {"debug", "info", "warning", "error", "none"}
+INBOUND_PROTOCOLS = {
+    "vless", "vmess", "trojan", "shadowsocks", "socks", "http",
+    "dokodemo-door", "tunnel", "wireguard", "hysteria",
+}
+OUTBOUND_PROTOCOLS = {
+    "freedom", "blackhole", "dns", "vless", "vmess", "trojan",
+    "shadowsocks", "socks", "http", "wireguard", "loopback", "hysteria",
+}
+NETWORKS = {"tcp", "raw", "kcp", "mkcp", "ws", "http", "h2", "grpc", "httpupgrade", "xhttp", "splithttp", "quic"}
+SECURITIES = {"none", "", "tls", "reality", "xtls"}
+REALITY_NETWORKS = {"tcp", "raw", "grpc", "http", "h2", "xhttp", "splithttp"}
+VLESS_FLOWS = {"", "xtls-rprx-vision", "xtls-rprx-vision-udp443"}
+DOMAIN_STRATEGIES = {"AsIs", "IPIfNonMatch", "IPOnDemand"}
+
+@dataclass
+class ConfigError:
+    path: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}"
+
+@dataclass
+class ValidationResult:
+    valid: bool
+    errors: List[ConfigError] = field(default_factory=list)
+
+class _Checker:
+    def __init__(self):
+        self.errors: List[ConfigError] = []
+
+    def error(self, path: str, message: str) -> None:
+        self.errors.append(ConfigError(path, message))
+
+    def expect(self, value: Any, kind: type, path: str) -> bool:
+        # bool является подклассом int, но в конфиге это разные типы
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            self.error(path, f"expected {kind.__name__}, got {type(value).__name__}")
+            return False
+        return True
+
+def validate_xray_config(config: Any) -> List[ConfigError]:
+    """
+    Структурная проверка конфигурации Xray без запуска бинарника.
+
+    Покрывает секции, которые генерирует XrayGenerator: log, inbounds
+    (включая clients, streamSettings и realitySettings), outbounds и routing.
+
+    Args:
+        config: Разобранная JSON конфигурация
+
+    Returns:
+        Список ошибок; пустой список означает, что конфигурация валидна
+    """
+    checker = _Checker()
+    if not checker.expect(config, dict, "$"):
+        return checker.errors
+
+    log = config.get("log")
+    if log is not None and checker.expect(log, dict, "$.log"):
+        level = log.get("loglevel")
+        if level is not None and (not isinstance(level, str) or level not in LOG_LEVELS):
+            checker.error("$.log.loglevel", f"unknown log level {level!r}")
+
+    inbound_tags = _check_inbounds(checker, config.get("inbounds", []))
+    outbound_tags = _check_outbounds(checker, config.get("outbounds", []))
+
+    duplicates = inbound_tags & outbound_tags
+    for tag in sorted(duplicates):
+        checker.error("$", f"tag {tag!r} is used by both an inbound and an outbound")
+
+    routing = config.get("routing")
+    if routing is not None:
+        _check_routing(checker, routing, inbound_tags, outbound_tags)
+
+    return checker.errors
+
+def _check_port(checker: _Checker, port: Any, path: str) -> None:
+    if isinstance(port, bool):
+        checker.error(path, "expected port number")
+    elif isinstance(port, int):
+        if not 1 <= port <= 65535:
+            checker.error(path, f"port {port} is out of range")
+    elif isinstance(port, str):
+        # Xray принимает диапазоны "1000-2000" и списки "80,443"
+        for part in port.split(","):
+            bounds = part.strip().split("-")
+            if len(bounds) > 2 or not all(b.strip().isdigit() and 1 <= int(b) <= 65535 for b in bounds):
+                checker.error(path, f"invalid port {port!r}")
+                return
+    else:
+        checker.error(path, "expected port number")
+
+def _check_inbounds(checker: _Checker, inbounds: Any) -> Set[str]:
+    tags: Set[str] = set()
+    if not checker.expect(inbounds, list, "$.inbounds"):
+        return tags
+
+    for i, inbound in enumerate(inbounds):
+        path = f"$.inbounds[{i}]"
+        if not checker.expect(inbound, dict, path):
+            continue
+
+        tag = inbound.get("tag")
+        if tag is not None and checker.expect(tag, str, f"{path}.tag"):
+            if tag in tags:
+                checker.error(f"{path}.tag", f"duplicate inbound tag {tag!r}")
+            tags.add(tag)
+
+        # Значения сверяются с множествами только после проверки типа:
+        # список или объект из конфига не хэшируется
+        protocol = inbound.get("protocol")
+        if not isinstance(protocol, str) or protocol not in INBOUND_PROTOCOLS:
+            checker.error(f"{path}.protocol", f"unsupported inbound protocol {protocol!r}")
+
+        # Inbound без порта допустим только на unix/abstract сокете ("@...", "/...")
+        listen = inbound.get("listen")
+        if "port" in inbound:
+            _check_port(checker, inbound["port"], f"{path}.port")
+        elif not (isinstance(listen, str) and listen.startswith(("@", "/"))):
+            checker.error(path, "either port or a unix socket listen address is required")
+
+        settings = inbound.get("settings", {})
+        if checker.expect(settings, dict, f"{path}.settings"):
+            _check_inbound_settings(checker, protocol, settings, f"{path}.settings")
+
+        stream = inbound.get("streamSettings")
+        if stream is not None and checker.expect(stream, dict, f"{path}.streamSettings"):
+            _check_stream(checker, stream, f"{path}.streamSettings")
+            _check_flows(checker, settings, stream, path)
+
+    return tags
+
+def _check_inbound_settings(checker: _Checker, protocol: Any, settings: Dict[str, Any], path: str) -> None:
+    if protocol not in ("vless", "vmess", "trojan"):
+        if protocol == "shadowsocks" and "clients" not in settings:
+            if not settings.get("method"):
+                checker.error(f"{path}.method", "shadowsocks method is required")
+            if not settings.get("password"):
+                checker.error(f"{path}.password", "shadowsocks password is required")
+        return
+
+    if protocol == "vless" and settings.get("decryption") != "none":
+        checker.error(f"{path}.decryption", "vless requires decryption \"none\"")
+
+    clients = settings.get("clients", [])
+    if not checker.expect(clients, list, f"{path}.clients"):
+        return
+
+    secret = "password" if protocol == "trojan" else "id"
+    emails: Set[str] = set()
+    for i, client in enumerate(clients):
+        client_path = f"{path}.clients[{i}]"
+        if not checker.expect(client, dict, client_path):
+            continue
+        value = client.get(secret)
+        if not isinstance(value, str) or not value:
+            checker.error(f"{client_path}.{secret}", f"{protocol} client {secret} is required")
+        email = client.get("email")
+        if email is not None and checker.expect(email, str, f"{client_path}.email") and email:
+            if email in emails:
+                checker.error(f"{client_path}.email", f"duplicate client email {email!r}")
+            emails.add(email)
+        flow = client.get("flow", "")
+        if protocol == "vless" and (not isinstance(flow, str) or flow not in VLESS_FLOWS):
+            checker.error(f"{client_path}.flow", f"unknown flow {client.get('flow')!r}")
+
+def _check_stream(checker: _Checker, stream: Dict[str, Any], path: str) -> None:
+    network = stream.get("network", "tcp")
+    if not isinstance(network, str) or network not in NETWORKS:
+        checker.error(f"{path}.network", f"unsupported network {network!r}")
+
+    security = stream.get("security", "none")
+    if not isinstance(security, str) or security not in SECURITIES:
+        checker.error(f"{path}.security", f"unsupported security {security!r}")
+
+    if security == "reality":
+        if isinstance(network, str) and network not in REALITY_NETWORKS:
+            checker.error(f"{path}.network", f"reality is not supported over {network!r}")
+        reality = stream.get("realitySettings")
+        if checker.expect(reality, dict, f"{path}.realitySettings"):
+            _check_reality(checker, reality, f"{path}.realitySettings")
+
+def _check_reality(checker: _Checker, reality: Dict[str, Any], path: str) -> None:
+    dest = reality.get("dest", reality.get("target"))
+    if isinstance(dest, int) and not isinstance(dest, bool):
+        _check_port(checker, dest, f"{path}.dest")
+    elif isinstance(dest, str) and dest:
+        host, _, port = dest.rpartition(":")
+        if not host and not dest.startswith(("/", "@")):
+            checker.error(f"{path}.dest", f"dest {dest!r} must be host:port")
+        elif host:
+            _check_port(checker, int(port) if port.isdigit() else port, f"{path}.dest")
+    else:
+        checker.error(f"{path}.dest", "reality dest is required")
+
+    server_names = reality.get("serverNames")
+    if not isinstance(server_names, list) or not server_names or not all(isinstance(n, str) for n in server_names):
+        checker.error(f"{path}.serverNames", "at least one server name is required")
+
+    private_key = reality.get("privateKey")
+    if not isinstance(private_key, str) or not _is_x25519_key(private_key):
+        checker.error(f"{path}.privateKey", "privateKey must be a base64url encoded X25519 key")
+
+    short_ids = reality.get("shortIds")
+    if not checker.expect(short_ids, list, f"{path}.shortIds"):
+        return
+    for i, sid in enumerate(short_ids):
+        if not isinstance(sid, str) or len(sid) > 16 or len(sid) % 2 or any(c not in "0123456789abcdefABCDEF" for c in sid):
+            checker.error(f"{path}.shortIds[{i}]", f"short id {sid!r} must be an even-length hex string of up to 16 chars")
+
+def _is_x25519_key(value: str) -> bool:
+    try:
+        return len(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))) == 32
+    except (binascii.Error, ValueError):
+        return False
+
+def _check_flows(checker: _Checker, settings: Any, stream: Dict[str, Any], path: str) -> None:
+    if not isinstance(settings, dict) or not isinstance(settings.get("clients"), list):
+        return
+    network = stream.get("network", "tcp")
+    security = stream.get("security", "none")
+    for i, client in enumerate(settings["clients"]):
+        if isinstance(client, dict) and client.get("flow"):
+            if network not in ("tcp", "raw") or security not in ("tls", "reality"):
+                checker.error(
+                    f"{path}.settings.clients[{i}].flow",
+                    "xtls flow requires tcp network with tls or reality security"
+                )
+
+def _check_outbounds(checker: _Checker, outbounds: Any) -> Set[str]:
+    tags: Set[str] = set()
+    if not checker.expect(outbounds, list, "$.outbounds"):
+        return tags
+
+    for i, outbound in enumerate(outbounds):
+        path = f"$.outbounds[{i}]"
+        if not checker.expect(outbound, dict, path):
+            continue
+        protocol = outbound.get("protocol")
+        if not isinstance(protocol, str) or protocol not in OUTBOUND_PROTOCOLS:
+            checker.error(f"{path}.protocol", f"unsupported outbound protocol {protocol!r}")
+        tag = outbound.get("tag")
+        if tag is not None and checker.expect(tag, str, f"{path}.tag"):
+            if tag in tags:
+                checker.error(f"{path}.tag", f"duplicate outbound tag {tag!r}")
+            tags.add(tag)
+
+    return tags
+
+def _check_routing(checker: _Checker, routing: Any, inbound_tags: Set[str], outbound_tags: Set[str]) -> None:
+    if not checker.expect(routing, dict, "$.routing"):
+        return
+
+    strategy = routing.get("domainStrategy")
+    if strategy is not None and (not isinstance(strategy, str) or strategy not in DOMAIN_STRATEGIES):
+        checker.error("$.routing.domainStrategy", f"unknown domain strategy {strategy!r}")
+
+    balancer_tags: Set[str] = set()
+    balancers = routing.get("balancers", [])
+    if checker.expect(balancers, list, "$.routing.balancers"):
+        balancer_tags = {b["tag"] for b in balancers if isinstance(b, dict) and isinstance(b.get("tag"), str)}
+
+    rules = routing.get("rules", [])
+    if not checker.expect(rules, list, "$.routing.rules"):
+        return
+
+    for i, rule in enumerate(rules):
+        path = f"$.routing.rules[{i}]"
+        if not checker.expect(rule, dict, path):
+            continue
+        if rule.get("type", "field") != "field":
+            checker.error(f"{path}.type", "rule type must be \"field\"")
+
+        outbound_tag = rule.get("outboundTag")
+        balancer_tag = rule.get("balancerTag")
+        if outbound_tag is None and balancer_tag is None:
+            checker.error(path, "rule needs outboundTag or balancerTag")
+        if outbound_tag is not None and checker.expect(outbound_tag, str, f"{path}.outboundTag"):
+            if outbound_tag not in outbound_tags:
+                checker.error(f"{path}.outboundTag", f"unknown outbound tag {outbound_tag!r}")
+        if balancer_tag is not None and checker.expect(balancer_tag, str, f"{path}.balancerTag"):
+            if balancer_tag not in balancer_tags:
+                checker.error(f"{path}.balancerTag", f"unknown balancer tag {balancer_tag!r}")
+
+        rule_inbounds = rule.get("inboundTag")
+        if rule_inbounds is not None and checker.expect(rule_inbounds, list, f"{path}.inboundTag"):
+            for j, tag in enumerate(rule_inbounds):
+                if not isinstance(tag, str) or tag not in inbound_tags:
+                    checker.error(f"{path}.inboundTag[{j}]", f"unknown inbound tag {tag!r}")
+
+class BinaryValidator:
+    """
+    Второй уровень проверки через бинарник xray.
+
+    Конфигурации проверяются пачками в пуле потоков (каждая проверка —
+    отдельный процесс xray), результаты кэшируются по хэшу содержимого.
+    """
+
+    def __init__(
+        self,
+        binary: str = "xray",
+        workers: Optional[int] = None,
+        timeout: float = 10,
+        cache_size: int = 4096
+    ):
+        self.binary = binary
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 2)
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, ValidationResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, config_content: str) -> ValidationResult:
+        return self.validate_many([config_content])[0]
+
+    def validate_many(self, contents: Iterable[str]) -> List[ValidationResult]:
+        """
+        Проверяет конфигурации бинарником xray.
+
+        Args:
+            contents: JSON конфигурации
+
+        Returns:
+            Результаты в том же порядке, что и входные конфигурации
+        """
+        contents = list(contents)
+        keys = [hashlib.sha256(c.encode("utf-8")).hexdigest() for c in contents]
+
+        results: Dict[str, ValidationResult] = {}
+        pending: Dict[str, str] = {}
+        with self._lock:
+            for key, content in zip(keys, contents):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[key] = cached
+                else:
+                    # Одинаковые конфигурации в пачке проверяются один раз
+                    pending[key] = content
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                checked = dict(zip(pending, executor.map(self._run, pending.values())))
+            results.update((key, result) for key, (result, _) in checked.items())
+            with self._lock:
+                for key, (result, completed) in checked.items():
+                    # Таймаут и отсутствие бинарника — не вердикт по конфигурации
+                    if completed:
+                        self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [results[key] for key in keys]
+
+    def _run(self, config_content: str) -> Tuple[ValidationResult, bool]:
+        """Проверка одной конфигурации; второй элемент — завершился ли xray test (результат можно кэшировать)."""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            f.write(config_content)
+            temp_file = f.name
+
+        try:
+            result = subprocess.run(
+                [self.binary, "test", "-c", temp_file],
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            return ValidationResult(False, [ConfigError("$", "xray test timed out")]), False
+        except FileNotFoundError:
+            return ValidationResult(False, [ConfigError("$", f"{self.binary} binary not found")]), False
+        finally:
+            os.unlink(temp_file)
+
+        if result.returncode == 0:
+            return ValidationResult(True), True
+        message = (result.stderr or result.stdout).strip() or f"xray exited with code {result.returncode}"
+        return ValidationResult(False, [ConfigError("$", message)]), True
@@ -1,20 +1,52 @@
 import json
 import os
-from typing import Dict, Any, List
-from jinja2 import Environment, FileSystemLoader, Template
-import subprocess
-import tempfile
+import re
+from typing import Dict, Any, Iterable, List, Optional, TextIO, Tuple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from .validation import BinaryValidator, ConfigError, ValidationResult, validate_xray_config
+
+# Шаблоны Hiddify — JSON5: комментарии // и /* */, висячие запятые.
+# Строки захватываются первыми, чтобы не трогать "//" внутри значений
+_JSON5_COMMENTS = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.S)
+_JSON5_TRAILING_COMMAS = re.compile(r'("(?:\\.|[^"\\])*")|,(?=\s*[\]}])')
+
+# Подставляется вместо uuid при рендере каркаса: по нему из шаблона
+# извлекается запись клиента
+_USER_SENTINEL = "__mindvpn_user__"
+_CLIENTS_MARKER = re.compile(r'"__mindvpn_clients_(\d+)__"')
+
+def _loads_template_json(content: str) -> Any:
+    """json.loads для вывода шаблонов Hiddify (JSON5-комментарии и висячие запятые)."""
+    keep_strings = lambda m: m.group(1) or ""
+    content = _JSON5_COMMENTS.sub(keep_strings, content)
+    content = _JSON5_TRAILING_COMMAS.sub(keep_strings, content)
+    return json.loads(content)
 
 class XrayGenerator:
     """Генератор конфигураций для Xray-core."""
+
+    # Пресет -> шаблон inbound
+    PRESET_TEMPLATES = {
+        "reality_tcp": "05_inbounds_02_reality_main.json.j2",
+        "reality_grpc": "05_inbounds_02_reality_main.json.j2",
+        "reality_xhttp": "05_inbounds_02_reality_main.json.j2",
+        "vmess": "05_inbounds_02_xtls_main.json.j2",
+        "trojan": "05_inbounds_02_xtls_main.json.j2"
+    }
     
     def __init__(self):
         self.template_dir = os.path.join(os.path.dirname(__file__), "../templates/xray")
+        # Байткод шаблонов переиспользуется между процессами; шаблоны не меняются
+        # во время работы, поэтому проверка mtime на каждый get_template не нужна
         self.env = Environment(
             loader=FileSystemLoader(self.template_dir),
+            bytecode_cache=FileSystemBytecodeCache(os.environ.get("HIDDI_COMPAT_BYTECODE_CACHE_DIR")),
+            auto_reload=False,
             trim_blocks=True,
             lstrip_blocks=True
         )
+        self.binary_validator = BinaryValidator(binary="xray")
     
     def render_inbound(
         self,
@@ -36,6 +68,101 @@ class XrayGenerator:
             Словарь {filename: content}
         """
         
+        # Рендерим конфигурацию
+        config_content = self._render_template(port, preset, overrides, overrides.get("users", []))
+        
+        # Создаем полную конфигурацию Xray
+        full_config = self._create_full_config(config_content, overrides)
+        
+        return {
+            "config.json": json.dumps(full_config, indent=2),
+            "inbound.json": config_content
+        }
+    
+    def stream_config(
+        self,
+        out: TextIO,
+        port: int,
+        preset: str,
+        overrides: Dict[str, Any],
+        node_caps: Dict[str, Any],
+        indent: Optional[int] = None
+    ) -> None:
+        """
+        Пишет полную конфигурацию Xray в out по частям.
+
+        Шаблон рендерится один раз с одним служебным пользователем; клиенты
+        пишутся в out по одному, поэтому память не зависит от числа
+        пользователей. Результат совпадает с config.json из render_inbound.
+
+        Args:
+            out: Файл или буфер для записи (str)
+            port: Порт для inbound
+            preset: Пресет (reality_tcp, reality_grpc, etc.)
+            overrides: Дополнительные параметры; users может быть любым
+                итерируемым, но перебирается по разу на inbound с клиентами
+            node_caps: Возможности узла
+            indent: Отступ как в json.dumps; по умолчанию компактный вывод
+        """
+        config, clients = self._config_skeleton(port, preset, overrides)
+        separators = (",", ":") if indent is None else (",", ": ")
+        for i, (inbound, _) in enumerate(clients):
+            inbound["settings"]["clients"] = f"__mindvpn_clients_{i}__"
+
+        text = json.dumps(config, indent=indent, separators=separators)
+        users = overrides.get("users", [])
+        pos = 0
+        for marker in _CLIENTS_MARKER.finditer(text):
+            out.write(text[pos:marker.start()])
+            pos = marker.end()
+            client = clients[int(marker.group(1))][1]
+            line_start = text.rfind("\n", 0, marker.start()) + 1
+            prefix = re.match(r"[ ]*", text[line_start:]).group() if indent is not None else ""
+            self._write_clients(out, client, users, indent, separators, prefix)
+        out.write(text[pos:])
+
+    def render_clients_diff(
+        self,
+        port: int,
+        preset: str,
+        overrides: Dict[str, Any],
+        node_caps: Dict[str, Any],
+        previous_users: Iterable[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Разница массивов clients между previous_users и overrides["users"].
+
+        Для горячего обновления пользователей без перезапуска ядра: записи
+        add передаются в AddUser, email из remove — в RemoveUser API Xray.
+        Измененный клиент попадает в оба списка.
+
+        Args:
+            port: Порт для inbound
+            preset: Пресет (reality_tcp, reality_grpc, etc.)
+            overrides: Параметры с новым списком users
+            node_caps: Возможности узла
+            previous_users: Пользователи, на которых собрана текущая конфигурация
+
+        Returns:
+            {"inbounds": [{"tag": ..., "add": [client, ...], "remove": [email, ...]}]}
+        """
+        _, clients = self._config_skeleton(port, preset, overrides)
+        previous_users = list(previous_users)
+        inbounds = []
+        for inbound, client in clients:
+            template = json.dumps(client, separators=(",", ":"))
+            before = {c.get("email"): c for c in self._clients(template, previous_users)}
+            after = {c.get("email"): c for c in self._clients(template, overrides.get("users", []))}
+            inbounds.append({
+                "tag": inbound.get("tag", ""),
+                "add": [c for email, c in after.items() if before.get(email) != c],
+                "remove": [email for email, c in before.items() if after.get(email) != c]
+            })
+        return {"inbounds": inbounds}
+
+    def _render_template(self, port: int, preset: str, overrides: Dict[str, Any], users: Iterable[Dict[str, Any]]) -> str:
+        """Рендерит шаблон inbound пресета для заданных пользователей."""
+        
         # Базовые настройки
         config = {
             "core_type": "xray",
@@ -48,20 +175,18 @@ class XrayGenerator:
             "path_xhttp": "/xhttp"
         }
         
-        # Домены для Reality
+        # Домены для Reality; в шаблонах Hiddify reality-домены имеют режим special_<пресет>
         domains = [{
             "domain": overrides.get("server_name", "example.com"),
             "internal_port_special": port,
-            "mode": preset
+            "mode": f"special_{preset}" if preset.startswith("reality_") else preset
         }]
         
         # Пользователи (клиенты)
-        users = []
-        for user in overrides.get("users", []):
-            users.append({
-                "uuid": user.get("uuid", ""),
-                "email": user.get("email", "")
-            })
+        users = [
+            {"uuid": user.get("uuid", ""), "email": user.get("email", "")}
+            for user in users
+        ]
         
         # Контекст для шаблонов
         context = {
@@ -72,37 +197,83 @@ class XrayGenerator:
         }
         
         # Выбираем шаблон в зависимости от пресета
-        template_name = self._get_template_name(preset)
-        template = self.env.get_template(template_name)
-        
-        # Рендерим конфигурацию
-        config_content = template.render(**context)
-        
-        # Создаем полную конфигурацию Xray
-        full_config = self._create_full_config(config_content, overrides)
-        
-        return {
-            "config.json": json.dumps(full_config, indent=2),
-            "inbound.json": config_content
-        }
+        template = self.env.get_template(self._get_template_name(preset))
+        return template.render(**context)
+
+    def _config_skeleton(
+        self,
+        port: int,
+        preset: str,
+        overrides: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+        """
+        Полная конфигурация без пользователей и записи клиентов по inbound'ам.
+
+        Returns:
+            (config, [(inbound, client), ...]); client — запись из шаблона
+            с _USER_SENTINEL вместо uuid
+        """
+        content = self._render_template(port, preset, overrides, [{"uuid": _USER_SENTINEL}])
+        config = self._create_full_config(content, overrides)
+        clients = []
+        for inbound in config["inbounds"]:
+            settings = inbound.get("settings")
+            entries = settings.get("clients") if isinstance(settings, dict) else None
+            if isinstance(entries, list) and len(entries) == 1 and _USER_SENTINEL in json.dumps(entries[0]):
+                clients.append((inbound, entries[0]))
+        return config, clients
+
+    @staticmethod
+    def _clients(template: str, users: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Записи клиентов по сериализованной записи-шаблону."""
+        for user in users:
+            uuid = json.dumps(user.get("uuid", ""))[1:-1]
+            yield json.loads(template.replace(_USER_SENTINEL, uuid))
+
+    @staticmethod
+    def _write_clients(
+        out: TextIO,
+        client: Dict[str, Any],
+        users: Iterable[Dict[str, Any]],
+        indent: Optional[int],
+        separators: Tuple[str, str],
+        prefix: str
+    ) -> None:
+        """Пишет массив clients: запись-шаблон сериализуется один раз, для каждого пользователя подставляется uuid."""
+        if indent is None:
+            item_prefix = ""
+            template = json.dumps(client, separators=separators)
+        else:
+            item_prefix = "\n" + prefix + " " * indent
+            template = json.dumps(client, indent=indent, separators=separators).replace("\n", item_prefix)
+        head, _, tail = template.partition(_USER_SENTINEL)
+        # Sentinel может встречаться в записи несколько раз (id и email)
+        parts = tail.split(_USER_SENTINEL)
+
+        out.write("[")
+        first = True
+        for user in users:
+            uuid = json.dumps(user.get("uuid", ""))[1:-1]
+            out.write(item_prefix if first else "," + item_prefix)
+            out.write(head)
+            for part in parts:
+                out.write(uuid)
+                out.write(part)
+            first = False
+        if not first and indent is not None:
+            out.write("\n" + prefix)
+        out.write("]")
     
     def _get_template_name(self, preset: str) -> str:
         """Возвращает имя шаблона для пресета."""
-        preset_map = {
-            "reality_tcp": "05_inbounds_02_reality_main.json.j2",
-            "reality_grpc": "05_inbounds_02_reality_main.json.j2",
-            "reality_xhttp": "05_inbounds_02_reality_main.json.j2",
-            "vmess": "05_inbounds_02_xtls_main.json.j2",
-            "trojan": "05_inbounds_02_xtls_main.json.j2"
-        }
-        return preset_map.get(preset, "05_inbounds_02_reality_main.json.j2")
+        return self.PRESET_TEMPLATES.get(preset, "05_inbounds_02_reality_main.json.j2")
     
     def _create_full_config(self, inbound_config: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
         """Создает полную конфигурацию Xray."""
         
         # Парсим inbound конфигурацию
         try:
-            inbound_data = json.loads(inbound_config)
+            inbound_data = _loads_template_json(inbound_config)
         except json.JSONDecodeError:
             inbound_data = {"inbounds": []}
         
@@ -133,39 +304,52 @@ class XrayGenerator:
         
         return config
     
-    def validate_config(self, config_content: str) -> bool:
+    def check_config(self, config_content: str) -> ValidationResult:
+        """
+        Структурная проверка конфигурации Xray в процессе, без запуска xray.
+
+        Args:
+            config_content: JSON конфигурация
+
+        Returns:
+            ValidationResult со списком ошибок
+        """
+        try:
+            config = json.loads(config_content)
+        except json.JSONDecodeError as e:
+            return ValidationResult(False, [ConfigError("$", f"invalid JSON: {e}")])
+
+        errors = validate_xray_config(config)
+        return ValidationResult(not errors, errors)
+
+    def validate_configs(self, contents: List[str], use_binary: bool = False) -> List[ValidationResult]:
+        """
+        Валидирует пачку конфигураций Xray.
+
+        Args:
+            contents: JSON конфигурации
+            use_binary: Дополнительно проверить структурно валидные конфигурации бинарником xray
+
+        Returns:
+            Результаты в порядке входных конфигураций
+        """
+        results = [self.check_config(content) for content in contents]
+        if use_binary:
+            to_check = [i for i, result in enumerate(results) if result.valid]
+            checked = self.binary_validator.validate_many(contents[i] for i in to_check)
+            for i, result in zip(to_check, checked):
+                results[i] = result
+        return results
+
+    def validate_config(self, config_content: str, use_binary: bool = False) -> bool:
         """
         Валидирует конфигурацию Xray.
         
         Args:
             config_content: JSON конфигурация
+            use_binary: Дополнительно проверить конфигурацию бинарником xray
             
         Returns:
             True если конфигурация валидна
         """
-        try:
-            # Проверяем JSON синтаксис
-            config = json.loads(config_content)
-            
-            # Создаем временный файл для валидации
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                f.write(config_content)
-                temp_file = f.name
-            
-            try:
-                # Запускаем xray -test для валидации
-                result = subprocess.run(
-                    ["xray", "test", "-c", temp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                
-                return result.returncode == 0
-                
-            finally:
-                # Удаляем временный файл
-                os.unlink(temp_file)
-                
-        except (json.JSONDecodeError, subprocess.TimeoutExpired, FileNotFoundError):
-            return False
+        return self.validate_configs([config_content], use_binary=use_binary)[0].valid
@@ -0,0 +1,136 @@
+"""
+Общие фикстуры микробенчмарков генерации конфигураций
+
+Шаблоны берутся из Hiddify-Manager-dev как есть. Их include'ы написаны
+абсолютными путями /opt/hiddify-manager/..., поэтому загрузчик переводит этот
+префикс на копию дерева во временном каталоге (jinja.render пишет результат
+рядом с шаблоном, рабочее дерево не трогается).
+"""
+
+import json
+import os
+import shutil
+import sys
+import tracemalloc
+import uuid
+
+import pytest
+from jinja2 import FileSystemLoader
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+HIDDIFY_ROOT = os.path.join(REPO_ROOT, "Hiddify-Manager-dev")
+INSTALL_ROOT = "/opt/hiddify-manager/"
+FIXTURE_CURRENT_JSON = os.path.join(os.path.dirname(__file__), "fixtures", "current.json")
+
+USER_COUNTS = [1, 1000, 50000]
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "libs"))
+
+class HiddifyLoader(FileSystemLoader):
+    """FileSystemLoader, который разрешает пути /opt/hiddify-manager/... внутри root."""
+
+    def __init__(self, root, searchpath):
+        super().__init__([*searchpath, root])
+
+    def get_source(self, environment, template):
+        if template.startswith(INSTALL_ROOT):
+            template = template[len(INSTALL_ROOT):]
+        return super().get_source(environment, template)
+
+def make_users(count):
+    """Пользователи в формате current.json; uuid детерминированные, чтобы вывод был стабилен между запусками."""
+    return [
+        {
+            "id": i + 1,
+            "name": f"user{i}",
+            "uuid": str(uuid.UUID(int=i + 1)),
+            "is_active": True,
+            "wg_pk": f"{i:043x}=",
+            "wg_pub": f"{i + 1:043x}=",
+            "wg_psk": f"{i + 2:043x}=",
+        }
+        for i in range(count)
+    ]
+
+def load_current_json(users=None):
+    with open(FIXTURE_CURRENT_JSON) as f:
+        configs = json.load(f)
+    if users is not None:
+        configs["users"] = make_users(users)
+    return configs
+
+def measure(benchmark, fn, *args, rounds=None):
+    """
+    Время через pytest-benchmark и пиковая память одного вызова через tracemalloc.
+
+    Память снимается отдельным прогоном: tracemalloc замедляет выполнение и
+    исказил бы время. Тяжелые случаи (rounds) идут через pedantic с одной итерацией.
+    """
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_memory_kib"] = peak // 1024
+    if rounds:
+        return benchmark.pedantic(fn, args=args, rounds=rounds, iterations=1, warmup_rounds=0)
+    return benchmark(fn, *args)
+
+@pytest.fixture(scope="session")
+def hiddify_tree(tmp_path_factory):
+    """Копия шаблонов Hiddify-Manager-dev (*.j2 и *.pj2) с сохранением структуры каталогов."""
+    root = str(tmp_path_factory.mktemp("hiddify-manager"))
+    for dirpath, dirnames, filenames in os.walk(HIDDIFY_ROOT):
+        dirnames[:] = [d for d in dirnames if d not in (".git", ".venv", "src")]
+        for filename in filenames:
+            if filename.endswith((".j2", ".pj2")):
+                target = os.path.join(root, os.path.relpath(dirpath, HIDDIFY_ROOT))
+                os.makedirs(target, exist_ok=True)
+                shutil.copy2(os.path.join(dirpath, filename), target)
+    return root
+
+def make_xray_generator(root):
+    """XrayGenerator поверх настоящих xray/configs/*.j2 из дерева root."""
+    from hiddi_compat.generators.xray import XrayGenerator
+
+    generator = XrayGenerator()
+    generator.env.loader = HiddifyLoader(root, [os.path.join(root, "xray", "configs")])
+    return generator
+
+@pytest.fixture(scope="session")
+def xray_generator(hiddify_tree):
+    return make_xray_generator(hiddify_tree)
+
+@pytest.fixture(scope="session")
+def jinja_module(hiddify_tree, tmp_path_factory):
+    """common/jinja.py, загруженный с фикстурным current.json и загрузчиком на копию дерева."""
+    current_json = tmp_path_factory.mktemp("current") / "current.json"
+    current_json.write_text(json.dumps(load_current_json()))
+    os.environ["HIDDIFY_CURRENT_JSON"] = str(current_json)
+    # Состояние инкрементального рендера — рядом с копией дерева, а не в /opt;
+    # переменная окружения нужна воркерам пула, атрибут — уже импортированному модулю
+    state_file = str(tmp_path_factory.mktemp("state") / "jinja_render_state.json")
+    os.environ["HIDDIFY_RENDER_STATE_FILE"] = state_file
+    sys.path.insert(0, os.path.join(HIDDIFY_ROOT, "common"))
+    import jinja
+
+    jinja.state_file = state_file
+    jinja.env.loader = HiddifyLoader(hiddify_tree, ["/", os.path.join(hiddify_tree, "singbox", "configs")])
+    return jinja
+
+@pytest.fixture
+def hiddify_configs(jinja_module):
+    """Подменяет configs модуля jinja на current.json с заданным числом пользователей."""
+    original = dict(jinja_module.configs)
+
+    def apply(users=None):
+        configs = load_current_json(users)
+        configs["chconfigs"] = {int(k): v for k, v in configs["chconfigs"].items()}
+        configs["hconfigs"] = configs["chconfigs"][0]
+        jinja_module.configs.clear()
+        jinja_module.configs.update(configs)
+
+    yield apply
+    jinja_module.configs.clear()
+    jinja_module.configs.update(original)
@@ -0,0 +1,98 @@
+"""
+Микробенчмарки генератора Xray из hiddi_compat
+
+Каждый пресет XrayGenerator.PRESET_TEMPLATES рендерится на 1, 1k и 50k
+пользователей: время и пиковая память render_inbound целиком,
+_create_full_config отдельно и потоковой записи stream_config. Каждый случай
+проверяет, что в конфигурации есть inbound'ы со всеми пользователями: пустой
+рендер был бы быстрым, но ничего не мерил.
+"""
+
+import io
+import json
+import os
+
+import pytest
+
+from conftest import HIDDIFY_ROOT, USER_COUNTS, make_xray_generator, measure
+
+NODE_CAPS = {"protocol": "XRAY", "version": "1.8.0", "features": ["reality", "xtls"]}
+
+def make_overrides(users):
+    return {
+        "server_name": "www.apple.com",
+        "private_key": "sNx3tF7rXTKN0Q4u5Wk8Y2oGcZpHh9vEjLmAaBdCfEg",
+        "short_ids": ["", "a1b2c3d4"],
+        "users": [
+            {"uuid": f"00000000-0000-4000-8000-{i:012x}", "email": f"user{i}@mindvpn.local"}
+            for i in range(users)
+        ],
+    }
+
+def count_clients(config):
+    """(число inbound'ов, число клиентов в каждом) конфигурации Xray."""
+    inbounds = config["inbounds"]
+    return len(inbounds), {len(i.get("settings", {}).get("clients", [])) for i in inbounds}
+
+def check_config(config, users):
+    inbounds, clients = count_clients(config)
+    assert inbounds > 0
+    assert clients == {users}
+
+def presets():
+    """
+    Пресеты с живым шаблоном. Шаблон vmess/trojan (05_inbounds_02_xtls_main)
+    в Hiddify выключен через {% if 0 and ... %} и не дает ни одного inbound'а —
+    такие пресеты пропускаются с причиной, а не меряются вхолостую.
+    """
+    generator = make_xray_generator(HIDDIFY_ROOT)
+    params = []
+    for preset in sorted(generator.PRESET_TEMPLATES):
+        config = generator.render_inbound(443, preset, make_overrides(1), NODE_CAPS)["config.json"]
+        if count_clients(json.loads(config))[0]:
+            params.append(preset)
+        else:
+            template = generator._get_template_name(preset)
+            params.append(pytest.param(preset, marks=pytest.mark.skip(reason=f"{template} renders no inbounds")))
+    return params
+
+PRESETS = presets()
+
+def rounds_for(users):
+    # 50k пользователей — секунды на вызов; стандартная калибровка заняла бы минуты
+    return 3 if users >= 50000 else None
+
+@pytest.mark.parametrize("users", USER_COUNTS)
+@pytest.mark.parametrize("preset", PRESETS)
+def test_render_inbound(benchmark, xray_generator, preset, users):
+    benchmark.group = f"render_inbound[{preset}]"
+    benchmark.extra_info["users"] = users
+    overrides = make_overrides(users)
+    result = measure(benchmark, xray_generator.render_inbound, 443, preset, overrides, NODE_CAPS,
+                     rounds=rounds_for(users))
+    benchmark.extra_info["config_bytes"] = len(result["config.json"])
+    benchmark.extra_info["inbound_bytes"] = len(result["inbound.json"])
+    check_config(json.loads(result["config.json"]), users)
+
+@pytest.mark.parametrize("users", USER_COUNTS)
+@pytest.mark.parametrize("preset", PRESETS)
+def test_create_full_config(benchmark, xray_generator, preset, users):
+    benchmark.group = f"_create_full_config[{preset}]"
+    benchmark.extra_info["users"] = users
+    overrides = make_overrides(users)
+    inbound = xray_generator.render_inbound(443, preset, overrides, NODE_CAPS)["inbound.json"]
+    config = measure(benchmark, xray_generator._create_full_config, inbound, overrides, rounds=rounds_for(users))
+    check_config(config, users)
+
+@pytest.mark.parametrize("users", USER_COUNTS)
+@pytest.mark.parametrize("preset", PRESETS)
+def test_stream_config(benchmark, xray_generator, preset, users):
+    benchmark.group = f"stream_config[{preset}]"
+    benchmark.extra_info["users"] = users
+    overrides = make_overrides(users)
+    with open(os.devnull, "w") as out:
+        measure(benchmark, xray_generator.stream_config, out, 443, preset, overrides, NODE_CAPS,
+                rounds=rounds_for(users))
+    out = io.StringIO()
+    xray_generator.stream_config(out, 443, preset, overrides, NODE_CAPS)
+    check_config(json.loads(out.getvalue()), users)
@@ -0,0 +1,41 @@
+"""
+Микробенчмарки рендера шаблонов Hiddify (common/jinja.py)
+
+jinja.render по каждому xray/configs/*.j2 и singbox/configs/*.j2 на 1 и 100
+пользователей и полный проход render_j2_templates по дереву из фикстурного
+current.json.
+"""
+
+import glob
+import os
+
+import pytest
+
+from conftest import HIDDIFY_ROOT, measure
+
+def templates(core):
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(HIDDIFY_ROOT, core, "configs", "*.j2")))
+
+TEMPLATES = [(core, name) for core in ("xray", "singbox") for name in templates(core)]
+
+# jinja.render проверяет вывод через json5, а он на 1k пользователей разбирает
+# один шаблон больше минуты; масштаб по пользователям меряет test_hiddi_compat
+JINJA_USER_COUNTS = [1, 100]
+
+@pytest.mark.parametrize("users", JINJA_USER_COUNTS)
+@pytest.mark.parametrize("core,name", TEMPLATES, ids=[f"{c}/{n}" for c, n in TEMPLATES])
+def test_jinja_render(benchmark, jinja_module, hiddify_configs, hiddify_tree, core, name, users):
+    hiddify_configs(users)
+    benchmark.group = f"jinja.render[{core}]"
+    benchmark.extra_info["users"] = users
+    path = os.path.join(hiddify_tree, core, "configs", name)
+    assert measure(benchmark, jinja_module.render, path, rounds=3 if users > 1 else None)
+
+@pytest.mark.parametrize("users", [None, JINJA_USER_COUNTS[-1]])
+def test_render_full_tree(benchmark, jinja_module, hiddify_configs, hiddify_tree, users):
+    """Полный apply: все шаблоны дерева, fingerprint'ы и пул процессов, как в apply_configs."""
+    hiddify_configs(users)
+    benchmark.group = "render_j2_templates"
+    benchmark.extra_info["users"] = users or len(jinja_module.configs["users"])
+    # Память — только родительского процесса; рендер идет в воркерах пула
+    measure(benchmark, jinja_module.render_j2_templates, hiddify_tree, rounds=3)
@@ -0,0 +1,15 @@
+"""
+Юнит-тесты чистой логики без БД, Redis и сети
+
+API импортируется как пакет src (apps/api), hiddi_compat — из libs, скрипты
+Hiddify — как модули из Hiddify-Manager-dev/common.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "apps", "api"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "libs"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "Hiddify-Manager-dev", "common"))
@@ -0,0 +1,109 @@
+"""
+VersionedCache: инвалидация по ключам и тегам, гонки с вычислением, max_age
+"""
+
+import asyncio
+import itertools
+
+import pytest
+
+from src.core.cache import VersionedCache
+
+_names = itertools.count()
+
+def make_cache(**kwargs):
+    # Имя — метка метрик; у каждого теста свой кэш
+    return VersionedCache(f"test-{next(_names)}", maxsize=kwargs.pop("maxsize", 100), **kwargs)
+
+class Source:
+    """compute(), считающий вызовы; gate позволяет придержать вычисление."""
+
+    def __init__(self, tags=("org", 1)):
+        self.calls = 0
+        self.tags = [tags]
+        self.gate = None
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.calls
+        if self.gate is not None:
+            await self.gate.wait()
+        return value, self.tags
+
+@pytest.mark.asyncio
+async def test_hit_after_compute():
+    cache, source = make_cache(), Source()
+    assert await cache.get_or_compute("k", source) == 1
+    assert await cache.get_or_compute("k", source) == 1
+    assert source.calls == 1
+
+@pytest.mark.asyncio
+async def test_invalidate_by_key_and_tag():
+    cache, source = make_cache(), Source()
+    await cache.get_or_compute("k", source)
+    cache.invalidate("k")
+    assert await cache.get_or_compute("k", source) == 2
+    cache.invalidate(("org", 2))
+    assert await cache.get_or_compute("k", source) == 2
+    cache.invalidate(("org", 1))
+    assert await cache.get_or_compute("k", source) == 3
+    cache.invalidate()
+    assert await cache.get_or_compute("k", source) == 4
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_compute():
+    cache, source = make_cache(), Source()
+    source.gate = asyncio.Event()
+    waiters = [asyncio.create_task(cache.get_or_compute("k", source)) for _ in range(5)]
+    await asyncio.sleep(0)
+    source.gate.set()
+    assert await asyncio.gather(*waiters) == [1] * 5
+    assert source.calls == 1
+
+@pytest.mark.asyncio
+async def test_change_during_compute_is_not_cached():
+    cache, source = make_cache(), Source()
+    source.gate = asyncio.Event()
+    first = asyncio.create_task(cache.get_or_compute("k", source))
+    await asyncio.sleep(0)
+    cache.invalidate(("org", 1))
+    source.gate.set()
+    assert await first == 1
+    assert await cache.get_or_compute("k", source) == 2
+
+@pytest.mark.asyncio
+async def test_request_after_invalidation_does_not_join_stale_compute():
+    cache, source = make_cache(), Source()
+    source.gate = asyncio.Event()
+    before = asyncio.create_task(cache.get_or_compute("k", source))
+    await asyncio.sleep(0)
+    cache.invalidate(("org", 1))
+    after = asyncio.create_task(cache.get_or_compute("k", source))
+    await asyncio.sleep(0)
+    source.gate.set()
+    # Запрос до изменения получает начатое вычисление, после — свое
+    assert await before == 1
+    assert await after == 2
+    assert await cache.get_or_compute("k", source) == 2
+    assert source.calls == 2
+
+@pytest.mark.asyncio
+async def test_max_age(monkeypatch):
+    cache, source = make_cache(max_age=10), Source()
+    now = [1000.0]
+    monkeypatch.setattr("src.core.cache.time.monotonic", lambda: now[0])
+    await cache.get_or_compute("k", source)
+    now[0] += 9
+    assert await cache.get_or_compute("k", source) == 1
+    now[0] += 2
+    assert await cache.get_or_compute("k", source) == 2
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    cache, source = make_cache(maxsize=2), Source()
+    for key in ("a", "b"):
+        await cache.get_or_compute(key, source)
+    await cache.get_or_compute("a", source)
+    await cache.get_or_compute("c", source)
+    assert await cache.get_or_compute("a", source) == 1
+    assert await cache.get_or_compute("b", source) == 4
@@ -0,0 +1,26 @@
+"""
+Доступ к /debug: bearer-токен, отказ — всегда 403
+"""
+
+import pytest
+from fastapi import HTTPException
+
+from src.routers.debug import require_debug_token
+
+@pytest.fixture(autouse=True)
+def token(monkeypatch):
+    monkeypatch.setattr("src.routers.debug.settings.debug_token", "s3cret")
+
+def test_valid_token():
+    require_debug_token("Bearer s3cret")
+
+@pytest.mark.parametrize("authorization", [None, "", "Bearer wrong", "s3cre", "Bearer s3cr\xe9t", "Bearer \xff"])
+def test_rejected_with_403(authorization):
+    with pytest.raises(HTTPException) as e:
+        require_debug_token(authorization)
+    assert e.value.status_code == 403
+
+def test_closed_without_configured_token(monkeypatch):
+    monkeypatch.setattr("src.routers.debug.settings.debug_token", "")
+    with pytest.raises(HTTPException):
+        require_debug_token("Bearer ")
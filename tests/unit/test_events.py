@@ -0,0 +1,57 @@
+"""
+Дельты дашборда, фильтры подписчиков и жизненный цикл подписки /v1/events
+"""
+
+import pytest
+
+from src.routers.events import stream_events
+from src.services.events import LAGGED, Event, Subscription, dashboard_delta, event_bus, parse_event_types
+
+def test_dashboard_delta_keeps_only_changes():
+    previous = {"nodes": {"ready": 3, "down": 1}, "tasks": {"queued": 0}, "users": 10}
+    current = {"nodes": {"ready": 4, "down": 1}, "tasks": {"queued": 0}, "users": 10, "new": 1}
+    assert dashboard_delta(previous, current) == {"nodes": {"ready": 4}, "new": 1}
+
+def test_dashboard_delta_from_empty_is_full_state():
+    current = {"nodes": {"ready": 3}, "users": 10}
+    assert dashboard_delta({}, current) == current
+    assert dashboard_delta(current, current) == {}
+
+def test_dashboard_delta_type_change_replaces_value():
+    assert dashboard_delta({"nodes": 0}, {"nodes": {"ready": 1}}) == {"nodes": {"ready": 1}}
+    assert dashboard_delta({"nodes": {"ready": 1}}, {"nodes": None}) == {"nodes": None}
+
+def test_parse_event_types():
+    assert parse_event_types(None) is None
+    assert parse_event_types("node, task.status") == {"node", "task.status"}
+    with pytest.raises(ValueError):
+        parse_event_types("node,bogus")
+
+def test_subscription_filters():
+    subscription = Subscription(types=frozenset({"node"}), filters={"node_id": {1}})
+    assert subscription.matches(Event("node.status", {"node_id": 1}))
+    assert not subscription.matches(Event("node.status", {"node_id": 2}))
+    assert not subscription.matches(Event("task.status", {"node_id": 1}))
+
+def test_slow_subscriber_gets_single_lagged_marker(monkeypatch):
+    monkeypatch.setattr("src.services.events.settings.events_queue_size", 2)
+    subscription = Subscription()
+    for i in range(5):
+        subscription.offer(Event("task.status", {"task_id": i}))
+    queued = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+    assert [e.data.get("task_id") for e in queued[:2]] == [0, 1]
+    assert queued[2:] == [LAGGED]
+    assert subscription.dropped == 3
+
+@pytest.mark.asyncio
+async def test_stream_subscribes_only_while_generator_runs():
+    before = len(event_bus._subscribers)
+    response = await stream_events(types="node", node_id=None, task_id=None, batch_id=None)
+    # Ответ, который так и не начали отправлять, не оставляет подписки
+    assert len(event_bus._subscribers) == before
+
+    body = response.body_iterator
+    assert await body.__anext__() == "retry: 3000\n\n"
+    assert len(event_bus._subscribers) == before + 1
+    await body.aclose()
+    assert len(event_bus._subscribers) == before
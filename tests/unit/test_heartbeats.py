@@ -0,0 +1,63 @@
+"""
+HeartbeatBuffer: склейка heartbeat'ов узла и сохранность пачки при сбое или отмене записи
+"""
+
+import asyncio
+
+import pytest
+
+from src.schemas.node import NodeHeartbeat
+from src.services.heartbeats import HeartbeatBuffer
+
+def heartbeat(agent="1.0"):
+    return NodeHeartbeat(loads={}, versions={"agent": agent}, users_online=0)
+
+def make_buffer(monkeypatch, write_batch):
+    buffer = HeartbeatBuffer(flush_interval_ms=1000, batch_size=2)
+    monkeypatch.setattr(buffer, "_write_batch", write_batch)
+    return buffer
+
+@pytest.mark.asyncio
+async def test_latest_heartbeat_per_node_is_written(monkeypatch):
+    written = []
+
+    async def write_batch(batch):
+        written.extend((node_id, item.heartbeat.versions["agent"]) for node_id, item in batch)
+
+    buffer = make_buffer(monkeypatch, write_batch)
+    for node_id, agent in [(1, "1.0"), (2, "1.0"), (1, "1.1"), (3, "1.0")]:
+        buffer.add(node_id, heartbeat(agent))
+    assert await buffer.flush() == 3
+    assert sorted(written) == [(1, "1.1"), (2, "1.0"), (3, "1.0")]
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_requeued_behind_newer_heartbeats(monkeypatch):
+    async def write_batch(batch):
+        buffer.add(1, heartbeat("2.0"))
+        raise RuntimeError("db is down")
+
+    buffer = make_buffer(monkeypatch, write_batch)
+    buffer.add(1, heartbeat("1.0"))
+    buffer.add(2, heartbeat("1.0"))
+    with pytest.raises(RuntimeError):
+        await buffer.flush()
+    assert {node_id: item.heartbeat.versions["agent"] for node_id, item in buffer._pending.items()} == {1: "2.0", 2: "1.0"}
+
+@pytest.mark.asyncio
+async def test_batch_survives_cancelled_flush(monkeypatch):
+    started, written = asyncio.Event(), []
+
+    async def write_batch(batch):
+        if not started.is_set():
+            started.set()
+            await asyncio.Event().wait()
+        written.extend(node_id for node_id, _ in batch)
+
+    buffer = make_buffer(monkeypatch, write_batch)
+    buffer.add(1, heartbeat())
+    await buffer.start()
+    buffer._wakeup.set()
+    await started.wait()
+    # stop() отменяет фоновую запись посреди пачки и дописывает буфер сам
+    await buffer.stop()
+    assert written == [1]
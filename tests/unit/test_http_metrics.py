@@ -0,0 +1,47 @@
+"""
+Метки HTTP-метрик: число серий ограничено при любых методах и путях
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import main
+from src.main import OTHER_METHOD, OVERFLOW_ENDPOINT, UNMATCHED_ENDPOINT, app
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "_route_series", set())
+    monkeypatch.setattr(main, "_endpoint_series", set())
+    monkeypatch.setattr(main.settings, "http_metrics_max_endpoints", 3)
+    main.register_routes(app.routes)
+    return TestClient(app, base_url="http://localhost")
+
+def series(method=None):
+    samples = main.REQUEST_COUNT.collect()[0].samples
+    return {(s.labels["method"], s.labels["endpoint"]) for s in samples
+            if s.name.endswith("_total") and (method is None or s.labels["method"] == method)}
+
+def test_invented_methods_share_one_label(client):
+    before = {m for m, _ in series()}
+    for i in range(20):
+        client.request(f"X{i}", "/health")
+    assert {m for m, _ in series()} - before <= {OTHER_METHOD}
+
+def test_junk_does_not_push_out_declared_routes(client):
+    for i in range(20):
+        client.get(f"/no-such-path-{i}")
+        client.request(f"X{i}", f"/no-such-path-{i}")
+    for method in ("PUT", "DELETE", "PATCH", "OPTIONS"):
+        client.request(method, "/health")
+    client.get("/health")
+    assert ("GET", "/health") in series("GET")
+    assert ("GET", UNMATCHED_ENDPOINT) in series("GET")
+    assert not any(endpoint.startswith("/no-such-path") for _, endpoint in series())
+
+def test_undeclared_pairs_are_capped(client):
+    # Методы, не объявленные у маршрутов; лимит в тесте — 3 пары
+    for path in ("/health", "/"):
+        for method in ("HEAD", "PUT", "PATCH", "DELETE"):
+            client.request(method, path)
+    assert len(main._endpoint_series) == 3
+    assert any(endpoint == OVERFLOW_ENDPOINT for _, endpoint in series())
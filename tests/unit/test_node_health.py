@@ -0,0 +1,93 @@
+"""
+TimerWheel и переходы NodeHealthTracker по heartbeat'ам (без БД)
+"""
+
+import asyncio
+
+import pytest
+
+from src.models.node import NodeStatus
+from src.services.node_health import NodeHealthTracker, TimerWheel
+
+def test_timer_fires_on_its_tick():
+    wheel = TimerWheel(tick=1, horizon=10, now=100)
+    wheel.schedule("a", 103)
+    wheel.schedule("b", 105.5)
+    assert wheel.advance(102.9) == []
+    assert wheel.advance(103) == ["a"]
+    assert wheel.advance(105) == []
+    assert wheel.advance(106) == ["b"]
+    assert len(wheel) == 0
+
+def test_reschedule_and_cancel():
+    wheel = TimerWheel(tick=1, horizon=10, now=0)
+    wheel.schedule("a", 2)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 3)
+    wheel.cancel("b")
+    assert wheel.advance(4) == []
+    assert wheel.advance(5) == ["a"]
+
+def test_past_deadline_fires_on_next_tick():
+    wheel = TimerWheel(tick=1, horizon=10, now=50)
+    wheel.schedule("a", 10)
+    assert wheel.advance(51) == ["a"]
+
+def test_beyond_horizon_fires_early():
+    # Вызывающий код сверяет время сам и переставляет таймер
+    wheel = TimerWheel(tick=1, horizon=5, now=0)
+    wheel.schedule("a", 100)
+    fired_at = next(t for t in range(1, 20) if wheel.advance(t))
+    assert fired_at < 100
+
+def test_long_gap_advances_whole_wheel():
+    wheel = TimerWheel(tick=1, horizon=5, now=0)
+    for i, key in enumerate("abc"):
+        wheel.schedule(key, i + 1)
+    assert sorted(wheel.advance(1000)) == ["a", "b", "c"]
+    wheel.schedule("d", 1002)
+    assert wheel.advance(1002) == ["d"]
+
+def make_tracker():
+    return NodeHealthTracker(tick_ms=1000, degraded_after=20, timeout=30, batch_size=100)
+
+def test_heartbeat_from_unknown_node_is_not_tracked():
+    tracker = make_tracker()
+    tracker.observe(404)
+    assert tracker.status(404) is None
+    assert tracker._counts[NodeStatus.READY] == 0
+    assert not tracker._pending
+    assert len(tracker._wheel) == 0
+
+def test_heartbeat_moves_known_node_to_ready():
+    tracker = make_tracker()
+    tracker.track(1, NodeStatus.NEW)
+    tracker.observe(1)
+    assert tracker.status(1) == NodeStatus.READY
+    assert tracker._pending == {1: NodeStatus.READY}
+    assert tracker._counts[NodeStatus.NEW] == 0
+    assert tracker._counts[NodeStatus.READY] == 1
+    assert len(tracker._wheel) == 1
+
+@pytest.mark.asyncio
+async def test_transition_survives_cancelled_flush(monkeypatch):
+    tracker = make_tracker()
+    tracker.track(1, NodeStatus.READY)
+    tracker._transition(1, NodeStatus.DOWN)
+    started, written = asyncio.Event(), []
+
+    async def write_batch(batch):
+        if not started.is_set():
+            started.set()
+            await asyncio.Event().wait()
+        written.extend(batch)
+
+    monkeypatch.setattr(tracker, "_write_batch", write_batch)
+    flush = asyncio.create_task(tracker.flush())
+    await started.wait()
+    flush.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flush
+    # Финальный flush из stop() видит переход
+    assert await tracker.flush() == 1
+    assert written == [(1, NodeStatus.DOWN)]
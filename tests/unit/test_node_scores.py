@@ -0,0 +1,89 @@
+"""
+NodeScoreIndex: ранжирование узлов, выбор для bundle и уведомления подписчиков
+"""
+
+from src.models.node import NodeStatus
+from src.services.node_scores import NodeScoreIndex
+
+def make_index(nodes=20, region="eu", watch_depth=6):
+    """Узлы 1..nodes в READY; users_online = id, так что рейтинг совпадает с порядком id."""
+    index = NodeScoreIndex(refresh_interval=60, watch_depth=watch_depth)
+    for node_id in range(1, nodes + 1):
+        index.update(node_id, region=region, status=NodeStatus.READY, users_online=node_id)
+    fired = []
+    index.subscribe(fired.append)
+    return index, fired
+
+def test_ranking_by_load():
+    index, _ = make_index(nodes=5)
+    assert index.best("eu", 3) == [1, 2, 3]
+    index.observe_heartbeat(1, users_online=100)
+    assert list(index.iter_best("eu")) == [2, 3, 4, 5, 1]
+
+def test_not_ready_nodes_go_last_and_down_is_excluded():
+    index, _ = make_index(nodes=3)
+    index.update(1, status=NodeStatus.DEGRADED)
+    assert list(index.iter_best("eu")) == [2, 3, 1]
+    index.update(2, status=NodeStatus.DOWN)
+    assert list(index.iter_best("eu")) == [3, 1]
+    assert index.score(2) is None
+
+def test_choose_stays_within_candidates_and_window():
+    index, _ = make_index()
+    owned = list(range(15, 21))
+    chosen = index.choose({"eu": owned}, k=2, spread=2, key=42)
+    assert len(chosen) == 2
+    # Окно выбора — 4 наименее загруженных узла организации
+    assert chosen <= {15, 16, 17, 18}
+    # Выбор стабилен для одного пользователя
+    assert index.choose({"eu": owned}, k=2, spread=2, key=42) == chosen
+
+def test_choose_spreads_users():
+    index, _ = make_index()
+    picks = {frozenset(index.choose({"eu": range(1, 21)}, k=1, spread=4, key=user)) for user in range(200)}
+    assert set().union(*picks) == {1, 2, 3, 4}
+
+def test_choose_per_region():
+    index, _ = make_index(nodes=4)
+    for node_id in (10, 11):
+        index.update(node_id, region="us", status=NodeStatus.READY)
+    chosen = index.choose({"eu": [1, 2, 3, 4], "us": [10, 11]}, k=1, spread=1, key=1)
+    assert chosen == {1, 10}
+
+def test_drain_below_global_window_notifies():
+    index, fired = make_index()
+    owned = list(range(15, 21))
+    before = index.choose({"eu": owned}, k=3, spread=1, key=7)
+    assert 16 in before
+
+    index.update(16, draining=True)
+    assert fired == ["eu"]
+    assert 16 not in index.choose({"eu": owned}, k=3, spread=1, key=7)
+
+def test_node_returning_below_window_notifies():
+    index, fired = make_index()
+    index.update(18, status=NodeStatus.DOWN)
+    index.update(18, status=NodeStatus.READY)
+    assert fired == ["eu", "eu"]
+
+def test_load_change_below_window_does_not_notify():
+    index, fired = make_index()
+    index.observe_heartbeat(18, users_online=19)
+    assert fired == []
+
+def test_top_window_change_notifies():
+    index, fired = make_index()
+    index.observe_heartbeat(1, users_online=100)
+    assert fired == ["eu"]
+
+def test_region_move_notifies_both_regions():
+    index, fired = make_index()
+    index.update(18, region="us")
+    assert sorted(fired) == ["eu", "us"]
+
+def test_remove():
+    index, fired = make_index(nodes=3)
+    index.remove(3)
+    assert list(index.iter_best("eu")) == [1, 2]
+    assert index.score(3) is None
+    assert fired == ["eu"]
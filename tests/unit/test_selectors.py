@@ -0,0 +1,81 @@
+"""
+LabelSelector: разбор синтаксиса Kubernetes, проверка по меткам и компиляция в JSONB
+"""
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.core.selectors import LabelSelector, Requirement, SelectorError
+from src.models import Node
+
+def requirements(selector):
+    return LabelSelector.parse(selector).requirements
+
+def sql(selector):
+    return str(LabelSelector.parse(selector).where(Node.labels).compile(dialect=postgresql.dialect()))
+
+def test_parse_operators():
+    assert requirements("region=EU, tier==prod, env!=dev, provider in (hetzner, ovh), zone notin (a), gpu, !spot") == [
+        Requirement("region", "=", ("EU",)),
+        Requirement("tier", "=", ("prod",)),
+        Requirement("env", "!=", ("dev",)),
+        Requirement("provider", "in", ("hetzner", "ovh")),
+        Requirement("zone", "notin", ("a",)),
+        Requirement("gpu", "exists"),
+        Requirement("spot", "!exists"),
+    ]
+
+def test_parse_prefixed_key_empty_value_and_duplicates():
+    assert requirements("mindvpn.io/role=,x in (a,b,a)") == [
+        Requirement("mindvpn.io/role", "=", ("",)),
+        Requirement("x", "in", ("a", "b")),
+    ]
+
+def test_empty_selector_matches_everything():
+    for selector in (None, "", "  "):
+        parsed = LabelSelector.parse(selector)
+        assert not parsed
+        assert parsed.matches({})
+
+@pytest.mark.parametrize("selector", [
+    "region=EU,", "region in (EU", "region in EU)", "region in ()", "region in (E U)",
+    "=EU", "region=E U", "region>EU", "-region",
+])
+def test_invalid_selectors(selector):
+    with pytest.raises(SelectorError):
+        LabelSelector.parse(selector)
+
+def test_str_round_trip():
+    selector = "region=EU,env!=dev,provider in (hetzner,ovh),zone notin (a),gpu,!spot"
+    assert str(LabelSelector.parse(selector)) == selector
+    assert requirements(str(LabelSelector.parse(selector))) == requirements(selector)
+
+@pytest.mark.parametrize("selector,labels,expected", [
+    ("region=EU", {"region": "EU"}, True),
+    ("region=EU", {"region": "US"}, False),
+    ("region=EU", {}, False),
+    ("env!=dev", {}, True),
+    ("env!=dev", {"env": "dev"}, False),
+    ("provider in (hetzner,ovh)", {"provider": "ovh"}, True),
+    ("provider in (hetzner,ovh)", {}, False),
+    ("provider notin (hetzner)", {}, True),
+    ("provider notin (hetzner)", {"provider": "hetzner"}, False),
+    ("gpu", {"gpu": "true"}, True),
+    ("!gpu", {"gpu": "true"}, False),
+    ("region=EU,!gpu", {"region": "EU"}, True),
+])
+def test_matches(selector, labels, expected):
+    assert LabelSelector.parse(selector).matches(labels) is expected
+
+def test_where_merges_equalities_into_one_containment():
+    compiled = sql("region=EU,tier=prod,gpu")
+    assert compiled.count("@>") == 1
+    assert compiled.count("?") == 1
+
+def test_where_expands_set_operators():
+    compiled = sql("provider in (a,b,c),zone notin (x,y)")
+    assert compiled.count("@>") == 5
+    assert "NOT" in compiled
+
+def test_where_conflicting_equalities_is_false():
+    assert sql("region=EU,region=US") == "false"
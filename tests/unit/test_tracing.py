@@ -0,0 +1,52 @@
+"""
+Tracer: вложенные span'ы, OTLP JSON и фоновый экспорт в файл
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from src.core.tracing import Tracer, span
+
+def traced(tracer, children=2):
+    root = tracer.start("GET /v1/bundles")
+    with root:
+        for i in range(children):
+            with span("db.query", n=i):
+                pass
+    return root
+
+def test_span_outside_trace_is_noop():
+    with span("db.query") as s:
+        assert s is None
+
+def test_otlp_parents():
+    tracer = Tracer("test", sample_rate=1.0, buffer_size=10)
+    root = traced(tracer)
+    spans = tracer.to_otlp([root.trace])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["GET /v1/bundles", "db.query", "db.query"]
+    assert "parentSpanId" not in spans[0]
+    assert {s["parentSpanId"] for s in spans[1:]} == {spans[0]["spanId"]}
+    assert spans[1]["attributes"] == [{"key": "n", "value": {"intValue": "0"}}]
+
+@pytest.mark.asyncio
+async def test_export_runs_off_the_request_path(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer("test", sample_rate=1.0, buffer_size=10, export_path=str(path))
+    await tracer.start_exporter()
+    tracer.finish(traced(tracer))
+    # finish() только ставит трассу в очередь
+    assert not path.exists()
+
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if path.exists():
+            break
+    tracer.finish(traced(tracer))
+    await tracer.stop_exporter()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    assert all(len(json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]) == 3 for line in lines)
+    assert len(tracer.recent) == 2
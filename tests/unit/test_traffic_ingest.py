@@ -0,0 +1,68 @@
+"""
+Разбор пакетной загрузки трафика: NDJSON и бинарные кадры, границы значений
+"""
+
+import pytest
+
+from src.services.traffic import (
+    FRAME_HEADER, FRAME_RECORD, INT32_MAX, INT64_MAX, IngestFormatError,
+    encode_frame, iter_frame_records, iter_ndjson_records,
+)
+
+async def chunks(body, size=7):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+async def collect(records):
+    return [r async for r in records]
+
+def frame(*records):
+    payload = b"".join(FRAME_RECORD.pack(*r) for r in records)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+@pytest.mark.asyncio
+async def test_frames_split_across_chunks():
+    records = [(1, 1700000000, 10, 20, 3), (INT32_MAX, 1700000060, INT64_MAX, 0, INT32_MAX)]
+    body = encode_frame(records[:1]) + encode_frame(records[1:])
+    assert await collect(iter_frame_records(chunks(body))) == records
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("record,field", [
+    ((2 ** 31, 0, 0, 0, 0), "node_id"),
+    ((1, 0, 2 ** 63, 0, 0), "bytes_in"),
+    ((1, 0, 0, 2 ** 64 - 1, 0), "bytes_out"),
+    ((1, 0, 0, 0, 2 ** 31), "users_online"),
+])
+async def test_frame_values_out_of_column_range(record, field):
+    with pytest.raises(IngestFormatError, match=field):
+        await collect(iter_frame_records(chunks(frame(record))))
+
+@pytest.mark.asyncio
+async def test_truncated_and_misaligned_frames():
+    with pytest.raises(IngestFormatError):
+        await collect(iter_frame_records(chunks(encode_frame([(1, 0, 0, 0, 0)])[:-1])))
+    with pytest.raises(IngestFormatError):
+        await collect(iter_frame_records(chunks(FRAME_HEADER.pack(3) + b"abc")))
+
+@pytest.mark.asyncio
+async def test_ndjson_arrays_objects_and_iso_time():
+    body = (b'[1, 1700000000, 10, 20, 3]\n\n'
+            b'{"node_id": 2, "bucket": "2023-11-14T22:13:20Z", "bytes_in": 5}')
+    assert await collect(iter_ndjson_records(chunks(body))) == [
+        (1, 1700000000, 10, 20, 3),
+        (2, 1700000000, 5, 0, 0),
+    ]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("line,message", [
+    (b"[1, 0, -1, 0, 0]", "bytes_in"),
+    (b"[1, 0, 9223372036854775808, 0, 0]", "bytes_in"),
+    (b"[2147483648, 0, 0, 0, 0]", "node_id"),
+    (b"[-1, 0, 0, 0, 0]", "node_id"),
+    (b"[1, 0, 0, 0, 4294967296]", "users_online"),
+    (b"[1, 0, 0, 0]", "three counters"),
+    (b'{"bucket": 0}', "node_id"),
+])
+async def test_ndjson_invalid_records(line, message):
+    with pytest.raises(IngestFormatError, match=f"line 2: .*{message}"):
+        await collect(iter_ndjson_records(chunks(b"[1, 0, 0, 0, 0]\n" + line)))
@@ -0,0 +1,101 @@
+"""
+Учет трафика из счетчиков xray и wireguard (Hiddify-Manager-dev/common/usage.py)
+"""
+
+import json
+
+import pytest
+
+usage = pytest.importorskip("usage")
+
+def wg(*peers, node=0):
+    return usage.parse_wg_transfer("\n".join(f"{key}\t{up}\t{down}" for key, up, down in peers), node=node)
+
+def users(*rows):
+    return usage.Users([dict(uuid=uuid, wg_pub=f"pub-{uuid}", **extra) for uuid, extra in rows])
+
+def test_parse_wg_transfer_sorts_peers():
+    counters = wg(("b", 10, 20), ("a", 1, 2))
+    assert counters.keys.tolist() == ["a", "b"]
+    assert counters.up.tolist() == [1, 10]
+    assert counters.down.tolist() == [2, 20]
+
+def test_parse_wg_transfer_rejects_partial_rows():
+    with pytest.raises(ValueError):
+        usage.parse_wg_transfer("a\t1\t2\nb\t3")
+
+def test_parse_xray_stats():
+    text = json.dumps({"stat": [
+        {"name": "user>>>u1@hiddify.com>>>traffic>>>uplink", "value": "5"},
+        {"name": "user>>>u1@hiddify.com>>>traffic>>>downlink", "value": 7},
+        # Нулевые значения xray опускает
+        {"name": "user>>>u2@hiddify.com>>>traffic>>>downlink"},
+        {"name": "inbound>>>api>>>traffic>>>uplink", "value": 100},
+    ]})
+    counters = usage.parse_xray_stats(text)
+    assert counters.keys.tolist() == ["u1", "u2"]
+    assert counters.up.tolist() == [5, 0]
+    assert counters.down.tolist() == [7, 0]
+    assert len(usage.parse_xray_stats("")) == 0
+
+def test_align_same_peers():
+    current = wg(("a", 2, 2), ("b", 2, 2))
+    assert usage.align(current, wg(("a", 1, 1), ("b", 1, 1))).tolist() == [0, 1]
+
+def test_align_new_and_removed_peers():
+    current = wg(("a", 1, 1), ("c", 1, 1), ("d", 1, 1))
+    previous = wg(("b", 1, 1), ("c", 1, 1), ("d", 1, 1))
+    assert usage.align(current, previous).tolist() == [-1, 1, 2]
+
+def test_align_matches_within_node():
+    current = usage.Counters(["a", "a"], [1, 2], [1, 1], [1, 1])
+    previous = usage.Counters(["a"], [2], [1], [1])
+    assert usage.align(current, previous).tolist() == [-1, 0]
+
+def test_deltas():
+    previous = wg(("a", 100, 100), ("b", 50, 50), ("gone", 9, 9))
+    current = wg(("a", 150, 120), ("b", 10, 60), ("new", 7, 8))
+    up, down = usage.deltas(current, previous)
+    # a: прирост; b: upload сбросился после рестарта — берется текущее значение; new: с нуля
+    assert up.tolist() == [50, 10, 7]
+    assert down.tolist() == [20, 10, 8]
+
+def test_deltas_without_previous_snapshot():
+    up, down = usage.deltas(wg(("a", 3, 4)), usage.Counters.empty())
+    assert up.tolist() == [3] and down.tolist() == [4]
+
+def test_account():
+    table = users(
+        ("u1", {"usage_limit_GB": 1, "current_usage_GB": 0.5}),
+        ("u2", {"usage_limit_GB": 1, "current_usage_GB": 2}),
+        ("u3", {}),
+    )
+    gb = usage.GB
+    current = usage.Counters(["u1", "u2", "stranger", "u1"], [1, 1, 1, 2], [gb // 2, 1, 5, 1], [0, 1, 5, 1])
+    report = usage.account(current, usage.Counters.empty(), table)
+
+    assert report["users"] == {"u1": [gb // 2 + 1, 1], "u2": [1, 1]}
+    assert report["nodes"] == {"1": [gb // 2 + 6, 6], "2": [1, 1]}
+    assert report["breached"] == ["u1", "u2"]
+    # u2 превысил лимит еще до этого прогона
+    assert report["newly_breached"] == ["u1"]
+    assert report["unknown_peers"] == 1
+
+def test_account_by_wg_pub():
+    current = wg(("pub-u1", 3, 4), ("other", 1, 1))
+    report = usage.account(current, usage.Counters.empty(), users(("u1", {})), by="wg_pub")
+    assert report["users"] == {"u1": [3, 4]}
+    assert report["unknown_peers"] == 1
+
+def test_collect_keeps_snapshot_per_consumer(tmp_path):
+    table = users(("u1", {}))
+    usage.collect("wg", wg(("pub-u1", 10, 10)), table, consumer="panel", usage_dir=str(tmp_path))
+    report = usage.collect("wg", wg(("pub-u1", 30, 30)), table, consumer="report", usage_dir=str(tmp_path))
+    # Первый прогон report не видел снимка panel и считает с нуля
+    assert report["users"] == {"u1": [30, 30]}
+
+    report = usage.collect("wg", wg(("pub-u1", 40, 40)), table, consumer="panel", usage_dir=str(tmp_path))
+    assert report["users"] == {"u1": [30, 30]}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "wg.panel.json", "wg.panel.npz", "wg.report.json", "wg.report.npz",
+    ]
@@ -0,0 +1,86 @@
+"""
+Структурная проверка конфигураций Xray: значения неверных типов дают ConfigError, а не исключение
+"""
+
+import json
+
+import pytest
+
+from hiddi_compat.generators.validation import validate_xray_config
+from hiddi_compat.generators.xray import XrayGenerator
+
+PRIVATE_KEY = "sNx3tF7rXTKN0Q4u5Wk8Y2oGcZpHh9vEjLmAaBdCfEg"
+
+def inbound(**fields):
+    config = {
+        "tag": "in",
+        "protocol": "vless",
+        "port": 443,
+        "settings": {"decryption": "none", "clients": [{"id": "u1", "email": "u1@mindvpn.local", "flow": "xtls-rprx-vision"}]},
+        "streamSettings": {
+            "network": "tcp",
+            "security": "reality",
+            "realitySettings": {"dest": "www.apple.com:443", "serverNames": ["www.apple.com"],
+                                "privateKey": PRIVATE_KEY, "shortIds": [""]},
+        },
+    }
+    config.update(fields)
+    return config
+
+def config(inbounds=None, routing=None):
+    result = {
+        "log": {"loglevel": "info"},
+        "inbounds": inbounds if inbounds is not None else [inbound()],
+        "outbounds": [{"tag": "direct", "protocol": "freedom"}],
+    }
+    if routing is not None:
+        result["routing"] = routing
+    return result
+
+def paths(cfg):
+    return [error.path for error in validate_xray_config(cfg)]
+
+def test_valid_config():
+    assert paths(config(routing={"rules": [{"inboundTag": ["in"], "outboundTag": "direct"}]})) == []
+
+@pytest.mark.parametrize("value", [["vless"], {"name": "vless"}, 1, None])
+def test_inbound_protocol_of_wrong_type(value):
+    assert paths({"inbounds": [{"protocol": value, "port": 1}]}) == ["$.inbounds[0].protocol"]
+
+@pytest.mark.parametrize("field,value", [("network", {"tcp": True}), ("network", ["tcp"]), ("security", ["reality"])])
+def test_stream_field_of_wrong_type(field, value):
+    stream = dict(inbound()["streamSettings"], **{field: value})
+    assert f"$.inbounds[0].streamSettings.{field}" in paths(config([inbound(streamSettings=stream)]))
+
+def test_client_fields_of_wrong_type():
+    settings = {"decryption": "none", "clients": [{"id": "u1", "email": ["a"], "flow": ["x"]}]}
+    assert paths(config([inbound(settings=settings)])) == [
+        "$.inbounds[0].settings.clients[0].email",
+        "$.inbounds[0].settings.clients[0].flow",
+    ]
+
+def test_log_level_and_outbound_protocol_of_wrong_type():
+    cfg = config()
+    cfg["log"]["loglevel"] = ["info"]
+    cfg["outbounds"][0]["protocol"] = {"freedom": 1}
+    assert paths(cfg) == ["$.log.loglevel", "$.outbounds[0].protocol"]
+
+@pytest.mark.parametrize("routing,path", [
+    ({"balancers": 3, "rules": []}, "$.routing.balancers"),
+    ({"domainStrategy": ["AsIs"], "rules": []}, "$.routing.domainStrategy"),
+    ({"rules": [{"outboundTag": ["direct"]}]}, "$.routing.rules[0].outboundTag"),
+    ({"rules": [{"balancerTag": {"tag": "b"}}]}, "$.routing.rules[0].balancerTag"),
+    ({"rules": [{"inboundTag": "in", "outboundTag": "direct"}]}, "$.routing.rules[0].inboundTag"),
+    ({"rules": [{"inboundTag": [["in"]], "outboundTag": "direct"}]}, "$.routing.rules[0].inboundTag[0]"),
+])
+def test_routing_of_wrong_type(routing, path):
+    assert paths(config(routing=routing)) == [path]
+
+def test_balancer_tag_lookup():
+    routing = {"balancers": [{"tag": "b"}, {"tag": ["c"]}, 1], "rules": [{"balancerTag": "b"}, {"balancerTag": "c"}]}
+    assert paths(config(routing=routing)) == ["$.routing.rules[1].balancerTag"]
+
+def test_check_config_reports_instead_of_raising():
+    result = XrayGenerator().check_config(json.dumps({"inbounds": [{"protocol": ["vless"], "port": 1}]}))
+    assert not result.valid
+    assert [str(e) for e in result.errors] == ["$.inbounds[0].protocol: unsupported inbound protocol ['vless']"]